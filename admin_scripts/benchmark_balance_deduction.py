@@ -0,0 +1,104 @@
+"""
+Concurrency check and throughput benchmark for the balance deduction paths
+
+Runs the same concurrent workload against BalanceService.check_and_deduct_balance_legacy and
+BalanceService.deduct_balance_atomic for a test user, then verifies that no path overspent:
+    starting_balance - final_balance == successful_deductions * cost  and  final_balance >= 0
+
+The overspend check also runs without a database in tests/test_balanceService.py; this script
+measures the real throughput and lock behaviour of both paths.
+
+Usage (DB_* environment variables must point at a NON-PRODUCTION database):
+    python -m admin_scripts.benchmark_balance_deduction <user_id> <endpoint_id> [threads] [calls_per_thread] [starting_balance] [cost]
+"""
+import sys
+import time
+import logging
+import threading
+
+from apis.utils.balanceService import BalanceService
+
+# Configure logging - the services log every deduction at INFO, which would dominate the timings
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def run_workload(deduct, user_id, endpoint_id, threads, calls_per_thread, starting_balance, cost):
+    """
+    Run a concurrent deduction workload and verify the resulting balance
+
+    Returns:
+        dict: Throughput and correctness figures for the run
+    """
+    success, error = BalanceService.update_user_balance(user_id, starting_balance)
+    if not success:
+        raise RuntimeError(f"Could not reset balance for user {user_id}: {error}")
+
+    counts = {"succeeded": 0, "insufficient": 0, "errors": 0}
+    counts_lock = threading.Lock()
+
+    def worker():
+        for _ in range(calls_per_thread):
+            ok, result = deduct(user_id, endpoint_id, cost)
+            with counts_lock:
+                if ok:
+                    counts["succeeded"] += 1
+                elif result == "Insufficient balance":
+                    counts["insufficient"] += 1
+                else:
+                    counts["errors"] += 1
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    balance_info, error = BalanceService.get_current_balance(user_id)
+    if error:
+        raise RuntimeError(f"Could not read final balance: {error}")
+    final_balance = float(balance_info["current_balance"])
+
+    expected_balance = starting_balance - counts["succeeded"] * cost
+    total_calls = threads * calls_per_thread
+
+    return {
+        "calls": total_calls,
+        "seconds": round(elapsed, 3),
+        "calls_per_second": round(total_calls / elapsed, 1) if elapsed else None,
+        "succeeded": counts["succeeded"],
+        "insufficient": counts["insufficient"],
+        "errors": counts["errors"],
+        "final_balance": final_balance,
+        "expected_balance": expected_balance,
+        "overspent": final_balance < 0 or abs(final_balance - expected_balance) > 0.001
+    }
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    user_id = sys.argv[1]
+    endpoint_id = sys.argv[2]
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    calls_per_thread = int(sys.argv[4]) if len(sys.argv) > 4 else 25
+    # Default to less credit than the workload wants so the insufficient-balance edge is exercised
+    starting_balance = float(sys.argv[5]) if len(sys.argv) > 5 else threads * calls_per_thread * 0.75
+    cost = float(sys.argv[6]) if len(sys.argv) > 6 else 1.0
+
+    paths = [
+        ("legacy", BalanceService.check_and_deduct_balance_legacy),
+        ("atomic", BalanceService.deduct_balance_atomic)
+    ]
+
+    for name, deduct in paths:
+        result = run_workload(deduct, user_id, endpoint_id, threads, calls_per_thread, starting_balance, cost)
+        status = "OVERSPENT" if result["overspent"] else "ok"
+        print(f"{name:>7}: {result['calls']} calls in {result['seconds']}s ({result['calls_per_second']} calls/s), "
+              f"{result['succeeded']} charged, {result['insufficient']} refused, {result['errors']} errors, "
+              f"final balance {result['final_balance']} (expected {result['expected_balance']}) - {status}")
+
+if __name__ == "__main__":
+    main()
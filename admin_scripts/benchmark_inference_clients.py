@@ -0,0 +1,164 @@
+"""
+Benchmark for reusing Azure AI Inference clients and their keep-alive connections
+
+Starts a local mock inference server, then runs the same workload with a new
+ChatCompletionsClient per call (the old behaviour) and with the worker's pooled client from
+llmEngine.client_pool. The server counts accepted connections, so the report shows how many
+TCP (and, with a certificate, TLS) handshakes each mode paid for.
+
+Usage:
+    python -m admin_scripts.benchmark_inference_clients [calls] [threads] [certfile keyfile]
+
+Pass a certificate and key to serve HTTPS, which makes the saved TLS handshake cost visible, e.g.
+    openssl req -x509 -newkey rsa:2048 -nodes -subj /CN=localhost -addext subjectAltName=DNS:localhost -keyout key.pem -out cert.pem
+"""
+import os
+import sys
+import ssl
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from azure.ai.inference import ChatCompletionsClient
+from azure.ai.inference.models import SystemMessage, UserMessage
+from azure.core.credentials import AzureKeyCredential
+
+from apis.utils.llmEngine import client_pool, AZURE_INFERENCE, INFERENCE_API_VERSION
+
+# Configure logging - keep the client libraries quiet so they don't dominate the timings
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logging.getLogger("azure").setLevel(logging.WARNING)
+
+MOCK_RESPONSE = json.dumps({
+    "id": "mock",
+    "created": 0,
+    "model": "mock-model",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6}
+}).encode("utf-8")
+
+
+class MockInferenceHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed chat completion, keeping the connection open"""
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment - otherwise Nagle + delayed ACK stall every kept-alive response
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(MOCK_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(MOCK_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(certfile=None, keyfile=None):
+    """Start the mock server on a free local port and return (server, endpoint)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockInferenceHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.stats_lock = threading.Lock()
+
+    scheme = "http"
+    if certfile and keyfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+        # Let the client trust the self-signed certificate
+        os.environ["REQUESTS_CA_BUNDLE"] = certfile
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"{scheme}://localhost:{server.server_address[1]}"
+
+def new_client_per_call(endpoint):
+    return ChatCompletionsClient(
+        endpoint=endpoint,
+        credential=AzureKeyCredential("benchmark"),
+        api_version=INFERENCE_API_VERSION
+    )
+
+def pooled_client(endpoint):
+    return client_pool.get_client(AZURE_INFERENCE, endpoint, "benchmark", INFERENCE_API_VERSION)
+
+def run_workload(get_client, server, endpoint, calls, threads):
+    """
+    Run calls chat completions spread over threads
+
+    Returns:
+        dict: Latency and connection figures for the run
+    """
+    with server.stats_lock:
+        server.connections = 0
+
+    latencies = []
+    errors = []
+    stats_lock = threading.Lock()
+    messages = [SystemMessage(content="You are a benchmark."), UserMessage(content="ping")]
+
+    def worker(count):
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                get_client(endpoint).complete(messages=messages, model="mock-model", max_tokens=1)
+            except Exception as e:
+                with stats_lock:
+                    errors.append(str(e))
+                continue
+            with stats_lock:
+                latencies.append(time.perf_counter() - start)
+
+    per_thread = [calls // threads + (1 if i < calls % threads else 0) for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(count,)) for count in per_thread]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "calls": calls,
+        "seconds": round(elapsed, 3),
+        "calls_per_second": round(calls / elapsed, 1) if elapsed else None,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else None,
+        "connections_opened": server.connections,
+        "errors": len(errors)
+    }
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    certfile = sys.argv[3] if len(sys.argv) > 4 else None
+    keyfile = sys.argv[4] if len(sys.argv) > 4 else None
+
+    server, endpoint = start_mock_server(certfile, keyfile)
+    print(f"Mock inference server at {endpoint} - {calls} calls over {threads} threads")
+
+    # Warm up the pooled client so both runs measure steady state
+    run_workload(pooled_client, server, endpoint, threads, threads)
+
+    for label, get_client in [("new client per call", new_client_per_call), ("pooled client", pooled_client)]:
+        result = run_workload(get_client, server, endpoint, calls, threads)
+        print(f"{label:>20}: {json.dumps(result)}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import logging
 from apis.utils.job_scheduler import start_job_scheduler
+from apis.utils.endpointRegistry import endpoint_registry, ENDPOINT_REGISTRY_ENABLED
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -12,6 +13,13 @@ def initialize_app(app):
     start_job_scheduler()
     logger.info("Job scheduler initialized")
     
+    # Warm the endpoint registry so the first requests resolve endpoints from memory
+    if ENDPOINT_REGISTRY_ENABLED:
+        try:
+            endpoint_registry.load()
+        except Exception as e:
+            logger.error(f"Error loading endpoint registry, will retry on first lookup: {str(e)}")
+    
     # Here you can add other initialization tasks as needed
     
     logger.info("Application initialization complete")
@@ -2,6 +2,7 @@ from flask import jsonify, request, g, make_response
 from apis.utils.tokenService import TokenService
 from apis.utils.databaseService import DatabaseService
 from apis.utils.logMiddleware import api_logger
+from apis.utils.endpointRegistry import endpoint_registry
 import logging
 import uuid
 import pytz
@@ -694,6 +695,9 @@ def add_endpoint_to_database(endpoint_path, endpoint_name, description, active,
         cursor.close()
         conn.close()
         
+        # Make the new endpoint visible to every worker's registry
+        endpoint_registry.invalidate()
+        
         return endpoint_id
         
     except Exception as e:
@@ -733,6 +737,9 @@ def update_endpoint(endpoint_id, update_data):
         cursor.close()
         conn.close()
         
+        # Path, cost or active flag may have changed - refresh every worker's registry
+        endpoint_registry.invalidate()
+        
         return rows_affected > 0
         
     except Exception as e:
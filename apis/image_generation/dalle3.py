@@ -201,7 +201,7 @@ def custom_image_generation_route():
         }, 401)
     
     # Validate token with Microsoft Graph
-    is_valid = TokenService.validate_token(token)
+    is_valid = TokenService.validate_token(token, expiration_time)
     if not is_valid:
         return create_api_response({
             "error": "Authentication Error",
@@ -176,7 +176,7 @@ def stable_diffusion_ultra_route():
         }, 401)
     
     # Validate token with Microsoft Graph
-    is_valid = TokenService.validate_token(token)
+    is_valid = TokenService.validate_token(token, expiration_time)
     if not is_valid:
         return create_api_response({
             "error": "Authentication Error",
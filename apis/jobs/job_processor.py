@@ -6,12 +6,18 @@ from apis.speech_services.stt_diarize import process_transcript_with_llm, split_
 import requests
 import uuid
 from apis.utils.databaseService import DatabaseService
+from apis.utils.balanceMiddleware import refund_additional_cost
 import azure.cognitiveservices.speech as speechsdk
 import os
 import io
 import tempfile
 import wave
+import time
+import threading
 import tiktoken
+from concurrent.futures import ThreadPoolExecutor
+from apis.utils.deploymentRouter import RegionLimiter
+from apis.utils.llmEngine import llm_engine
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -20,6 +26,24 @@ logger = logging.getLogger(__name__)
 TTS_SPEECH_KEY = os.environ.get("AZURE_SPEECH_KEY")
 TTS_SERVICE_REGION = os.environ.get("AZURE_SPEECH_REGION", "southafricanorth")
 
+# LLM batch job configuration
+# Concurrent calls all batch jobs of a worker send to each region of a model
+LLM_BATCH_REGION_CONCURRENCY = int(os.environ.get("LLM_BATCH_REGION_CONCURRENCY", 4))
+# Minimum seconds between progress writes to async_jobs
+LLM_BATCH_PROGRESS_INTERVAL = float(os.environ.get("LLM_BATCH_PROGRESS_INTERVAL", 5))
+
+# One RegionLimiter per deployment router, shared by the batch jobs of this worker
+_batch_limiters = {}
+_batch_limiters_lock = threading.Lock()
+
+def get_batch_limiter(router_name):
+    with _batch_limiters_lock:
+        limiter = _batch_limiters.get(router_name)
+        if limiter is None:
+            limiter = RegionLimiter(LLM_BATCH_REGION_CONCURRENCY)
+            _batch_limiters[router_name] = limiter
+        return limiter
+
 class JobProcessor:
     """
     Class for processing asynchronous jobs
@@ -141,7 +165,7 @@ class JobProcessor:
             return len(audio_data) / (16000 * 2)
     
     @staticmethod
-    def update_usage_metrics(user_id, job_type, metrics):
+    def update_usage_metrics(user_id, job_type, metrics, endpoint_path=None, usage_id=None):
         """Update or create usage metrics in the user_usage table
         
         This method will check if a usage record already exists for the job's API call
@@ -151,13 +175,16 @@ class JobProcessor:
             user_id (str): ID of the user who submitted the job
             job_type (str): Type of job (e.g., 'stt', 'stt_diarize', 'tts')
             metrics (dict): Dictionary containing usage metrics
+            endpoint_path (str, optional): Endpoint that submitted the job (defaults to /speech/<job_type>)
+            usage_id (str, optional): user_usage row of the submitting request - updated instead of
+                the user's latest row for the endpoint
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
             # Get endpoint ID based on job type
-            endpoint_path = f"/speech/{job_type}"
+            endpoint_path = endpoint_path or f"/speech/{job_type}"
             endpoint_id = DatabaseService.get_endpoint_id_by_path(endpoint_path)
             
             if not endpoint_id:
@@ -179,7 +206,10 @@ class JobProcessor:
             ORDER BY timestamp DESC
             """
             
-            cursor.execute(query, [user_id, endpoint_id])
+            if usage_id:
+                cursor.execute("SELECT id FROM user_usage WHERE id = ?", [usage_id])
+            else:
+                cursor.execute(query, [user_id, endpoint_id])
             existing_record = cursor.fetchone()
             
             if existing_record:
@@ -733,3 +763,163 @@ class JobProcessor:
             logger.error(error_msg)
             JobService.update_job_status(job_id, 'failed', error_msg)
             return False
+
+    @staticmethod
+    def process_llm_batch_job(job_id, user_id, job_parameters):
+        """
+        Process an LLM batch job
+        
+        The prompts are sent concurrently through the model's service function. A RegionLimiter
+        shared by all batch jobs of the worker caps the calls in flight per region, so a batch
+        fills the preferred region, spills over to the others and never crowds out interactive
+        traffic. Progress is written to the job while it runs.
+        
+        Args:
+            job_id (str): ID of the job to process
+            user_id (str): ID of the user who submitted the job
+            job_parameters (dict): Job parameters containing model, system_prompt, prompts
+                ([{"custom_id", "user_input"}]) and optional temperature and json_output
+            
+        Returns:
+            bool: True if successful, False otherwise
+            
+        Response format (stored in job result):
+            {
+                "message": "Batch processed",
+                "model_used": "gpt-4o-mini",
+                "progress": {"total": 2, "completed": 2, "succeeded": 1, "failed": 1},
+                "prompt_tokens": 120,
+                "completion_tokens": 340,
+                "total_tokens": 460,
+                "cached_tokens": 0,
+                "results": [
+                    {"index": 0, "custom_id": "a", "success": True, "result": "...",
+                     "prompt_tokens": 60, "completion_tokens": 340, "total_tokens": 400,
+                     "cached_tokens": 0, "client_used": "eastus"},
+                    {"index": 1, "custom_id": "b", "success": False, "error": "..."}
+                ]
+            }
+        """
+        from apis.llm_conversation.conversation import LLM_SERVICES, MODEL_PARAMETER_CONFIGS, build_service_parameters
+        
+        prompts = job_parameters.get('prompts') or []
+        # Prompts whose charge was returned - everything not yet refunded is returned if the job fails
+        refunded = [0]
+        
+        def refund_prompts(count):
+            item_cost = job_parameters.get('item_cost') or 0
+            endpoint_id = job_parameters.get('endpoint_id')
+            if count <= 0 or not item_cost or not endpoint_id:
+                return
+            success, result = refund_additional_cost(user_id, endpoint_id, item_cost * count)
+            if success:
+                refunded[0] += count
+                logger.info(f"Refunded {count} prompts of LLM batch job {job_id}")
+            else:
+                logger.error(f"Error refunding {count} prompts of LLM batch job {job_id}: {result}")
+        
+        try:
+            # Update job status to processing
+            JobService.update_job_status(job_id, 'processing')
+            
+            model = job_parameters.get('model')
+            system_prompt = job_parameters.get('system_prompt')
+            
+            if model not in LLM_SERVICES or not prompts:
+                error_msg = f"Invalid batch job parameters: model {model}, {len(prompts)} prompts"
+                logger.error(error_msg)
+                refund_prompts(len(prompts))
+                JobService.update_job_status(job_id, 'failed', error_msg)
+                return False
+            
+            service_function = LLM_SERVICES[model]
+            config = MODEL_PARAMETER_CONFIGS.get(model, {})
+            
+            spec = llm_engine.get_model(model)
+            router = llm_engine.get_router(spec) if spec else None
+            limiter = get_batch_limiter(router.name) if router else None
+            workers = max(1, len(router.regions) if router else 1) * LLM_BATCH_REGION_CONCURRENCY
+            
+            progress = {"total": len(prompts), "completed": 0, "succeeded": 0, "failed": 0}
+            progress_lock = threading.Lock()
+            last_progress_write = [time.monotonic()]
+            JobService.update_job_progress(job_id, dict(progress))
+            
+            def run_item(index, item):
+                service_params = build_service_parameters(model, system_prompt, item["user_input"])
+                if config.get("supports_temperature", False) and job_parameters.get('temperature') is not None:
+                    service_params["temperature"] = job_parameters['temperature']
+                if config.get("supports_json_output", False):
+                    service_params["json_output"] = job_parameters.get('json_output', False)
+                
+                try:
+                    if limiter is not None:
+                        with llm_engine.limit_regions(limiter):
+                            service_response = service_function(**service_params)
+                    else:
+                        service_response = service_function(**service_params)
+                except Exception as e:
+                    service_response = {"success": False, "error": str(e)}
+                
+                item_result = {"index": index, "custom_id": item.get("custom_id"), "success": service_response.get("success", False)}
+                if item_result["success"]:
+                    item_result.update({
+                        "result": service_response["result"],
+                        "prompt_tokens": service_response.get("prompt_tokens", 0),
+                        "completion_tokens": service_response.get("completion_tokens", 0),
+                        "total_tokens": service_response.get("total_tokens", 0),
+                        "cached_tokens": service_response.get("cached_tokens", 0),
+                        "client_used": service_response.get("client_used")
+                    })
+                else:
+                    item_result["error"] = service_response.get("error")
+                    logger.warning(f"LLM batch job {job_id} item {index} failed: {item_result['error']}")
+                
+                with progress_lock:
+                    progress["completed"] += 1
+                    progress["succeeded" if item_result["success"] else "failed"] += 1
+                    snapshot = None
+                    if time.monotonic() - last_progress_write[0] >= LLM_BATCH_PROGRESS_INTERVAL:
+                        last_progress_write[0] = time.monotonic()
+                        snapshot = dict(progress)
+                if snapshot:
+                    JobService.update_job_progress(job_id, snapshot)
+                return item_result
+            
+            logger.info(f"Processing LLM batch job {job_id}: {len(prompts)} {model} prompts with {workers} workers")
+            with ThreadPoolExecutor(max_workers=min(workers, len(prompts)), thread_name_prefix="llm-batch") as executor:
+                results = list(executor.map(run_item, range(len(prompts)), prompts))
+            
+            usage = {
+                key: sum(result.get(key, 0) for result in results)
+                for key in ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens")
+            }
+            
+            result_data = {
+                "message": "Batch processed",
+                "model_used": model,
+                "progress": progress,
+                **usage,
+                "results": results
+            }
+            
+            # Update the submitting request's usage metrics
+            metrics = {"model_used": model, **usage}
+            JobProcessor.update_usage_metrics(user_id, "llm_batch", metrics, endpoint_path="/llm/batch",
+                                              usage_id=job_parameters.get('usage_id'))
+            
+            # Failed prompts are not charged
+            refund_prompts(progress["failed"])
+            
+            # Update job status to completed with results
+            JobService.update_job_status(job_id, 'completed', result_data=result_data)
+            
+            logger.info(f"LLM batch job {job_id} processed: {progress['succeeded']} succeeded, {progress['failed']} failed")
+            return True
+            
+        except Exception as e:
+            error_msg = f"Error processing LLM batch job: {str(e)}"
+            logger.error(error_msg)
+            refund_prompts(len(prompts) - refunded[0])
+            JobService.update_job_status(job_id, 'failed', error_msg)
+            return False
@@ -76,6 +76,9 @@ def get_job_status_route():
             has_results:
               type: boolean
               example: true
+            progress:
+              type: object
+              description: Item counters of batch jobs (total, completed, succeeded, failed)
             parameters:
               type: object
               example: null
@@ -201,6 +204,13 @@ def get_job_status_route():
                     "message": error
                 }, 500)
         
+        # Batch jobs report their progress (items done so far) in the result data
+        result = job_details.get("result")
+        if isinstance(result, dict) and "progress" in result:
+            job_details["progress"] = result["progress"]
+            if job_details["status"] == "processing":
+                job_details.pop("result")
+        
         # For status endpoint, remove the actual result data if status is "completed"
         # This keeps the response size smaller
         if job_details["status"] == "completed" and "result" in job_details:
@@ -128,7 +128,43 @@ class JobService:
         except Exception as e:
             logger.error(f"Error updating job status: {str(e)}")
             return False
-    
+
+    @staticmethod
+    def update_job_progress(job_id, progress):
+        """
+        Record the progress of a job that is still processing
+
+        The progress is kept in result_data as {"progress": ...} until the job completes
+        and its results replace it.
+
+        Args:
+            job_id (str): ID of the job to update
+            progress (dict): Progress counters, e.g. total and completed items
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            conn = DatabaseService.get_connection()
+            cursor = conn.cursor()
+
+            query = """
+            UPDATE async_jobs
+            SET result_data = ?
+            WHERE id = ? AND status = 'processing'
+            """
+
+            cursor.execute(query, [json.dumps({"progress": progress}), job_id])
+            conn.commit()
+            cursor.close()
+            conn.close()
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error updating job progress: {str(e)}")
+            return False
+
     @staticmethod
     def get_job(job_id, user_id=None):
         """
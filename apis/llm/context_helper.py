@@ -3,13 +3,14 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def apply_context_if_provided(system_prompt, context_id):
+def apply_context_if_provided(system_prompt, context_id, model=None):
     """
     Helper function to apply context integration if context_id is provided
     
     Args:
         system_prompt (str): Original system prompt
         context_id (str or None): Context ID to apply, if any
+        model (str, optional): Model the prompt is for - the context is trimmed to fit it
         
     Returns:
         tuple: (enhanced_system_prompt, context_used)
@@ -20,7 +21,7 @@ def apply_context_if_provided(system_prompt, context_id):
         try:
             from apis.llm.context_integration import apply_context_to_system_prompt
             enhanced_system_prompt, error = apply_context_to_system_prompt(
-                system_prompt, context_id, g.user_id
+                system_prompt, context_id, g.user_id, model=model
             )
             if error:
                 logger.warning(f"Error applying context {context_id}: {error}")
@@ -1,10 +1,11 @@
 from apis.context.context_service import ContextService
+from apis.utils.tokenBudget import TokenBudget, get_context_limit, TOKEN_BUDGET_DEFAULT_CONTEXT_TOKENS, TOKEN_BUDGET_CONTEXT_SHARE
 import logging
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def apply_context_to_system_prompt(system_prompt, context_id, user_id):
+def apply_context_to_system_prompt(system_prompt, context_id, user_id, model=None):
     """
     Apply a context file to a system prompt
     
@@ -12,6 +13,8 @@ def apply_context_to_system_prompt(system_prompt, context_id, user_id):
         system_prompt (str): Original system prompt
         context_id (str): ID of the context to apply
         user_id (str): ID of the user requesting context
+        model (str, optional): Model the prompt is for - the context is trimmed so the system
+            prompt takes at most TOKEN_BUDGET_CONTEXT_SHARE of its context window
         
     Returns:
         tuple: (enhanced_prompt, error)
@@ -35,6 +38,8 @@ def apply_context_to_system_prompt(system_prompt, context_id, user_id):
         
         # Get context content
         context_content = context_data.get("content", "")
+        if model:
+            context_content = fit_context_to_model(model, system_prompt, context_content)
         
         # Create enhanced prompt with context
         separator = "\n\n====================\n"
@@ -54,3 +59,13 @@ Use the above context information to help inform your responses. If the context
     except Exception as e:
         logger.error(f"Error applying context to system prompt: {str(e)}")
         return system_prompt, f"Error applying context: {str(e)}"
+
+def fit_context_to_model(model, system_prompt, context_content):
+    """Trim context content to the model's share of its context window, less the system prompt"""
+    context_limit = get_context_limit(model, default=TOKEN_BUDGET_DEFAULT_CONTEXT_TOKENS)
+    budget = TokenBudget(model, limit=int(context_limit * TOKEN_BUDGET_CONTEXT_SHARE))
+    budget.add(system_prompt, message=True)
+    fitted = budget.fit(context_content, marker="\n... [context truncated to fit model limits]")
+    if fitted != context_content:
+        logger.info(f"Truncated context to fit within the {model} context window")
+    return fitted
@@ -11,6 +11,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 from apis.utils.config import create_api_response
+from apis.utils.llmStreaming import create_sse_response
 
 def deepseek_r1_route():
     """
@@ -61,8 +62,13 @@ def deepseek_r1_route():
             context_id:
               type: string
               description: ID of a context file to use as an enhanced system prompt (optional)
+            stream:
+              type: boolean
+              default: false
+              description: When true, the completion is relayed as Server-Sent Events ("delta" events with content, then a "done" event carrying the usual response body)
     produces:
       - application/json
+      - text/event-stream
     responses:
       200:
         description: Successful model response
@@ -177,7 +183,7 @@ def deepseek_r1_route():
         }, 401)
     
     # Validate token with Microsoft Graph
-    is_valid = TokenService.validate_token(token)
+    is_valid = TokenService.validate_token(token, expiration_time)
     if not is_valid:
         return create_api_response({
             "error": "Authentication Error",
@@ -217,6 +223,7 @@ def deepseek_r1_route():
     json_output = data.get('json_output', False)
     max_tokens = int(data.get('max_tokens', 2048))
     context_id = data.get('context_id')  # New parameter for context_id
+    stream = data.get('stream', False) is True  # Relay the completion as Server-Sent Events
     
     # Validate temperature range
     if not (0 <= temperature <= 1):
@@ -231,7 +238,7 @@ def deepseek_r1_route():
         
         # Apply context if provided
         from apis.llm.context_helper import apply_context_if_provided, add_context_to_response
-        enhanced_system_prompt, context_used = apply_context_if_provided(system_prompt, context_id)
+        enhanced_system_prompt, context_used = apply_context_if_provided(system_prompt, context_id, model="DeepSeek-R1-0528")
         
         # Use the service function instead of direct API call
         service_response = deepseek_r1_service(
@@ -239,7 +246,8 @@ def deepseek_r1_route():
             user_input=user_input,
             temperature=temperature,
             json_output=json_output,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            stream=stream
         )
         
         if not service_response["success"]:
@@ -250,25 +258,36 @@ def deepseek_r1_route():
                 "message": service_response["error"]
             }, status_code)
         
-        # Prepare successful response with user details
-        response_data = {
-            "response": "200",
-            "message": service_response["result"],
-            "user_id": user_details["id"],
-            "user_name": user_details["user_name"],
-            "user_email": user_details["user_email"],
-            "model": service_response["model"],
-            "client_used": service_response.get("client_used", "unknown"),
-            "prompt_tokens": service_response["prompt_tokens"],
-            "completion_tokens": service_response["completion_tokens"],
-            "total_tokens": service_response["total_tokens"],
-            "cached_tokens": service_response.get("cached_tokens", 0)
-        }
+        def build_response_data(service_response):
+            # Prepare successful response with user details
+            response_data = {
+                "response": "200",
+                "message": service_response["result"],
+                "user_id": user_details["id"],
+                "user_name": user_details["user_name"],
+                "user_email": user_details["user_email"],
+                "model": service_response["model"],
+                "client_used": service_response.get("client_used", "unknown"),
+                "prompt_tokens": service_response["prompt_tokens"],
+                "completion_tokens": service_response["completion_tokens"],
+                "total_tokens": service_response["total_tokens"],
+                "cached_tokens": service_response.get("cached_tokens", 0)
+            }
+            
+            # Include context usage info if context was used
+            return add_context_to_response(response_data, context_used)
         
-        # Include context usage info if context was used
-        response_data = add_context_to_response(response_data, context_used)
+        if stream:
+            # Relay token deltas as Server-Sent Events - long reasoning outputs no longer hit the worker timeout
+            return create_sse_response(
+                service_response["stream"],
+                lambda result, usage: build_response_data({**service_response, "result": result, **usage}),
+                enhanced_system_prompt,
+                user_input,
+                service_response["model"]
+            )
         
-        return create_api_response(response_data, 200)
+        return create_api_response(build_response_data(service_response), 200)
         
     except Exception as e:
         logger.error(f"DeepSeek-R1 API error: {str(e)}")
@@ -23,6 +23,7 @@ ALLOWED_IMAGE_EXTENSIONS = {
 }
 
 from apis.utils.config import create_api_response
+from apis.utils.llmStreaming import create_sse_response
 # Remove the balance check decorator from here - we'll apply it in the registration
 def gpt4o_route():
     """
@@ -79,8 +80,13 @@ def gpt4o_route():
             context_id:
               type: string
               description: ID of a context file to use as an enhanced system prompt (optional)
+            stream:
+              type: boolean
+              default: false
+              description: When true, the completion is relayed as Server-Sent Events ("delta" events with content, then a "done" event carrying the usual response body)
     produces:
       - application/json
+      - text/event-stream
     responses:
       200:
         description: Successful model response
@@ -201,7 +207,7 @@ def gpt4o_route():
         }, 401)
     
     # Validate token with Microsoft Graph
-    is_valid = TokenService.validate_token(token)
+    is_valid = TokenService.validate_token(token, expiration_time)
     if not is_valid:
         return create_api_response({
             "error": "Authentication Error",
@@ -241,6 +247,7 @@ def gpt4o_route():
     json_output = data.get('json_output', False)
     file_ids = data.get('file_ids', [])
     context_id = data.get('context_id')  # New parameter for context_id
+    stream = data.get('stream', False) is True  # Relay the completion as Server-Sent Events
     
     # Validate and clean file_ids - filter out empty strings and non-string values
     if file_ids and isinstance(file_ids, list):
@@ -270,7 +277,7 @@ def gpt4o_route():
         # Apply context if provided (now properly validated)
         if context_id:
             from apis.llm.context_integration import apply_context_to_system_prompt
-            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, g.user_id)
+            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, g.user_id, model="gpt-4o")
             if error:
                 logger.warning(f"Error applying context {context_id}: {error}")
                 # Continue with original system prompt but log the issue
@@ -299,7 +306,8 @@ def gpt4o_route():
             temperature=temperature,
             json_output=json_output,
             file_ids=file_ids,  # Will be empty list for text-only requests
-            user_id=user_id
+            user_id=user_id,
+            stream=stream
         )
         
         if not service_response["success"]:
@@ -310,37 +318,50 @@ def gpt4o_route():
                 "message": service_response["error"]
             }, status_code)
         
-        # Prepare successful response with user details - consistent structure
-        response_data = {
-            "response": "200",
-            "message": service_response["result"],
-            "user_id": user_details["id"],
-            "user_name": user_details["user_name"],
-            "user_email": user_details["user_email"],
-            "model": service_response["model"],
-            "prompt_tokens": service_response["prompt_tokens"],
-            "completion_tokens": service_response["completion_tokens"],
-            "total_tokens": service_response["total_tokens"],
-            "cached_tokens": service_response.get("cached_tokens", 0),
-            "client_used": service_response.get("client_used"),
-        }
-        
-        # Always include file processing details for consistency
-        response_data["files_processed"] = service_response.get("files_processed", 0)
-        
-        if "file_processing_details" in service_response:
-            response_data["file_processing_details"] = service_response["file_processing_details"]
-        else:
-            # Provide consistent structure even for text-only requests
-            response_data["file_processing_details"] = {
-                "images_processed": 0,
-                "file_ids_processed": []
+        def build_response_data(service_response):
+            # Prepare successful response with user details - consistent structure
+            response_data = {
+                "response": "200",
+                "message": service_response["result"],
+                "user_id": user_details["id"],
+                "user_name": user_details["user_name"],
+                "user_email": user_details["user_email"],
+                "model": service_response["model"],
+                "prompt_tokens": service_response["prompt_tokens"],
+                "completion_tokens": service_response["completion_tokens"],
+                "total_tokens": service_response["total_tokens"],
+                "cached_tokens": service_response.get("cached_tokens", 0),
+                "client_used": service_response.get("client_used"),
             }
+            
+            # Always include file processing details for consistency
+            response_data["files_processed"] = service_response.get("files_processed", 0)
+            
+            if "file_processing_details" in service_response:
+                response_data["file_processing_details"] = service_response["file_processing_details"]
+            else:
+                # Provide consistent structure even for text-only requests
+                response_data["file_processing_details"] = {
+                    "images_processed": 0,
+                    "file_ids_processed": []
+                }
+            
+            # Always include context usage info - show "none" if no context was used
+            response_data["context_used"] = context_id if context_id else "none"
+            
+            return response_data
         
-        # Always include context usage info - show "none" if no context was used
-        response_data["context_used"] = context_id if context_id else "none"
+        if stream:
+            # Relay token deltas as Server-Sent Events - the closing "done" event carries the usual response body
+            return create_sse_response(
+                service_response["stream"],
+                lambda result, usage: build_response_data({**service_response, "result": result, **usage}),
+                enhanced_system_prompt,
+                user_input,
+                service_response["model"]
+            )
         
-        return create_api_response(response_data, 200)
+        return create_api_response(build_response_data(service_response), 200)
         
     except Exception as e:
         logger.error(f"GPT-4o API error: {str(e)}")
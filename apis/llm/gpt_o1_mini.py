@@ -50,6 +50,10 @@ def o1_mini_route():
             context_id:
               type: string
               description: ID of a context file to use as an enhanced system prompt (optional)
+            stream:
+              type: boolean
+              default: false
+              description: O1-mini does not stream - true is rejected with a 400
     produces:
       - application/json
     responses:
@@ -171,7 +175,7 @@ def o1_mini_route():
         }, 401)
     
     # Validate token with Microsoft Graph
-    is_valid = TokenService.validate_token(token)
+    is_valid = TokenService.validate_token(token, expiration_time)
     if not is_valid:
         return create_api_response({
             "error": "Authentication Error",
@@ -210,6 +214,7 @@ def o1_mini_route():
     temperature = float(data.get('temperature', 0.5))
     json_output = data.get('json_output', False)
     context_id = data.get('context_id')
+    stream = data.get('stream', False) is True  # O1-mini does not stream - the engine rejects true with a 400
     
     # Validate and clean context_id - treat empty strings as None
     if context_id and isinstance(context_id, str):
@@ -233,7 +238,7 @@ def o1_mini_route():
         # Apply context if provided (same as gpt-4o implementation)
         if context_id:
             from apis.llm.context_integration import apply_context_to_system_prompt
-            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, g.user_id)
+            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, g.user_id, model="o1-mini")
             if error:
                 logger.warning(f"Error applying context {context_id}: {error}")
                 # Continue with original system prompt but log the issue
@@ -246,7 +251,8 @@ def o1_mini_route():
             system_prompt=enhanced_system_prompt,  # Use enhanced prompt with context
             user_input=user_input,
             temperature=temperature,
-            json_output=json_output
+            json_output=json_output,
+            stream=stream
         )
         
         if not service_response["success"]:
@@ -11,6 +11,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 from apis.utils.config import create_api_response
+from apis.utils.llmStreaming import create_sse_response
 
 def o3_mini_route():
     """
@@ -65,8 +66,13 @@ def o3_mini_route():
             context_id:
               type: string
               description: ID of a context file to use as an enhanced system prompt (optional)
+            stream:
+              type: boolean
+              default: false
+              description: When true, the completion is relayed as Server-Sent Events ("delta" events with content, then a "done" event carrying the usual response body)
     produces:
       - application/json
+      - text/event-stream
     responses:
       200:
         description: Successful model response
@@ -186,7 +192,7 @@ def o3_mini_route():
         }, 401)
     
     # Validate token with Microsoft Graph
-    is_valid = TokenService.validate_token(token)
+    is_valid = TokenService.validate_token(token, expiration_time)
     if not is_valid:
         return create_api_response({
             "error": "Authentication Error",
@@ -226,6 +232,7 @@ def o3_mini_route():
     reasoning_effort = data.get('reasoning_effort', 'medium')
     json_output = data.get('json_output', False)
     context_id = data.get('context_id')
+    stream = data.get('stream', False) is True  # Relay the completion as Server-Sent Events
     
     # Validate and clean context_id - treat empty strings as None
     if context_id and isinstance(context_id, str):
@@ -257,7 +264,7 @@ def o3_mini_route():
         # Apply context if provided (same as gpt-4o implementation)
         if context_id:
             from apis.llm.context_integration import apply_context_to_system_prompt
-            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, g.user_id)
+            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, g.user_id, model="o3-mini")
             if error:
                 logger.warning(f"Error applying context {context_id}: {error}")
                 # Continue with original system prompt but log the issue
@@ -271,7 +278,8 @@ def o3_mini_route():
             user_input=user_input,
             max_completion_tokens=max_completion_tokens,
             reasoning_effort=reasoning_effort,
-            json_output=json_output
+            json_output=json_output,
+            stream=stream
         )
         
         if not service_response["success"]:
@@ -282,21 +290,34 @@ def o3_mini_route():
                 "message": service_response["error"]
             }, status_code)
         
-        # Prepare successful response with user details and context information
-        return create_api_response({
-            "response": "200",
-            "message": service_response["result"],
-            "user_id": user_details["id"],
-            "user_name": user_details["user_name"],
-            "user_email": user_details["user_email"],
-            "model": service_response["model"],
-            "client_used": service_response["client_used"],
-            "context_used": context_id if context_id else "none",
-            "prompt_tokens": service_response["prompt_tokens"],
-            "completion_tokens": service_response["completion_tokens"],
-            "total_tokens": service_response["total_tokens"],
-            "cached_tokens": service_response.get("cached_tokens", 0)
-        }, 200)
+        def build_response_data(service_response):
+            # Prepare successful response with user details and context information
+            return {
+                "response": "200",
+                "message": service_response["result"],
+                "user_id": user_details["id"],
+                "user_name": user_details["user_name"],
+                "user_email": user_details["user_email"],
+                "model": service_response["model"],
+                "client_used": service_response["client_used"],
+                "context_used": context_id if context_id else "none",
+                "prompt_tokens": service_response["prompt_tokens"],
+                "completion_tokens": service_response["completion_tokens"],
+                "total_tokens": service_response["total_tokens"],
+                "cached_tokens": service_response.get("cached_tokens", 0)
+            }
+        
+        if stream:
+            # Relay token deltas as Server-Sent Events - long reasoning outputs no longer hit the worker timeout
+            return create_sse_response(
+                service_response["stream"],
+                lambda result, usage: build_response_data({**service_response, "result": result, **usage}),
+                enhanced_system_prompt,
+                user_input,
+                service_response["model"]
+            )
+        
+        return create_api_response(build_response_data(service_response), 200)
         
     except Exception as e:
         logger.error(f"O3-Mini API error: {str(e)}")
@@ -22,6 +22,7 @@ ALLOWED_IMAGE_EXTENSIONS = {
 }
 
 from apis.utils.config import create_api_response
+from apis.utils.llmStreaming import create_sse_response
 
 def gpt_o4_mini_route():
     """
@@ -91,8 +92,13 @@ def gpt_o4_mini_route():
               minimum: 1
               maximum: 16000
               description: Maximum number of tokens to generate in the completion
+            stream:
+              type: boolean
+              default: false
+              description: When true, the completion is relayed as Server-Sent Events ("delta" events with content, then a "done" event carrying the usual response body)
     produces:
       - application/json
+      - text/event-stream
     responses:
       200:
         description: Successful model response
@@ -221,7 +227,7 @@ def gpt_o4_mini_route():
         }, 401)
     
     # Validate token with Microsoft Graph
-    is_valid = TokenService.validate_token(token)
+    is_valid = TokenService.validate_token(token, expiration_time)
     if not is_valid:
         return create_api_response({
             "error": "Authentication Error",
@@ -260,6 +266,7 @@ def gpt_o4_mini_route():
     json_output = data.get('json_output', False)
     file_ids = data.get('file_ids', [])
     context_id = data.get('context_id')
+    stream = data.get('stream', False) is True  # Relay the completion as Server-Sent Events
     formatting_reenabled = data.get('formatting_reenabled', True)
     reasoning_effort = data.get('reasoning_effort', 'medium')
     generate_summary = data.get('generate_summary', 'none')
@@ -315,7 +322,7 @@ def gpt_o4_mini_route():
         # Apply context if provided (same as other implementations)
         if context_id:
             from apis.llm.context_integration import apply_context_to_system_prompt
-            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, g.user_id)
+            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, g.user_id, model="o4-mini")
             if error:
                 logger.warning(f"Error applying context {context_id}: {error}")
                 # Continue with original system prompt but log the issue
@@ -345,7 +352,8 @@ def gpt_o4_mini_route():
             formatting_reenabled=formatting_reenabled,
             reasoning_effort=reasoning_effort,
             generate_summary=generate_summary,
-            max_completion_tokens=max_completion_tokens
+            max_completion_tokens=max_completion_tokens,
+            stream=stream
         )
         
         if not service_response["success"]:
@@ -356,36 +364,48 @@ def gpt_o4_mini_route():
                 "message": service_response["error"]
             }, status_code)
         
-        # Prepare successful response with user details - consistent structure
-        response_data = {
-            "response": "200",
-            "message": service_response["result"],
-            "user_id": user_details["id"],
-            "user_name": user_details["user_name"],
-            "user_email": user_details["user_email"],
-            "model": service_response["model"],
-            "client_used": service_response.get("client_used"),
-            "context_used": context_id if context_id else "none",
-            "prompt_tokens": service_response["prompt_tokens"],
-            "completion_tokens": service_response["completion_tokens"],
-            "total_tokens": service_response["total_tokens"],
-            "cached_tokens": service_response.get("cached_tokens", 0),
-        }
-        
-        # Always include file processing details for consistency
-        response_data["files_processed"] = service_response.get("files_processed", 0)
-        
-        if "file_processing_details" in service_response:
-            response_data["file_processing_details"] = service_response["file_processing_details"]
-        else:
-            # Provide consistent structure even for text-only requests
-            response_data["file_processing_details"] = {
-                "images_processed": 0,
-                "file_ids_processed": []
+        def build_response_data(service_response):
+            # Prepare successful response with user details - consistent structure
+            response_data = {
+                "response": "200",
+                "message": service_response["result"],
+                "user_id": user_details["id"],
+                "user_name": user_details["user_name"],
+                "user_email": user_details["user_email"],
+                "model": service_response["model"],
+                "client_used": service_response.get("client_used"),
+                "context_used": context_id if context_id else "none",
+                "prompt_tokens": service_response["prompt_tokens"],
+                "completion_tokens": service_response["completion_tokens"],
+                "total_tokens": service_response["total_tokens"],
+                "cached_tokens": service_response.get("cached_tokens", 0),
             }
+            
+            # Always include file processing details for consistency
+            response_data["files_processed"] = service_response.get("files_processed", 0)
+            
+            if "file_processing_details" in service_response:
+                response_data["file_processing_details"] = service_response["file_processing_details"]
+            else:
+                # Provide consistent structure even for text-only requests
+                response_data["file_processing_details"] = {
+                    "images_processed": 0,
+                    "file_ids_processed": []
+                }
+            
+            return response_data
         
+        if stream:
+            # Relay token deltas as Server-Sent Events
+            return create_sse_response(
+                service_response["stream"],
+                lambda result, usage: build_response_data({**service_response, "result": result, **usage}),
+                enhanced_system_prompt,
+                user_input,
+                service_response["model"]
+            )
         
-        return create_api_response(response_data, 200)
+        return create_api_response(build_response_data(service_response), 200)
         
     except Exception as e:
         logger.error(f"GPT-o4-mini API error: {str(e)}")
@@ -0,0 +1,294 @@
+from flask import jsonify, request, g, make_response
+from apis.utils.databaseService import DatabaseService
+from apis.utils.logMiddleware import api_logger
+from apis.utils.balanceMiddleware import check_balance, deduct_additional_cost, refund_additional_cost
+from apis.jobs.job_service import JobService
+from apis.llm_conversation.conversation import LLM_SERVICES
+import logging
+import os
+import pytz
+from datetime import datetime
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+from apis.utils.config import create_api_response
+from apis.utils.requestRecord import get_request_record
+
+# LLM BATCH CONFIGURATION
+# Largest number of prompts accepted in one batch submission
+LLM_BATCH_MAX_PROMPTS = int(os.environ.get("LLM_BATCH_MAX_PROMPTS", 1000))
+
+def submit_llm_batch_job_route():
+    """
+    Submit a batch of prompts for one model for asynchronous processing
+
+    Every prompt costs the endpoint's cost. Poll /jobs/status for progress and fetch the
+    per-prompt results from /jobs/result once the job has completed.
+    ---
+    tags:
+      - LLM
+    parameters:
+      - name: X-Token
+        in: header
+        type: string
+        required: true
+        description: Valid token for authentication
+      - name: X-Correlation-ID
+        in: header
+        type: string
+        required: false
+        description: Unique identifier for tracking requests across multiple systems
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - model
+            - prompts
+          properties:
+            model:
+              type: string
+              description: Model to run every prompt against
+              example: gpt-4o-mini
+              enum: [gpt-4o, gpt-4o-mini, gpt-4.1, gpt-4.1-mini, o1-mini, o3-mini, deepseek-r1, deepseek-v3, llama-3-1-405b, llama-3.2-vision-instruct, llama-4-maverick-17b-128e, llama-4-scout-17b-16e, mistral-medium-2505, mistral-nemo]
+            system_prompt:
+              type: string
+              description: System prompt shared by all prompts
+              example: "Classify the sentiment of the text as positive, negative or neutral."
+            prompts:
+              type: array
+              description: User inputs - strings, or objects with user_input and an optional custom_id echoed in the results
+              items:
+                type: object
+                properties:
+                  custom_id:
+                    type: string
+                    example: review-1
+                  user_input:
+                    type: string
+                    example: "The delivery was quick and the product works well."
+            temperature:
+              type: number
+              format: float
+              description: Sampling temperature (models that support it)
+              example: 0.2
+            json_output:
+              type: boolean
+              description: Request JSON object responses (models that support it)
+              default: false
+    consumes:
+      - application/json
+    produces:
+      - application/json
+    responses:
+      202:
+        description: Job submitted successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: LLM batch job submitted successfully
+            job_id:
+              type: string
+              example: 12345678-1234-1234-1234-123456789012
+            prompts:
+              type: integer
+              example: 250
+      400:
+        description: Bad request
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: Bad Request
+            message:
+              type: string
+              example: prompts must be a non-empty list
+      401:
+        description: Authentication error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: Authentication Error
+            message:
+              type: string
+              enum: [Missing X-Token header, Invalid token, Token has expired]
+      402:
+        description: Insufficient balance for all prompts of the batch
+      500:
+        description: Server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              enum: [Server Error, Job Creation Error]
+            message:
+              type: string
+              example: Error processing request
+    """
+    # Get token from X-Token header
+    token = request.headers.get('X-Token')
+    if not token:
+        return create_api_response({
+            "error": "Authentication Error",
+            "message": "Missing X-Token header"
+        }, 401)
+
+    # Validate token and get token details
+    token_details = DatabaseService.get_token_details_by_value(token)
+    if not token_details:
+        return create_api_response({
+            "error": "Authentication Error",
+            "message": "Invalid token"
+        }, 401)
+
+    # Check if token is expired
+    now = datetime.now(pytz.UTC)
+    expiration_time = token_details["token_expiration_time"]
+
+    # Ensure expiration_time is timezone-aware
+    if expiration_time.tzinfo is None:
+        johannesburg_tz = pytz.timezone('Africa/Johannesburg')
+        expiration_time = johannesburg_tz.localize(expiration_time)
+
+    if now > expiration_time:
+        return create_api_response({
+            "error": "Authentication Error",
+            "message": "Token has expired"
+        }, 401)
+
+    g.user_id = token_details["user_id"]
+    g.token_id = token_details["id"]
+
+    # Get request data
+    data = request.get_json()
+    if not data:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": "Request body is required"
+        }, 400)
+
+    model = data.get('model')
+    if model not in LLM_SERVICES:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": f"Invalid model. Must be one of: {', '.join(LLM_SERVICES.keys())}"
+        }, 400)
+
+    prompts = data.get('prompts')
+    if not isinstance(prompts, list) or not prompts:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": "prompts must be a non-empty list"
+        }, 400)
+
+    if len(prompts) > LLM_BATCH_MAX_PROMPTS:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": f"A batch may contain at most {LLM_BATCH_MAX_PROMPTS} prompts"
+        }, 400)
+
+    # Normalise prompts to {"custom_id", "user_input"}
+    items = []
+    for index, prompt in enumerate(prompts):
+        if isinstance(prompt, str):
+            prompt = {"user_input": prompt}
+        if not isinstance(prompt, dict) or not isinstance(prompt.get('user_input'), str) or not prompt['user_input'].strip():
+            return create_api_response({
+                "error": "Bad Request",
+                "message": f"Prompt {index} must be a non-empty string or an object with user_input"
+            }, 400)
+        custom_id = prompt.get('custom_id')
+        items.append({
+            "custom_id": str(custom_id) if custom_id is not None else None,
+            "user_input": prompt['user_input']
+        })
+
+    temperature = data.get('temperature')
+    if temperature is not None:
+        try:
+            temperature = float(temperature)
+        except (TypeError, ValueError):
+            return create_api_response({
+                "error": "Bad Request",
+                "message": "temperature must be a number"
+            }, 400)
+
+    try:
+        # Get endpoint ID for tracking
+        endpoint_id = DatabaseService.get_endpoint_id_by_path('/llm/batch')
+
+        # check_balance charged the first prompt - charge the rest before queueing the job
+        item_cost = (DatabaseService.get_endpoint_cost_by_id(endpoint_id) or 0) if endpoint_id else 0
+        additional_cost = item_cost * (len(items) - 1)
+        if additional_cost:
+            success, result = deduct_additional_cost(g.user_id, endpoint_id, additional_cost)
+            if not success:
+                if result == "Insufficient balance":
+                    return create_api_response({
+                        "error": "Insufficient Balance",
+                        "message": f"Your API call balance does not cover the {len(items)} prompts of this batch."
+                    }, 402)
+                return create_api_response({
+                    "error": "Balance Error",
+                    "message": f"Error processing balance: {result}"
+                }, 500)
+
+        # Prepare job parameters
+        job_parameters = {
+            'model': model,
+            'system_prompt': data.get('system_prompt', 'You are a helpful AI assistant'),
+            'prompts': items,
+            'temperature': temperature,
+            'json_output': data.get('json_output', False) is True,
+            'token_id': g.token_id,
+            # The job refunds the prompts that fail and fills in this request's user_usage row
+            'endpoint_id': str(endpoint_id) if endpoint_id else None,
+            'item_cost': float(item_cost),
+            'usage_id': get_request_record().reserve_usage_id()
+        }
+
+        # Create a new job
+        job_id, error = JobService.create_job(
+            user_id=g.user_id,
+            job_type='llm_batch',
+            file_id=None,
+            parameters=job_parameters,
+            endpoint_id=endpoint_id
+        )
+
+        if error:
+            if additional_cost:
+                refund_additional_cost(g.user_id, endpoint_id, additional_cost)
+            return create_api_response({
+                "error": "Job Creation Error",
+                "message": f"Error creating job: {error}"
+            }, 500)
+
+        # Return the job ID immediately
+        return create_api_response({
+            "message": "LLM batch job submitted successfully",
+            "job_id": job_id,
+            "prompts": len(items)
+        }, 202)  # 202 Accepted status code for async processing
+
+    except Exception as e:
+        logger.error(f"Error in submit LLM batch job endpoint: {str(e)}")
+        return create_api_response({
+            "error": "Server Error",
+            "message": f"Error processing request: {str(e)}"
+        }, 500)
+
+def register_llm_batch_routes(app):
+    from apis.utils.usageMiddleware import track_usage
+    from apis.utils.rbacMiddleware import check_endpoint_access
+
+    """Register LLM batch routes with the Flask app"""
+    app.route('/llm/batch', methods=['POST'])(track_usage(api_logger(check_endpoint_access(check_balance(submit_llm_batch_job_route)))))
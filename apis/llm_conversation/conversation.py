@@ -5,6 +5,7 @@ from apis.utils.logMiddleware import api_logger
 from apis.utils.balanceMiddleware import check_balance
 from apis.utils.balanceService import BalanceService
 from apis.utils.config import get_azure_blob_client, ensure_container_exists
+from apis.utils.tokenBudget import TokenBudget
 import logging
 import pytz
 import os
@@ -304,26 +305,44 @@ def delete_conversation_history(conversation_id):
         logger.error(f"Error deleting conversation {conversation_id}: {str(e)}")
         return False, str(e)
 
-def format_conversation_for_llm(conversation, include_last_n=6):
-    """Format conversation history for LLM input"""
+def format_conversation_for_llm(conversation, include_last_n=6, system_message=None):
+    """
+    Format conversation history for LLM input
+
+    The last include_last_n messages are kept as long as they fit the model's context window
+    next to the system message and the model's output allowance; the newest message is always
+    kept and the oldest one that only partly fits is trimmed from the front.
+    """
     # Get the system message based on assistant type
-    assistant_type = conversation.get("assistant_type", "general")
-    system_message = ASSISTANT_TYPES.get(assistant_type, ASSISTANT_TYPES["general"])
+    if system_message is None:
+        assistant_type = conversation.get("assistant_type", "general")
+        system_message = ASSISTANT_TYPES.get(assistant_type, ASSISTANT_TYPES["general"])
     
     # Get messages (limited to the last include_last_n)
     messages = conversation.get("messages", [])
     if len(messages) > include_last_n:
         messages = messages[-include_last_n:]
     
-    # Format conversation history as text
-    chat_history = ""
-    for msg in messages:
-        role = msg.get("role", "user")
-        content = msg.get("content", "")
-        chat_history += f"{role.capitalize()}: {content}\n\n"
+    llm = conversation.get("model")
+    config = MODEL_PARAMETER_CONFIGS.get(llm, {})
+    reserve = config.get("default_max_tokens") or config.get("default_max_completion_tokens") or 0
+    budget = TokenBudget(llm, reserve=reserve)
+    budget.add(system_message, message=True)
+    budget.add(tokens=0, message=True)
+    
+    # Walk back from the newest message, counting each one on its own
+    turns = []
+    for msg in reversed(messages):
+        if turns and budget.remaining <= 0:
+            logger.info(f"Context window full - using the last {len(turns)} of {len(messages)} messages")
+            break
+        prefix = f"{msg.get('role', 'user').capitalize()}: "
+        budget.add(prefix)
+        content = budget.fit(msg.get("content", ""), keep="tail", marker="...")
+        turns.append(prefix + content)
     
-    # Remove the trailing newlines
-    chat_history = chat_history.rstrip()
+    # Format conversation history as text
+    chat_history = "\n\n".join(reversed(turns)).rstrip()
     
     return {
         "system_prompt": system_message,
@@ -331,12 +350,12 @@ def format_conversation_for_llm(conversation, include_last_n=6):
         "model_config": conversation.get("model_config", {})
     }
 
-def apply_context_to_system_prompt_if_provided(system_prompt, context_id, user_id):
-    """Apply context to system prompt if context_id is provided"""
+def apply_context_to_system_prompt_if_provided(system_prompt, context_id, user_id, llm=None):
+    """Apply context to system prompt if context_id is provided (trimmed to fit the llm)"""
     if context_id:
         try:
             from apis.llm.context_integration import apply_context_to_system_prompt
-            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, user_id)
+            enhanced_system_prompt, error = apply_context_to_system_prompt(system_prompt, context_id, user_id, model=llm)
             if error:
                 logger.warning(f"Error applying context {context_id}: {error}")
                 # Continue with original system prompt but log the issue
@@ -615,7 +634,7 @@ def create_chat_route():
         
         # Apply context if provided
         enhanced_system_message, context_used = apply_context_to_system_prompt_if_provided(
-            system_message, context_id, g.user_id
+            system_message, context_id, g.user_id, llm
         )
         
         # Deduct balance based on LLM credit cost (simplified without endpoint lookup)
@@ -884,12 +903,14 @@ def continue_conversation_route():
         
         conversation["messages"].append({"role": "user", "content": user_message})
         
-        llm_request_data = format_conversation_for_llm(conversation)
-        
+        # Apply context first so the history is fitted around it
+        system_message = ASSISTANT_TYPES.get(assistant_type, ASSISTANT_TYPES["general"])
         enhanced_system_prompt, context_used = apply_context_to_system_prompt_if_provided(
-            llm_request_data["system_prompt"], context_id, g.user_id
+            system_message, context_id, g.user_id, llm
         )
         
+        llm_request_data = format_conversation_for_llm(conversation, system_message=enhanced_system_prompt)
+        
         if llm not in LLM_SERVICES:
             return create_api_response({
                 "error": "Server Error",
@@ -4,15 +4,13 @@ from apis.utils.databaseService import DatabaseService
 from apis.utils.logMiddleware import api_logger
 from apis.utils.balanceMiddleware import check_balance
 from apis.utils.config import get_azure_blob_client, ensure_container_exists
+from apis.utils.tokenBudget import TokenBudget, count_tokens
+from apis.utils.vectorstoreCache import vectorstore_cache
 import logging
 import pytz
 import os
 import uuid
-import tempfile
-import shutil
 from datetime import datetime
-from langchain_openai import AzureOpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import (
     TextLoader,
@@ -54,6 +52,9 @@ LLM_SERVICES = {
 
 from apis.utils.config import create_api_response
 
+# Output tokens kept free when retrieved documents are fitted into the model's context window
+RAG_RESPONSE_RESERVE_TOKENS = 4000
+
 def update_vectorstore_access_timestamp(vectorstore_id):
     """Update the last_accessed timestamp for a vectorstore"""
     try:
@@ -79,7 +80,7 @@ def update_vectorstore_access_timestamp(vectorstore_id):
 
 def count_embedding_tokens(text):
     """
-    Count tokens for the embedding model using tiktoken
+    Count tokens for the embedding model
     
     Args:
         text (str): The text to count tokens for
@@ -87,20 +88,43 @@ def count_embedding_tokens(text):
     Returns:
         int: Token count
     """
-    try:
-        # Import the tokenizer from tiktoken
-        import tiktoken
-        
-        # Use cl100k_base tokenizer for text-embedding-3-large
-        encoding = tiktoken.get_encoding("cl100k_base")
-        
-        # Count tokens
-        token_count = len(encoding.encode(text))
-        return token_count
-    except Exception as e:
-        # Fallback for any issues
-        logger.warning(f"Error using tiktoken: {str(e)}. Using approximate count.")
-        return max(1, len(text) // 4)
+    # text-embedding-3-large uses the cl100k_base tokenizer
+    return count_tokens(text, "text-embedding-3-large")
+
+def build_rag_user_input(model, system_prompt, query, docs):
+    """
+    Build the LLM user input from retrieved documents
+
+    Documents are added in rank order and the last one that fits is trimmed, so the system
+    prompt, question, context and RAG_RESPONSE_RESERVE_TOKENS of output fit the model's
+    context window.
+
+    Args:
+        model (str): LLM model key
+        system_prompt (str): System prompt sent with the request
+        query (str): The user's question
+        docs (list): Retrieved documents, most relevant first
+
+    Returns:
+        str: The user input for the LLM service
+    """
+    template = "Context: {context}\n\nQuestion: {query}\n\nAnswer the question based on the context provided."
+    budget = TokenBudget(model, reserve=RAG_RESPONSE_RESERVE_TOKENS)
+    budget.add(system_prompt, message=True)
+    budget.add(template, message=True)
+    budget.add(query)
+
+    separator_tokens = count_tokens("\n\n", model)
+    parts = []
+    for doc in docs:
+        if budget.remaining <= separator_tokens:
+            logger.info(f"Context window full - using {len(parts)} of {len(docs)} retrieved documents")
+            break
+        if parts:
+            budget.add(tokens=separator_tokens)
+        parts.append(budget.fit(doc.page_content, marker="..."))
+
+    return template.format(context="\n\n".join(parts), query=query)
 
 def consume_git_policies_route():
     """
@@ -261,7 +285,7 @@ def consume_git_policies_route():
     model = data.get('model', 'gpt-4o')  # Default to gpt-4o
     temperature = float(data.get('temperature', 0.15))
     
-    # Count embedding tokens using tiktoken
+    # Count embedding tokens
     embedded_tokens = count_embedding_tokens(query)
     logger.info(f"Query embedding tokens: {embedded_tokens}")
     
@@ -323,63 +347,21 @@ def consume_git_policies_route():
             if conn:
                 conn.close()
         
-        # Create temporary directory to download vectorstore
-        temp_dir = tempfile.mkdtemp()
-        local_vs_path = os.path.join(temp_dir, "vectorstore")
-        os.makedirs(local_vs_path)
-        
         try:
-            # Download vectorstore from blob storage
-            blob_service_client = get_azure_blob_client()
-            container_client = blob_service_client.get_container_client(VECTORSTORE_CONTAINER)
-            
-            # Download all blobs with the vectorstore path prefix
-            blobs = list(container_client.list_blobs(name_starts_with=vectorstore_path))
-            if not blobs:
+            # Load the vectorstore - warm queries are served from this worker's cache
+            vectorstore = vectorstore_cache.get(vectorstore_id, vectorstore_path)
+            if vectorstore is None:
                 return create_api_response({
                     "error": "Not Found",
                     "message": f"Git policies vectorstore files not found in storage for ID {vectorstore_id}"
                 }, 404)
             
-            # Download each blob
-            for blob in blobs:
-                # Get relative path from vectorstore_path
-                rel_path = blob.name[len(vectorstore_path) + 1:] if blob.name.startswith(vectorstore_path + "/") else blob.name
-                # Construct local path
-                local_blob_path = os.path.join(local_vs_path, rel_path)
-                
-                # Create directory if it doesn't exist
-                os.makedirs(os.path.dirname(local_blob_path), exist_ok=True)
-                
-                # Download blob
-                blob_client = container_client.get_blob_client(blob.name)
-                with open(local_blob_path, "wb") as download_file:
-                    download_file.write(blob_client.download_blob().readall())
-            
-            # Load the vectorstore
             try:
-                # Initialize embeddings
-                embeddings = AzureOpenAIEmbeddings(
-                    azure_deployment=os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-large"),
-                    api_key=os.environ.get("OPENAI_API_KEY"),
-                    azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT")
-                )
-                
-                # Load the vectorstore
-                vectorstore = FAISS.load_local(
-                    local_vs_path,
-                    embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                
-                logger.info(f"Successfully loaded git policies vectorstore {vectorstore_id}")
+                logger.info(f"Using git policies vectorstore {vectorstore_id}")
                 
                 # Perform vector search to get relevant documents
                 docs = vectorstore.similarity_search(query, k=4)
                 
-                # Prepare context from retrieved documents
-                context = "\n\n".join([doc.page_content for doc in docs])
-                
                 # Set default system prompt if not provided
                 if not system_prompt:
                     system_prompt = """You are a Git policy assistant that answers questions based on the company's git policies and guidelines.
@@ -388,8 +370,8 @@ def consume_git_policies_route():
                     Format your answers in a clear, concise manner and provide examples where appropriate.
                     Always maintain a helpful, informative tone."""
                 
-                # Prepare request for the LLM model
-                user_input = f"Context: {context}\n\nQuestion: {query}\n\nAnswer the question based on the context provided."
+                # Prepare context from retrieved documents and the LLM user input
+                user_input = build_rag_user_input(model, system_prompt, query, docs)
                 
                 # Use LLM service directly instead of making an API call
                 llm_service = LLM_SERVICES[model]
@@ -464,12 +446,6 @@ def consume_git_policies_route():
                 "error": "Server Error",
                 "message": f"Error loading git policies vectorstore: {str(e)}"
             }, 500)
-        finally:
-            # Clean up temporary directory
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception as e:
-                logger.error(f"Error cleaning up temporary directory: {str(e)}")
                 
     except Exception as e:
         logger.error(f"Error in consume_git_policies_route: {str(e)}")
@@ -692,7 +668,7 @@ def consume_vectorstore_route():
     temperature = float(data.get('temperature', 0.5))
     include_sources = data.get('include_sources', False)
     
-    # Count embedding tokens using tiktoken
+    # Count embedding tokens
     embedded_tokens = count_embedding_tokens(query)
     logger.info(f"Query embedding tokens: {embedded_tokens}")
     
@@ -758,63 +734,21 @@ def consume_vectorstore_route():
             if conn:
                 conn.close()
         
-        # Create temporary directory to download vectorstore
-        temp_dir = tempfile.mkdtemp()
-        local_vs_path = os.path.join(temp_dir, "vectorstore")
-        os.makedirs(local_vs_path)
-        
         try:
-            # Download vectorstore from blob storage
-            blob_service_client = get_azure_blob_client()
-            container_client = blob_service_client.get_container_client(VECTORSTORE_CONTAINER)
-            
-            # Download all blobs with the vectorstore path prefix
-            blobs = list(container_client.list_blobs(name_starts_with=vectorstore_path))
-            if not blobs:
+            # Load the vectorstore - warm queries are served from this worker's cache
+            vectorstore = vectorstore_cache.get(vectorstore_id, vectorstore_path)
+            if vectorstore is None:
                 return create_api_response({
                     "error": "Not Found",
                     "message": f"Vectorstore files not found in storage for ID {vectorstore_id}"
                 }, 404)
             
-            # Download each blob
-            for blob in blobs:
-                # Get relative path from vectorstore_path
-                rel_path = blob.name[len(vectorstore_path) + 1:] if blob.name.startswith(vectorstore_path + "/") else blob.name
-                # Construct local path
-                local_blob_path = os.path.join(local_vs_path, rel_path)
-                
-                # Create directory if it doesn't exist
-                os.makedirs(os.path.dirname(local_blob_path), exist_ok=True)
-                
-                # Download blob
-                blob_client = container_client.get_blob_client(blob.name)
-                with open(local_blob_path, "wb") as download_file:
-                    download_file.write(blob_client.download_blob().readall())
-            
-            # Load the vectorstore
             try:
-                # Initialize embeddings
-                embeddings = AzureOpenAIEmbeddings(
-                    azure_deployment=os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-large"),
-                    api_key=os.environ.get("OPENAI_API_KEY"),
-                    azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT")
-                )
-                
-                # Load the vectorstore
-                vectorstore = FAISS.load_local(
-                    local_vs_path,
-                    embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                
-                logger.info(f"Successfully loaded vectorstore {vectorstore_id}")
+                logger.info(f"Using vectorstore {vectorstore_id}")
                 
                 # Perform vector search to get relevant documents
                 docs = vectorstore.similarity_search(query, k=4)
                 
-                # Prepare context from retrieved documents
-                context = "\n\n".join([doc.page_content for doc in docs])
-                
                 # Set default system prompt if not provided
                 if not system_prompt:
                     system_prompt = """You are a helpful AI assistant that answers questions based on the provided context. 
@@ -822,8 +756,8 @@ def consume_vectorstore_route():
                     If the context doesn't contain the answer, say you don't know based on the available information.
                     Always maintain a helpful, informative tone."""
                 
-                # Prepare user input for the LLM model
-                user_input = f"Context: {context}\n\nQuestion: {query}\n\nAnswer the question based on the context provided."
+                # Prepare context from retrieved documents and the LLM user input
+                user_input = build_rag_user_input(model, system_prompt, query, docs)
                 
                 # Use LLM service directly instead of making an API call
                 llm_service = LLM_SERVICES[model]
@@ -898,12 +832,6 @@ def consume_vectorstore_route():
                 "error": "Server Error",
                 "message": f"Error loading vectorstore: {str(e)}"
             }, 500)
-        finally:
-            # Clean up temporary directory
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception as e:
-                logger.error(f"Error cleaning up temporary directory: {str(e)}")
                 
     except Exception as e:
         logger.error(f"Error in consume_vectorstore_route: {str(e)}")
@@ -4,6 +4,10 @@ from apis.utils.databaseService import DatabaseService
 from apis.utils.logMiddleware import api_logger
 from apis.utils.balanceMiddleware import check_balance
 from apis.utils.config import get_azure_blob_client, ensure_container_exists
+from apis.utils.vectorstoreCache import vectorstore_cache
+from apis.utils.embeddingPipeline import EmbeddingPipeline
+from apis.utils.tokenBudget import count_tokens
+from apis.rag.vectorstore_advanced import TextProcessor
 import logging
 import pytz
 import os
@@ -12,7 +16,6 @@ import tempfile
 import shutil
 from datetime import datetime
 from langchain_openai import AzureOpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import (
     TextLoader,
@@ -37,7 +40,7 @@ from apis.utils.config import create_api_response
 
 def count_embedding_tokens(text):
     """
-    Count tokens for the embedding model using tiktoken
+    Count tokens for the embedding model
     
     Args:
         text (str): The text to count tokens for
@@ -45,20 +48,8 @@ def count_embedding_tokens(text):
     Returns:
         int: Token count
     """
-    try:
-        # Import the tokenizer from tiktoken
-        import tiktoken
-        
-        # Use cl100k_base tokenizer for text-embedding-3-large
-        encoding = tiktoken.get_encoding("cl100k_base")
-        
-        # Count tokens
-        token_count = len(encoding.encode(text))
-        return token_count
-    except Exception as e:
-        # Fallback for any issues
-        logger.warning(f"Error using tiktoken: {str(e)}. Using approximate count.")
-        return max(1, len(text) // 4)
+    # text-embedding-3-large uses the cl100k_base tokenizer
+    return count_tokens(text, "text-embedding-3-large")
 
 def update_vectorstore_access_timestamp(vectorstore_id):
     """Update the last_accessed timestamp for a vectorstore"""
@@ -100,6 +91,13 @@ def detect_file_type(file_path):
     else:
         raise ValueError(f"Unsupported file type: {file_extension}")
 
+def add_content_hashes(documents):
+    """Stamp documents with the content_hash DocumentProcessor uses, so appends can skip content already embedded"""
+    for doc in documents:
+        cleaned_content = TextProcessor.clean_text(doc.page_content)
+        doc.metadata['content_hash'] = TextProcessor.generate_content_hash(cleaned_content)
+    return documents
+
 def process_file(file_path, metadata=None):
     """Process a file and return documents"""
     try:
@@ -194,7 +192,12 @@ def create_vectorstore_route():
               example: 120
             embedded_tokens:
               type: integer
+              description: Tokens sent to the embedding model
               example: 65000
+            embedding_cached_tokens:
+              type: integer
+              description: Tokens whose embeddings came from the embedding cache
+              example: 4000
             embedding_model:
               type: string
               example: "text-embedding-3-large"
@@ -370,7 +373,7 @@ def create_vectorstore_route():
                     "file_id": file_id
                 }
                 
-                docs = process_file(local_file_path, metadata)
+                docs = add_content_hashes(process_file(local_file_path, metadata))
                 all_documents.extend(docs)
                 files_processed += 1
                 
@@ -403,19 +406,18 @@ def create_vectorstore_route():
         vectorstore_id = str(uuid.uuid4())
         vectorstore_path = f"{user_id}-{vectorstore_id}"
         
-        # Initialize embeddings
+        # Initialize embeddings - the embedding pipeline retries throttled requests itself
         embeddings = AzureOpenAIEmbeddings(
             azure_deployment=embedding_model,
             api_key=os.environ.get("OPENAI_API_KEY"),
-            azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT")
+            azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT"),
+            max_retries=0
         )
         
-        # Count tokens using tiktoken
-        total_text = " ".join([chunk.page_content for chunk in chunks])
-        estimated_tokens = count_embedding_tokens(total_text)
-                
-        # Create FAISS index
-        vectorstore = FAISS.from_documents(chunks, embeddings)
+        # Create FAISS index with concurrent embedding requests (tokens counted per chunk)
+        vectorstore, embedding_stats = EmbeddingPipeline(embeddings).build_vectorstore(chunks)
+        estimated_tokens = embedding_stats["embedded_tokens"]
+        embedding_cached_tokens = embedding_stats["cached_tokens"]
         
         # Create a temporary path to save the vectorstore
         temp_vs_path = os.path.join(temp_dir, "vectorstore")
@@ -496,6 +498,7 @@ def create_vectorstore_route():
             "document_count": len(all_documents),
             "chunk_count": len(chunks),
             "embedded_tokens": estimated_tokens,
+            "embedding_cached_tokens": embedding_cached_tokens,
             "embedding_model": embedding_model
         }, 200)
         
@@ -714,6 +717,7 @@ def delete_vectorstore_route():
         blobs = container_client.list_blobs(name_starts_with=vectorstore_path)
         for blob in blobs:
             container_client.delete_blob(blob)
+        vectorstore_cache.invalidate(vectorstore_id)
         
         # Delete from database
         conn = None
@@ -1006,55 +1010,16 @@ def load_vectorstore_route():
             if conn:
                 conn.close()
         
-        # Create temporary directory to download vectorstore
-        temp_dir = tempfile.mkdtemp()
-        local_vs_path = os.path.join(temp_dir, "vectorstore")
-        os.makedirs(local_vs_path)
-        
         try:
-            # Download vectorstore from blob storage
-            blob_service_client = get_azure_blob_client()
-            container_client = blob_service_client.get_container_client(VECTORSTORE_CONTAINER)
-            
-            # Download all blobs with the vectorstore path prefix
-            blobs = list(container_client.list_blobs(name_starts_with=vectorstore_path))
-            if not blobs:
-                return create_api_response({
-                    "error": "Not Found",
-                    "message": f"Vectorstore files not found in storage for ID {vectorstore_id}"
-                }, 404)
-            
-            # Download each blob
-            for blob in blobs:
-                # Get relative path from vectorstore_path
-                rel_path = blob.name[len(vectorstore_path) + 1:] if blob.name.startswith(vectorstore_path + "/") else blob.name
-                # Construct local path
-                local_blob_path = os.path.join(local_vs_path, rel_path)
-                
-                # Create directory if it doesn't exist
-                os.makedirs(os.path.dirname(local_blob_path), exist_ok=True)
-                
-                # Download blob
-                blob_client = container_client.get_blob_client(blob.name)
-                with open(local_blob_path, "wb") as download_file:
-                    download_file.write(blob_client.download_blob().readall())
-            
-            # Test loading the vectorstore to ensure it's valid
+            # Load the vectorstore into this worker's cache so the following queries are warm
             try:
-                # Initialize embeddings
                 embedding_model = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-large")
-                embeddings = AzureOpenAIEmbeddings(
-                    azure_deployment=embedding_model,
-                    api_key=os.environ.get("OPENAI_API_KEY"),
-                    azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT")
-                )
-                
-                # Load the vectorstore
-                FAISS.load_local(
-                    local_vs_path,
-                    embeddings,
-                    allow_dangerous_deserialization=True
-                )
+                vectorstore = vectorstore_cache.get(vectorstore_id, vectorstore_path)
+                if vectorstore is None:
+                    return create_api_response({
+                        "error": "Not Found",
+                        "message": f"Vectorstore files not found in storage for ID {vectorstore_id}"
+                    }, 404)
                 
                 logger.info(f"Successfully loaded vectorstore {vectorstore_id}")
             except Exception as e:
@@ -1084,12 +1049,6 @@ def load_vectorstore_route():
                 "error": "Server Error",
                 "message": f"Error loading vectorstore: {str(e)}"
             }, 500)
-        finally:
-            # Clean up temporary directory
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception as e:
-                logger.error(f"Error cleaning up temporary directory: {str(e)}")
                 
     except Exception as e:
         logger.error(f"Error in load_vectorstore_route: {str(e)}")
@@ -1377,7 +1336,12 @@ def create_vectorstore_from_string_route():
               example: "User Input"
             embedded_tokens:
               type: integer
+              description: Tokens sent to the embedding model
               example: 1200
+            embedding_cached_tokens:
+              type: integer
+              description: Tokens whose embeddings came from the embedding cache
+              example: 4000
             embedding_model:
               type: string
               example: "text-embedding-3-large"
@@ -1503,6 +1467,7 @@ def create_vectorstore_from_string_route():
             page_content=content,
             metadata=metadata
         )
+        add_content_hashes([doc])
         
         # Create text splitter
         # For string input, RecursiveCharacterTextSplitter works well with smaller chunks
@@ -1532,19 +1497,19 @@ def create_vectorstore_from_string_route():
         vectorstore_id = str(uuid.uuid4())
         vectorstore_path = f"{user_id}-{vectorstore_id}"
         
-        # Count tokens using tiktoken
-        estimated_tokens = count_embedding_tokens(content)
-        
-        # Initialize embeddings
+        # Initialize embeddings - the embedding pipeline retries throttled requests itself
         embedding_model = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-large")
         embeddings = AzureOpenAIEmbeddings(
             azure_deployment=embedding_model,
             api_key=os.environ.get("OPENAI_API_KEY"),
-            azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT")
+            azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT"),
+            max_retries=0
         )
         
-        # Create FAISS index
-        vectorstore = FAISS.from_documents(chunks, embeddings)
+        # Create FAISS index with concurrent embedding requests (tokens counted per chunk)
+        vectorstore, embedding_stats = EmbeddingPipeline(embeddings).build_vectorstore(chunks)
+        estimated_tokens = embedding_stats["embedded_tokens"]
+        embedding_cached_tokens = embedding_stats["cached_tokens"]
         
         # Create a temporary path to save the vectorstore
         temp_vs_path = os.path.join(temp_dir, "vectorstore")
@@ -1625,6 +1590,7 @@ def create_vectorstore_from_string_route():
             "chunk_count": len(chunks),
             "content_source": content_source,
             "embedded_tokens": estimated_tokens,
+            "embedding_cached_tokens": embedding_cached_tokens,
             "embedding_model": embedding_model
         }, 200)
         
@@ -20,6 +20,8 @@ from apis.utils.databaseService import DatabaseService
 from apis.utils.logMiddleware import api_logger
 from apis.utils.balanceMiddleware import check_balance
 from apis.utils.config import get_azure_blob_client, ensure_container_exists
+from apis.utils.embeddingPipeline import EmbeddingPipeline
+from apis.utils.tokenBudget import count_tokens
 from langchain_openai import AzureOpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -47,7 +49,7 @@ from apis.utils.config import create_api_response
 
 def count_embedding_tokens(text):
     """
-    Count tokens for the embedding model using tiktoken
+    Count tokens for the embedding model
     
     Args:
         text (str): The text to count tokens for
@@ -55,20 +57,8 @@ def count_embedding_tokens(text):
     Returns:
         int: Token count
     """
-    try:
-        # Import the tokenizer from tiktoken
-        import tiktoken
-        
-        # Use cl100k_base tokenizer for text-embedding-3-large
-        encoding = tiktoken.get_encoding("cl100k_base")
-        
-        # Count tokens
-        token_count = len(encoding.encode(text))
-        return token_count
-    except Exception as e:
-        # Fallback for any issues
-        logger.warning(f"Error using tiktoken: {str(e)}. Using approximate count.")
-        return max(1, len(text) // 4)
+    # text-embedding-3-large uses the cl100k_base tokenizer
+    return count_tokens(text, "text-embedding-3-large")
 
 
 def update_vectorstore_access_timestamp(vectorstore_id):
@@ -209,42 +199,14 @@ class VectorstoreCreator:
                                batch_size: int = 50,
                                retry_delay: int = 5,
                                max_retries: int = 3) -> FAISS:
-        """Create a FAISS vectorstore with enhanced batch processing."""
-        vectorstore = None
-        total_batches = len(documents) // batch_size + (1 if len(documents) % batch_size else 0)
-        
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i + batch_size]
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    # Create new vectorstore for batch
-                    batch_vectorstore = FAISS.from_documents(
-                        batch, 
-                        self.embeddings,
-                        normalize_L2=True
-                    )
-                    
-                    # Merge with existing vectorstore if it exists
-                    if vectorstore is None:
-                        vectorstore = batch_vectorstore
-                    else:
-                        vectorstore.merge_from(batch_vectorstore)
-                    
-                    break
-                    
-                except Exception as e:
-                    retry_count += 1
-                    logger.warning(f"Batch processing failed (attempt {retry_count}/{max_retries}): {str(e)}")
-                    
-                    if retry_count < max_retries:
-                        logger.info(f"Waiting {retry_delay} seconds before retrying...")
-                        time.sleep(retry_delay)
-                    else:
-                        logger.error(f"Failed to process batch after {max_retries} attempts")
-                        raise
-        
+        """Create a FAISS vectorstore with concurrent, rate-limited embedding batches."""
+        pipeline = EmbeddingPipeline(
+            self.embeddings,
+            batch_size=batch_size,
+            max_retries=max_retries,
+            retry_delay=retry_delay
+        )
+        vectorstore, self.embedding_stats = pipeline.build_vectorstore(documents, normalize_L2=True)
         return vectorstore
 
 def create_advanced_vectorstore_route():
@@ -330,7 +292,12 @@ def create_advanced_vectorstore_route():
               example: 250
             embedded_tokens:
               type: integer
+              description: Tokens sent to the embedding model
               example: 125000
+            embedding_cached_tokens:
+              type: integer
+              description: Tokens whose embeddings came from the embedding cache
+              example: 4000
             embedding_model:
               type: string
               example: "text-embedding-3-large"
@@ -633,13 +600,11 @@ def create_advanced_vectorstore_route():
             azure_deployment=embedding_model,
             api_key=os.environ.get("OPENAI_API_KEY"),
             azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT"),
-            chunk_size=chunk_size
+            chunk_size=chunk_size,
+            # The embedding pipeline retries throttled requests itself
+            max_retries=0
         )
         
-        # Count tokens using tiktoken
-        total_text = " ".join([chunk.page_content for chunk in chunks])
-        estimated_tokens = count_embedding_tokens(total_text)
-        
         # Create vectorstore creator
         creator = VectorstoreCreator(embeddings)
         
@@ -650,6 +615,10 @@ def create_advanced_vectorstore_route():
             max_retries=max_retries
         )
         
+        # Tokens counted per chunk while batching
+        estimated_tokens = creator.embedding_stats["embedded_tokens"]
+        embedding_cached_tokens = creator.embedding_stats["cached_tokens"]
+        
         # Create a temporary path to save the vectorstore
         temp_vs_path = os.path.join(temp_dir, "vectorstore")
         vectorstore.save_local(temp_vs_path)
@@ -734,6 +703,7 @@ def create_advanced_vectorstore_route():
             "document_count": len(all_documents),
             "chunk_count": len(chunks),
             "embedded_tokens": estimated_tokens,
+            "embedding_cached_tokens": embedding_cached_tokens,
             "embedding_model": embedding_model,
             "processing_stats": processing_stats
         }, 200)
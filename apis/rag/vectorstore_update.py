@@ -0,0 +1,823 @@
+from flask import jsonify, request, g, make_response
+from apis.utils.databaseService import DatabaseService
+from apis.utils.logMiddleware import api_logger
+from apis.utils.balanceMiddleware import check_balance
+from apis.utils.config import get_azure_blob_client
+from apis.utils.vectorstoreCache import vectorstore_cache, get_embeddings, download_vectorstore
+from apis.utils.embeddingPipeline import EmbeddingPipeline
+from apis.rag.vectorstore import process_file, add_content_hashes
+from apis.rag.vectorstore_advanced import DocumentProcessor
+import logging
+import pytz
+import os
+import json
+import time
+import uuid
+import tempfile
+import shutil
+import requests
+from datetime import datetime
+from langchain_openai import AzureOpenAIEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# Define container for vectorstores
+VECTORSTORE_CONTAINER = "vectorstores"
+
+from apis.utils.config import create_api_response
+
+def authenticate_request():
+    """
+    Validate the X-Token header and set g.user_id / g.token_id
+
+    Returns:
+        tuple: (user_id, user_details, None) or (None, None, error_response)
+    """
+    token = request.headers.get('X-Token')
+    if not token:
+        return None, None, create_api_response({
+            "error": "Authentication Error",
+            "message": "Missing X-Token header"
+        }, 401)
+
+    # Validate token from database
+    token_details = DatabaseService.get_token_details_by_value(token)
+    if not token_details:
+        return None, None, create_api_response({
+            "error": "Authentication Error",
+            "message": "Invalid token - not found in database"
+        }, 401)
+
+    # Store token ID and user ID in g for logging and balance check
+    g.token_id = token_details["id"]
+    g.user_id = token_details["user_id"]
+
+    # Check if token is expired
+    now = datetime.now(pytz.UTC)
+    expiration_time = token_details["token_expiration_time"]
+
+    # Ensure expiration_time is timezone-aware
+    if expiration_time.tzinfo is None:
+        johannesburg_tz = pytz.timezone('Africa/Johannesburg')
+        expiration_time = johannesburg_tz.localize(expiration_time)
+
+    if now > expiration_time:
+        return None, None, create_api_response({
+            "error": "Authentication Error",
+            "message": "Token has expired"
+        }, 401)
+
+    # Get user details
+    user_id = token_details["user_id"]
+    user_details = DatabaseService.get_user_by_id(user_id)
+    if not user_details:
+        return None, None, create_api_response({
+            "error": "Authentication Error",
+            "message": "User associated with token not found"
+        }, 401)
+
+    return user_id, user_details, None
+
+def get_vectorstore_for_update(vectorstore_id, user_id, user_details):
+    """
+    Get a vectorstore record the user may modify
+
+    Returns:
+        tuple: (record dict, None) or (None, error_response)
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = DatabaseService.get_connection()
+        cursor = conn.cursor()
+
+        query = """
+        SELECT id, user_id, path, name, file_count, document_count, chunk_count, chunk_size, chunk_overlap
+        FROM vectorstores
+        WHERE id = ?
+        """
+
+        cursor.execute(query, [vectorstore_id])
+        row = cursor.fetchone()
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+    if not row:
+        return None, create_api_response({
+            "error": "Not Found",
+            "message": f"Vectorstore with ID {vectorstore_id} not found"
+        }, 404)
+
+    # Check if vectorstore belongs to user (or if admin)
+    if row[1] != user_id and user_details.get("scope", 1) != 0:  # Not owner and not admin
+        return None, create_api_response({
+            "error": "Forbidden",
+            "message": "You don't have permission to modify this vectorstore"
+        }, 403)
+
+    return {
+        "id": str(row[0]),
+        "user_id": row[1],
+        "path": row[2],
+        "name": row[3],
+        "file_count": row[4] or 0,
+        "document_count": row[5] or 0,
+        "chunk_count": row[6] or 0,
+        "chunk_size": row[7],
+        "chunk_overlap": row[8]
+    }, None
+
+def load_vectorstore_for_update(vectorstore_path, temp_dir):
+    """
+    Download a vectorstore into temp_dir and load it into memory for modification
+
+    Returns:
+        FAISS: The vectorstore, or None if it has no files in storage
+    """
+    container_client = get_azure_blob_client().get_container_client(VECTORSTORE_CONTAINER)
+    blobs = list(container_client.list_blobs(name_starts_with=f"{vectorstore_path}/"))
+    if not blobs:
+        return None
+
+    local_path = os.path.join(temp_dir, "current")
+    download_vectorstore(container_client, vectorstore_path, blobs, local_path)
+    return FAISS.load_local(local_path, get_embeddings(), allow_dangerous_deserialization=True)
+
+def iter_vectorstore_documents(vectorstore):
+    """Yield (docstore id, Document) for every vector of a vectorstore"""
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        doc = vectorstore.docstore.search(doc_id)
+        if not isinstance(doc, str):
+            yield doc_id, doc
+
+def document_key(metadata):
+    """Identify the source document of a chunk - chunks split from one document share its metadata"""
+    return json.dumps(metadata, sort_keys=True, default=str)
+
+def delete_vectorstore_blobs(container_client, path):
+    """Delete every blob of a vectorstore version, logging the ones that fail"""
+    for blob in container_client.list_blobs(name_starts_with=f"{path}/"):
+        try:
+            container_client.delete_blob(blob)
+        except Exception as e:
+            logger.error(f"Error deleting blob {blob.name}: {str(e)}")
+
+def publish_vectorstore_update(vectorstore, record, temp_dir, file_count, document_count):
+    """
+    Upload a modified vectorstore and switch the vectorstore record to it atomically
+
+    The files go to a new blob path, then the record's path and counts are updated in one
+    statement that only succeeds while the record still points at the path the vectorstore
+    was loaded from. Readers therefore see either the old or the new version, never a mix,
+    and a concurrent update is detected instead of being overwritten. The old blobs are
+    deleted afterwards.
+
+    Returns:
+        dict: The new path and counts, or None if another update changed the vectorstore first
+    """
+    new_path = f"{record['user_id']}-{record['id']}-{uuid.uuid4().hex[:8]}"
+    temp_vs_path = os.path.join(temp_dir, "vectorstore")
+    vectorstore.save_local(temp_vs_path)
+
+    container_client = get_azure_blob_client().get_container_client(VECTORSTORE_CONTAINER)
+
+    try:
+        # Upload each file in the vectorstore directory
+        for root, dirs, files in os.walk(temp_vs_path):
+            for file in files:
+                local_file_path = os.path.join(root, file)
+                rel_path = os.path.relpath(local_file_path, temp_vs_path)
+                with open(local_file_path, "rb") as data:
+                    container_client.upload_blob(name=f"{new_path}/{rel_path}", data=data, overwrite=True)
+    except Exception:
+        delete_vectorstore_blobs(container_client, new_path)
+        raise
+
+    counts = {
+        "path": new_path,
+        "file_count": max(0, file_count),
+        "document_count": max(0, document_count),
+        "chunk_count": vectorstore.index.ntotal
+    }
+
+    conn = None
+    cursor = None
+    try:
+        conn = DatabaseService.get_connection()
+        cursor = conn.cursor()
+
+        query = """
+        UPDATE vectorstores
+        SET path = ?, file_count = ?, document_count = ?, chunk_count = ?,
+            last_accessed = DATEADD(HOUR, 2, GETUTCDATE())
+        WHERE id = ? AND path = ?
+        """
+
+        cursor.execute(query, [
+            new_path,
+            counts["file_count"],
+            counts["document_count"],
+            counts["chunk_count"],
+            record["id"],
+            record["path"]
+        ])
+        updated = cursor.rowcount
+        conn.commit()
+    except Exception:
+        if conn:
+            conn.rollback()
+        # The record still points at the old path - the uploaded version is orphaned
+        delete_vectorstore_blobs(container_client, new_path)
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+    # Whichever version lost is removed from storage
+    delete_vectorstore_blobs(container_client, record["path"] if updated else new_path)
+    vectorstore_cache.invalidate(record["id"])
+
+    if not updated:
+        logger.warning(f"Vectorstore {record['id']} was modified concurrently, discarded update")
+        return None
+    return counts
+
+def load_new_documents(local_file_path, file_name, file_id, preprocessed, doc_processor):
+    """
+    Extract documents from an uploaded file the way the vectorstore's creation route did
+
+    Vectorstores created by the advanced route hold preprocessed documents, so new files go
+    through DocumentProcessor as well; the others keep the raw loader text and only get its
+    content_hash. Documents whose content_hash is already in doc_processor.processed_hashes
+    are skipped.
+
+    Returns:
+        tuple: (new documents, number of duplicates skipped)
+    """
+    if preprocessed:
+        if file_name.lower().endswith('.pdf'):
+            # A fresh processor, so pages already in the vectorstore are counted as duplicates below
+            candidates = DocumentProcessor().process_pdf(local_file_path)
+            for doc in candidates:
+                doc.metadata["file_id"] = file_id
+        else:
+            with open(local_file_path, 'r', errors='ignore') as f:
+                content = f.read()
+            metadata = {
+                "source": file_name,
+                "file_id": file_id,
+                "file_path": local_file_path,
+                "file_size": os.path.getsize(local_file_path),
+                "last_modified": time.ctime(os.path.getmtime(local_file_path))
+            }
+            candidates = [doc_processor.preprocess_document(content, metadata)]
+    else:
+        candidates = add_content_hashes(process_file(local_file_path, {"source": file_name, "file_id": file_id}))
+
+    documents = []
+    for doc in candidates:
+        if doc.metadata["content_hash"] in doc_processor.processed_hashes:
+            continue
+        documents.append(doc)
+        doc_processor.processed_hashes.add(doc.metadata["content_hash"])
+    return documents, len(candidates) - len(documents)
+
+def add_vectorstore_documents_route():
+    """
+    Add files to an existing FAISS vectorstore without rebuilding it
+
+    Only content that is not in the vectorstore yet (by content hash) is chunked and embedded.
+    ---
+    tags:
+      - RAG
+    parameters:
+      - name: X-Token
+        in: header
+        type: string
+        required: true
+        description: Authentication token
+      - name: X-Correlation-ID
+        in: header
+        type: string
+        required: false
+        description: Unique identifier for tracking requests across multiple systems
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - vectorstore_id
+            - file_ids
+          properties:
+            vectorstore_id:
+              type: string
+              description: ID of the vectorstore to add to
+            file_ids:
+              type: array
+              items:
+                type: string
+              description: Array of file IDs to add (uploaded via /file endpoint)
+            chunk_size:
+              type: integer
+              description: Size of text chunks (defaults to the vectorstore's chunk size)
+            chunk_overlap:
+              type: integer
+              description: Overlap between chunks (defaults to the vectorstore's chunk overlap)
+    produces:
+      - application/json
+    responses:
+      200:
+        description: Documents added successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: "Documents added successfully"
+            vectorstore_id:
+              type: string
+              example: "12345678-1234-1234-1234-123456789012"
+            files_added:
+              type: integer
+              example: 2
+            documents_added:
+              type: integer
+              example: 14
+            duplicates_skipped:
+              type: integer
+              example: 3
+            chunks_added:
+              type: integer
+              example: 40
+            file_count:
+              type: integer
+              example: 7
+            document_count:
+              type: integer
+              example: 112
+            chunk_count:
+              type: integer
+              example: 290
+            embedded_tokens:
+              type: integer
+              description: Tokens sent to the embedding model
+              example: 20000
+            embedding_cached_tokens:
+              type: integer
+              description: Tokens whose embeddings came from the embedding cache
+              example: 4000
+            embedding_model:
+              type: string
+              example: "text-embedding-3-large"
+      400:
+        description: Bad request
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Bad Request"
+            message:
+              type: string
+              example: "Missing required field: file_ids must be an array with at least one file ID"
+      401:
+        description: Authentication error
+      403:
+        description: Forbidden
+      404:
+        description: Vectorstore not found
+      409:
+        description: The vectorstore was modified by another request - retry
+      500:
+        description: Server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Server Error"
+            message:
+              type: string
+              example: "Error adding documents to vectorstore"
+    """
+    user_id, user_details, error_response = authenticate_request()
+    if error_response:
+        return error_response
+
+    # Get request data
+    data = request.get_json()
+    if not data:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": "Request body is required"
+        }, 400)
+
+    vectorstore_id = data.get('vectorstore_id')
+    if not vectorstore_id:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": "Missing required field: vectorstore_id"
+        }, 400)
+
+    if 'file_ids' not in data or not data['file_ids']:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": "Missing required field: file_ids must be an array with at least one file ID"
+        }, 400)
+
+    # Ensure file_ids is a list
+    file_ids = data['file_ids']
+    if not isinstance(file_ids, list):
+        file_ids = [file_ids]
+
+    temp_dir = None
+    try:
+        record, error_response = get_vectorstore_for_update(vectorstore_id, user_id, user_details)
+        if error_response:
+            return error_response
+
+        chunk_size = int(data.get('chunk_size', record["chunk_size"] or 1000))
+        chunk_overlap = int(data.get('chunk_overlap', record["chunk_overlap"] or 200))
+
+        temp_dir = tempfile.mkdtemp()
+        vectorstore = load_vectorstore_for_update(record["path"], temp_dir)
+        if vectorstore is None:
+            return create_api_response({
+                "error": "Not Found",
+                "message": f"Vectorstore files for ID {vectorstore_id} not found in storage"
+            }, 404)
+
+        # Content already in the vectorstore is skipped
+        doc_processor = DocumentProcessor()
+        preprocessed = False
+        for _, doc in iter_vectorstore_documents(vectorstore):
+            if doc.metadata.get("content_hash"):
+                doc_processor.processed_hashes.add(doc.metadata["content_hash"])
+            preprocessed = preprocessed or bool(doc.metadata.get("preprocessed"))
+
+        new_documents = []
+        files_added = 0
+        duplicates_skipped = 0
+
+        # Get a database connection to access file data directly
+        conn = DatabaseService.get_connection()
+
+        for file_id in file_ids:
+            try:
+                cursor = conn.cursor()
+                query = """
+                SELECT id, user_id, original_filename, blob_name, blob_url, content_type
+                FROM file_uploads
+                WHERE id = ?
+                """
+                cursor.execute(query, [file_id])
+                file_record = cursor.fetchone()
+                cursor.close()
+
+                if not file_record:
+                    logger.error(f"File record not found for ID {file_id}")
+                    continue
+
+                file_name = file_record[2]
+                blob_url = file_record[4]
+
+                # Download the file using the blob_url
+                file_response = requests.get(blob_url, stream=True)
+                if file_response.status_code != 200:
+                    logger.error(f"Failed to download file: Status {file_response.status_code}")
+                    continue
+
+                # Save to temporary location
+                local_file_path = os.path.join(temp_dir, file_name)
+                with open(local_file_path, 'wb') as f:
+                    for chunk in file_response.iter_content(chunk_size=8192):
+                        if chunk:
+                            f.write(chunk)
+
+                documents, duplicates = load_new_documents(local_file_path, file_name, file_id, preprocessed, doc_processor)
+                duplicates_skipped += duplicates
+                if documents:
+                    new_documents.extend(documents)
+                    files_added += 1
+
+                logger.info(f"Processed file {file_name}, {len(documents)} new documents, {duplicates} duplicates")
+
+            except Exception as e:
+                logger.error(f"Error processing file ID {file_id}: {str(e)}")
+                continue
+
+        # Close the connection when done
+        conn.close()
+
+        embedding_model = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-large")
+
+        if not new_documents:
+            return create_api_response({
+                "message": "No new content to add - the files are already in the vectorstore or could not be processed",
+                "vectorstore_id": vectorstore_id,
+                "files_added": 0,
+                "documents_added": 0,
+                "duplicates_skipped": duplicates_skipped,
+                "chunks_added": 0,
+                "file_count": record["file_count"],
+                "document_count": record["document_count"],
+                "chunk_count": record["chunk_count"],
+                "embedded_tokens": 0,
+                "embedding_cached_tokens": 0,
+                "embedding_model": embedding_model
+            }, 200)
+
+        # Split new documents with the splitter the vectorstore was created with
+        if preprocessed:
+            text_splitter = RecursiveCharacterTextSplitter(
+                separators=["\n\n", "\n", ". ", " ", ""],
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                length_function=len
+            )
+        else:
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap
+            )
+        chunks = text_splitter.split_documents(new_documents)
+        logger.info(f"Split {len(new_documents)} new documents into {len(chunks)} chunks")
+
+        # Initialize embeddings - the embedding pipeline retries throttled requests itself
+        embeddings = AzureOpenAIEmbeddings(
+            azure_deployment=embedding_model,
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT"),
+            max_retries=0
+        )
+
+        # Embed only the new chunks and add them to the loaded index
+        embedding_stats = EmbeddingPipeline(embeddings).add_documents(vectorstore, chunks)
+
+        counts = publish_vectorstore_update(
+            vectorstore,
+            record,
+            temp_dir,
+            record["file_count"] + files_added,
+            record["document_count"] + len(new_documents)
+        )
+        if counts is None:
+            return create_api_response({
+                "error": "Conflict",
+                "message": "The vectorstore was modified by another request, please retry"
+            }, 409)
+
+        return create_api_response({
+            "message": "Documents added successfully",
+            "vectorstore_id": vectorstore_id,
+            "files_added": files_added,
+            "documents_added": len(new_documents),
+            "duplicates_skipped": duplicates_skipped,
+            "chunks_added": len(chunks),
+            "file_count": counts["file_count"],
+            "document_count": counts["document_count"],
+            "chunk_count": counts["chunk_count"],
+            "embedded_tokens": embedding_stats["embedded_tokens"],
+            "embedding_cached_tokens": embedding_stats["cached_tokens"],
+            "embedding_model": embedding_model
+        }, 200)
+
+    except Exception as e:
+        logger.error(f"Error adding documents to vectorstore: {str(e)}")
+        return create_api_response({
+            "error": "Server Error",
+            "message": f"Error adding documents to vectorstore: {str(e)}"
+        }, 500)
+    finally:
+        # Clean up temporary directory
+        if temp_dir:
+            try:
+                shutil.rmtree(temp_dir)
+            except Exception as e:
+                logger.error(f"Error cleaning up temporary directory: {str(e)}")
+
+def delete_vectorstore_documents_route():
+    """
+    Remove the documents of given source files from a FAISS vectorstore without rebuilding it
+
+    Chunks match when their file_id is in file_ids or their source (file name, or the
+    content_source of string vectorstores) is in sources.
+    ---
+    tags:
+      - RAG
+    parameters:
+      - name: X-Token
+        in: header
+        type: string
+        required: true
+        description: Authentication token
+      - name: X-Correlation-ID
+        in: header
+        type: string
+        required: false
+        description: Unique identifier for tracking requests across multiple systems
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - vectorstore_id
+          properties:
+            vectorstore_id:
+              type: string
+              description: ID of the vectorstore to remove documents from
+            file_ids:
+              type: array
+              items:
+                type: string
+              description: File IDs whose documents should be removed
+            sources:
+              type: array
+              items:
+                type: string
+              description: Sources (file names) whose documents should be removed
+    produces:
+      - application/json
+    responses:
+      200:
+        description: Documents removed successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: "Documents removed successfully"
+            vectorstore_id:
+              type: string
+              example: "12345678-1234-1234-1234-123456789012"
+            files_removed:
+              type: integer
+              example: 1
+            documents_removed:
+              type: integer
+              example: 12
+            chunks_removed:
+              type: integer
+              example: 35
+            file_count:
+              type: integer
+              example: 4
+            document_count:
+              type: integer
+              example: 86
+            chunk_count:
+              type: integer
+              example: 215
+      400:
+        description: Bad request
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Bad Request"
+            message:
+              type: string
+              example: "Provide file_ids or sources to remove"
+      401:
+        description: Authentication error
+      403:
+        description: Forbidden
+      404:
+        description: Vectorstore not found or no documents match the given sources
+      409:
+        description: The vectorstore was modified by another request - retry
+      500:
+        description: Server error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Server Error"
+            message:
+              type: string
+              example: "Error removing documents from vectorstore"
+    """
+    user_id, user_details, error_response = authenticate_request()
+    if error_response:
+        return error_response
+
+    # Get request data
+    data = request.get_json()
+    if not data:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": "Request body is required"
+        }, 400)
+
+    vectorstore_id = data.get('vectorstore_id')
+    if not vectorstore_id:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": "Missing required field: vectorstore_id"
+        }, 400)
+
+    file_ids = data.get('file_ids') or []
+    sources = data.get('sources') or []
+    if not isinstance(file_ids, list):
+        file_ids = [file_ids]
+    if not isinstance(sources, list):
+        sources = [sources]
+    if not file_ids and not sources:
+        return create_api_response({
+            "error": "Bad Request",
+            "message": "Provide file_ids or sources to remove"
+        }, 400)
+
+    file_ids = {str(file_id) for file_id in file_ids}
+    sources = {str(source) for source in sources}
+
+    temp_dir = None
+    try:
+        record, error_response = get_vectorstore_for_update(vectorstore_id, user_id, user_details)
+        if error_response:
+            return error_response
+
+        temp_dir = tempfile.mkdtemp()
+        vectorstore = load_vectorstore_for_update(record["path"], temp_dir)
+        if vectorstore is None:
+            return create_api_response({
+                "error": "Not Found",
+                "message": f"Vectorstore files for ID {vectorstore_id} not found in storage"
+            }, 404)
+
+        ids_to_remove = []
+        removed_documents = set()
+        removed_files = set()
+        for doc_id, doc in iter_vectorstore_documents(vectorstore):
+            file_id = doc.metadata.get("file_id")
+            source = doc.metadata.get("source")
+            if (file_id is not None and str(file_id) in file_ids) or (source is not None and str(source) in sources):
+                ids_to_remove.append(doc_id)
+                removed_documents.add(document_key(doc.metadata))
+                removed_files.add(str(file_id) if file_id is not None else str(source))
+
+        if not ids_to_remove:
+            return create_api_response({
+                "error": "Not Found",
+                "message": "No documents in the vectorstore match the given file_ids or sources"
+            }, 404)
+
+        vectorstore.delete(ids_to_remove)
+
+        counts = publish_vectorstore_update(
+            vectorstore,
+            record,
+            temp_dir,
+            record["file_count"] - len(removed_files),
+            record["document_count"] - len(removed_documents)
+        )
+        if counts is None:
+            return create_api_response({
+                "error": "Conflict",
+                "message": "The vectorstore was modified by another request, please retry"
+            }, 409)
+
+        return create_api_response({
+            "message": "Documents removed successfully",
+            "vectorstore_id": vectorstore_id,
+            "files_removed": len(removed_files),
+            "documents_removed": len(removed_documents),
+            "chunks_removed": len(ids_to_remove),
+            "file_count": counts["file_count"],
+            "document_count": counts["document_count"],
+            "chunk_count": counts["chunk_count"]
+        }, 200)
+
+    except Exception as e:
+        logger.error(f"Error removing documents from vectorstore: {str(e)}")
+        return create_api_response({
+            "error": "Server Error",
+            "message": f"Error removing documents from vectorstore: {str(e)}"
+        }, 500)
+    finally:
+        # Clean up temporary directory
+        if temp_dir:
+            try:
+                shutil.rmtree(temp_dir)
+            except Exception as e:
+                logger.error(f"Error cleaning up temporary directory: {str(e)}")
+
+def register_vectorstore_update_routes(app):
+    from apis.utils.usageMiddleware import track_usage
+    from apis.utils.rbacMiddleware import check_endpoint_access
+
+    """Register incremental vectorstore update routes with the Flask app"""
+    app.route('/rag/vectorstore/documents/add', methods=['POST'])(track_usage(api_logger(check_endpoint_access(check_balance(add_vectorstore_documents_route)))))
+    app.route('/rag/vectorstore/documents/remove', methods=['POST'])(track_usage(api_logger(check_endpoint_access(check_balance(delete_vectorstore_documents_route)))))
@@ -149,7 +149,7 @@ def get_token_details_route():
             token_status = "expired"
         else:
             # Validate token with Microsoft Graph
-            is_valid = TokenService.validate_token(token)
+            is_valid = TokenService.validate_token(token, expiration_time)
             token_status = "valid" if is_valid else "invalid"
         
         response_data = {
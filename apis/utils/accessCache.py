@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from apis.utils.endpointRegistry import FileInvalidationChannel
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# CACHE CONFIGURATION
+ACCESS_CACHE_ENABLED = os.environ.get("ACCESS_CACHE_ENABLED", "true").lower() == "true"
+ACCESS_CACHE_TTL = float(os.environ.get("ACCESS_CACHE_TTL", 300))
+ACCESS_CACHE_MAX_USERS = int(os.environ.get("ACCESS_CACHE_MAX_USERS", 10000))
+# Optional cross-worker invalidation channel (see endpointRegistry.FileInvalidationChannel)
+ACCESS_CACHE_SYNC_FILE = os.environ.get("ACCESS_CACHE_SYNC_FILE")
+
+
+class UserAccessCache:
+    """
+    LRU cache of each user's endpoint access set
+
+    A user's entry holds whether they are an admin (scope 0) and a frozenset of the
+    endpoint ids they were granted, loaded with one query. Authorisation checks are
+    then a set membership test. Grants and revocations invalidate the user's entry;
+    entries also expire after the TTL as a safety net.
+
+    Loads run outside the lock, so every invalidation bumps a generation counter and a
+    load that started before it is returned to its caller but not cached - otherwise a
+    load racing a revocation would put the revoked grant back for the whole TTL.
+    """
+
+    def __init__(self, ttl=ACCESS_CACHE_TTL, max_users=ACCESS_CACHE_MAX_USERS, channel=None):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.channel = channel
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _load(self, user_id):
+        from apis.utils.databaseService import DatabaseService
+        return DatabaseService.get_user_access_set(user_id)
+
+    def get_access_set(self, user_id):
+        """
+        Get (is_admin, endpoint_ids) for a user, loading it on a miss
+
+        Returns:
+            tuple: (is_admin, frozenset) or None if the user could not be loaded
+        """
+        key = str(user_id).lower()
+        now = time.monotonic()
+
+        if self.channel and self.channel.changed():
+            self.clear()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry["loaded_at"] < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry["is_admin"], entry["endpoints"]
+            self.stats["misses"] += 1
+            generation = self._generation
+
+        access = self._load(user_id)
+        if access is None:
+            return None
+
+        is_admin, endpoint_ids = access
+        with self._lock:
+            if self._generation != generation:
+                # Invalidated while loading - the result may predate the change
+                return is_admin, endpoint_ids
+            self._entries[key] = {
+                "is_admin": is_admin,
+                "endpoints": endpoint_ids,
+                "loaded_at": now
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+        return is_admin, endpoint_ids
+
+    def has_access(self, user_id, endpoint_id):
+        """
+        Check whether a user may call an endpoint
+
+        Returns:
+            bool: Access decision, or None if the user's access set could not be loaded
+        """
+        access = self.get_access_set(user_id)
+        if access is None:
+            return None
+        is_admin, endpoint_ids = access
+        return is_admin or str(endpoint_id).lower() in endpoint_ids
+
+    def invalidate(self, user_id=None):
+        """Drop one user's entry (or every entry) and signal other workers"""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(user_id).lower(), None)
+        if self.channel:
+            self.channel.publish()
+
+    def clear(self):
+        """Drop every entry in this worker only"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get_stats(self):
+        """Return cache statistics"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["users"] = len(self._entries)
+        return stats
+
+
+# SHARED CACHE FOR THIS WORKER
+user_access_cache = UserAccessCache(
+    channel=FileInvalidationChannel(ACCESS_CACHE_SYNC_FILE) if ACCESS_CACHE_SYNC_FILE else None
+)
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# ATTACHMENT CACHE CONFIGURATION
+# Memory budget for preprocessed attachments (data URLs, extracted text) per worker - 0 disables the cache
+ATTACHMENT_CACHE_MAX_BYTES = int(os.environ.get("ATTACHMENT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Optional local directory that entries evicted from memory spill to, shared by the workers on a host
+ATTACHMENT_CACHE_DIR = os.environ.get("ATTACHMENT_CACHE_DIR", "")
+ATTACHMENT_CACHE_DISK_MAX_BYTES = int(os.environ.get("ATTACHMENT_CACHE_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+# Entries are used without contacting blob storage for this long, then revalidated with their ETag
+ATTACHMENT_CACHE_REVALIDATE_SECONDS = int(os.environ.get("ATTACHMENT_CACHE_REVALIDATE_SECONDS", 300))
+
+
+class AttachmentCache:
+    """
+    Content-addressed cache of preprocessed attachments
+
+    Entries are keyed by (file_id, kind) - kind names the preprocessing, e.g. "data_url" - and
+    remember the blob ETag they were built from. An entry younger than the revalidation window
+    is served as is; an older one is revalidated with If-None-Match, so an unchanged blob is
+    neither downloaded nor re-encoded. Memory is an LRU capped by bytes; with
+    ATTACHMENT_CACHE_DIR set, evicted entries spill to disk and are promoted back on use.
+    """
+
+    def __init__(self, max_bytes=ATTACHMENT_CACHE_MAX_BYTES, cache_dir=ATTACHMENT_CACHE_DIR,
+                 disk_max_bytes=ATTACHMENT_CACHE_DISK_MAX_BYTES, revalidate_seconds=ATTACHMENT_CACHE_REVALIDATE_SECONDS):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        # (file_id, kind) -> {"etag", "value", "checked_at"}
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.disk_lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0, "spills": 0, "disk_hits": 0, "errors": 0}
+        if self.enabled and self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except Exception as e:
+                logger.error(f"Could not create attachment cache directory {self.cache_dir}: {str(e)} - disk spill disabled")
+                self.cache_dir = ""
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, file_id, kind):
+        """
+        Get a cached entry
+
+        Returns:
+            dict: {"etag", "value", "checked_at", "fresh"} or None
+        """
+        if not self.enabled:
+            return None
+        key = (str(file_id), kind)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        if entry is None and self.cache_dir:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self.stats["disk_hits"] += 1
+                self._put_memory(key, entry, spill=False)
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        return {**entry, "fresh": time.time() - entry["checked_at"] < self.revalidate_seconds}
+
+    def put(self, file_id, kind, etag, value):
+        """Cache a preprocessed attachment built from the blob version etag"""
+        if not self.enabled or len(value) > self.max_bytes:
+            return
+        self._put_memory((str(file_id), kind), {"etag": etag, "value": value, "checked_at": time.time()})
+        self.stats["stores"] += 1
+
+    def mark_hit(self, file_id, kind, revalidated=False):
+        """Count a use of a cached entry; a revalidated entry is fresh again"""
+        if revalidated:
+            self.stats["revalidated"] += 1
+            with self.lock:
+                entry = self.entries.get((str(file_id), kind))
+                if entry is not None:
+                    entry["checked_at"] = time.time()
+        else:
+            self.stats["hits"] += 1
+
+    def _put_memory(self, key, entry, spill=True):
+        evicted = []
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous["value"])
+            self.entries[key] = entry
+            self.size += len(entry["value"])
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                old_key, old_entry = self.entries.popitem(last=False)
+                self.size -= len(old_entry["value"])
+                evicted.append((old_key, old_entry))
+        self.stats["evictions"] += len(evicted)
+
+        if self.cache_dir:
+            if spill:
+                for old_key, old_entry in evicted:
+                    self._write_disk(old_key, old_entry)
+            if evicted:
+                self._prune_disk()
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(f"{key[0]}:{key[1]}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Error reading attachment cache file {path}: {str(e)}")
+            return None
+
+    def _write_disk(self, key, entry):
+        path = self._disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(temp_path, path)
+            self.stats["spills"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Error spilling attachment cache entry to {path}: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _prune_disk(self):
+        """Delete the least recently used spill files beyond the disk budget"""
+        with self.disk_lock:
+            try:
+                files = []
+                for name in os.listdir(self.cache_dir):
+                    if name.endswith(".json"):
+                        stat = os.stat(os.path.join(self.cache_dir, name))
+                        files.append((stat.st_mtime, stat.st_size, name))
+                total = sum(size for _, size, _ in files)
+                for _, size, name in sorted(files):
+                    if total <= self.disk_max_bytes:
+                        break
+                    os.remove(os.path.join(self.cache_dir, name))
+                    total -= size
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Error pruning attachment cache directory {self.cache_dir}: {str(e)}")
+
+    def get_stats(self):
+        with self.lock:
+            entries = len(self.entries)
+            size = self.size
+        return {**self.stats, "entries": entries, "bytes": size, "max_bytes": self.max_bytes, "disk_spill": bool(self.cache_dir)}
+
+
+# SHARED ATTACHMENT CACHE FOR THIS WORKER
+attachment_cache = AttachmentCache()
@@ -0,0 +1,235 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from apis.utils.fileService import FileService
+from apis.utils.attachmentCache import attachment_cache
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# ATTACHMENT FETCH CONFIGURATION
+# Concurrent blob downloads per worker (shared by all requests of the worker)
+ATTACHMENT_FETCH_WORKERS = int(os.environ.get("ATTACHMENT_FETCH_WORKERS", 8))
+# Largest single attachment held in memory (Azure OpenAI accepts images up to 20 MB)
+ATTACHMENT_MAX_FILE_BYTES = int(os.environ.get("ATTACHMENT_MAX_FILE_BYTES", 20 * 1024 * 1024))
+# Largest total of attachments held in memory for one request
+ATTACHMENT_MAX_REQUEST_BYTES = int(os.environ.get("ATTACHMENT_MAX_REQUEST_BYTES", 50 * 1024 * 1024))
+ATTACHMENT_CONNECT_TIMEOUT = float(os.environ.get("ATTACHMENT_CONNECT_TIMEOUT", 10))
+ATTACHMENT_READ_TIMEOUT = float(os.environ.get("ATTACHMENT_READ_TIMEOUT", 60))
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+class NotModified(Exception):
+    """The blob still matches the ETag sent with If-None-Match"""
+    pass
+
+
+class ByteBudget:
+    """Bytes a request may still hold in memory, shared by its concurrent downloads"""
+
+    def __init__(self, limit):
+        self.remaining = limit
+        self.lock = threading.Lock()
+
+    def reserve(self, size):
+        with self.lock:
+            if size > self.remaining:
+                return False
+            self.remaining -= size
+            return True
+
+    def release(self, size):
+        with self.lock:
+            self.remaining += size
+
+
+class AttachmentFetcher:
+    """
+    Resolves uploaded files and downloads them into memory for LLM requests
+
+    All file ids of a request are resolved with one database query, then the downloads run
+    concurrently on a bounded per-worker thread pool over one keep-alive HTTP session. Each
+    download is streamed against a per-file and a per-request byte cap, so a request never holds
+    more than ATTACHMENT_MAX_REQUEST_BYTES of attachments.
+    """
+
+    def __init__(self, max_workers=ATTACHMENT_FETCH_WORKERS, max_file_bytes=ATTACHMENT_MAX_FILE_BYTES,
+                 max_request_bytes=ATTACHMENT_MAX_REQUEST_BYTES):
+        self.max_workers = max_workers
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self.lock = threading.Lock()
+        self._pid = None
+        self._session = None
+        self._executor = None
+
+    def _reset_after_fork(self):
+        # Sessions and threads don't survive a fork - each worker builds its own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._session = None
+            self._executor = None
+
+    def get_session(self):
+        with self.lock:
+            self._reset_after_fork()
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def get_executor(self):
+        with self.lock:
+            self._reset_after_fork()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="attachment-fetch")
+            return self._executor
+
+    def fetch(self, file_ids, user_id=None, accept=None, kind=None, encode=None):
+        """
+        Resolve and download files
+
+        Args:
+            file_ids (list): IDs of uploaded files
+            user_id (str, optional): ID of the requesting user (permission check)
+            accept (callable, optional): accept(file_name, content_type) - files it rejects are
+                resolved but not downloaded
+            kind (str, optional): Name of the preprocessing done by encode, e.g. "data_url"
+            encode (callable, optional): encode(data, content_type) -> str. With kind set, the
+                encoded value is served from and stored in the attachment cache
+
+        Returns:
+            list: One dict per file id, in order, with file_id, file_name, content_type,
+                found (resolved and permitted), accepted, data (bytes or None), value
+                (encoded str or None), cached and error
+        """
+        file_infos, lookup_errors = FileService.get_file_urls(file_ids, user_id)
+        budget = ByteBudget(self.max_request_bytes)
+
+        results = []
+        downloads = []
+        for file_id in file_ids:
+            file_id = str(file_id)
+            file_info = file_infos.get(file_id)
+            result = {
+                "file_id": file_id,
+                "file_name": f"file_{file_id}",
+                "content_type": None,
+                "found": False,
+                "accepted": False,
+                "data": None,
+                "value": None,
+                "cached": False,
+                "error": lookup_errors.get(file_id)
+            }
+            results.append(result)
+
+            if not file_info:
+                continue
+            if not file_info.get('file_url') or not file_info.get('content_type'):
+                result["error"] = "Incomplete file information"
+                continue
+
+            result.update({
+                "file_name": file_info.get('file_name') or result["file_name"],
+                "content_type": file_info['content_type'],
+                "found": True
+            })
+            if accept is not None and not accept(result["file_name"], result["content_type"]):
+                continue
+            result["accepted"] = True
+
+            # Files were permission-checked above, so a cached copy is safe to hand out
+            cached = attachment_cache.get(file_id, kind) if kind and encode else None
+            if cached and cached["fresh"]:
+                attachment_cache.mark_hit(file_id, kind)
+                result.update({"value": cached["value"], "cached": True})
+                continue
+            downloads.append((result, file_info['file_url'], cached))
+
+        job_args = [(result, url, budget, kind, encode, cached) for result, url, cached in downloads]
+        if len(job_args) == 1:
+            self._download_into(*job_args[0])
+        elif job_args:
+            executor = self.get_executor()
+            futures = [executor.submit(self._download_into, *args) for args in job_args]
+            for future in futures:
+                future.result()
+
+        return results
+
+    def _download_into(self, result, url, budget, kind=None, encode=None, cached=None):
+        try:
+            data, etag = self.download(url, budget, etag=cached["etag"] if cached else None)
+            if encode is None:
+                result["data"] = data
+            else:
+                result["value"] = encode(data, result["content_type"])
+                if kind:
+                    attachment_cache.put(result["file_id"], kind, etag, result["value"])
+        except NotModified:
+            attachment_cache.mark_hit(result["file_id"], kind, revalidated=True)
+            result.update({"value": cached["value"], "cached": True})
+        except AttachmentTooLarge as e:
+            result["error"] = str(e)
+        except requests.RequestException as e:
+            result["error"] = f"Failed to download file {result['file_name']}: {str(e)}"
+        except Exception as e:
+            result["error"] = f"Error processing file {result['file_name']}: {str(e)}"
+        if result["error"]:
+            logger.error(f"Error fetching file {result['file_id']}: {result['error']}")
+
+    def download(self, url, budget=None, etag=None):
+        """
+        Download a blob into memory, enforcing the per-file cap and the request's byte budget
+
+        Args:
+            url (str): Blob URL
+            budget (ByteBudget, optional): The request's remaining attachment bytes
+            etag (str, optional): ETag of a cached copy - raises NotModified if it still matches
+
+        Returns:
+            tuple: (content bytes, ETag or None)
+        """
+        headers = {"If-None-Match": etag} if etag else None
+        with self.get_session().get(url, stream=True, headers=headers,
+                                    timeout=(ATTACHMENT_CONNECT_TIMEOUT, ATTACHMENT_READ_TIMEOUT)) as response:
+            if response.status_code == 304:
+                raise NotModified()
+            response.raise_for_status()
+
+            declared = response.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > self.max_file_bytes:
+                raise AttachmentTooLarge(f"File is larger than the {self.max_file_bytes // (1024 * 1024)} MB attachment limit")
+
+            chunks = []
+            size = 0
+            try:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if size + len(chunk) > self.max_file_bytes:
+                        raise AttachmentTooLarge(f"File is larger than the {self.max_file_bytes // (1024 * 1024)} MB attachment limit")
+                    if budget is not None and not budget.reserve(len(chunk)):
+                        raise AttachmentTooLarge(f"Attachments exceed the {self.max_request_bytes // (1024 * 1024)} MB per-request limit")
+                    size += len(chunk)
+                    chunks.append(chunk)
+            except Exception:
+                # Hand back what this download held so the request's other files can use it
+                if budget is not None:
+                    budget.release(size)
+                raise
+            return b"".join(chunks), response.headers.get("ETag")
+
+
+# SHARED FETCHER FOR THIS WORKER
+attachment_fetcher = AttachmentFetcher()
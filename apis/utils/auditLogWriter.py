@@ -0,0 +1,297 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# WRITER CONFIGURATION
+AUDIT_LOG_ASYNC_ENABLED = os.environ.get("AUDIT_LOG_ASYNC_ENABLED", "true").lower() == "true"
+AUDIT_LOG_QUEUE_SIZE = int(os.environ.get("AUDIT_LOG_QUEUE_SIZE", 10000))
+AUDIT_LOG_BATCH_SIZE = int(os.environ.get("AUDIT_LOG_BATCH_SIZE", 200))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.environ.get("AUDIT_LOG_FLUSH_INTERVAL", 1.0))
+# What to do when the queue is full: "block" waits up to AUDIT_LOG_ENQUEUE_TIMEOUT and then drops,
+# "drop_newest" drops the new record, "drop_oldest" drops the oldest queued record, "sync" writes inline
+AUDIT_LOG_FULL_POLICY = os.environ.get("AUDIT_LOG_FULL_POLICY", "block").lower()
+AUDIT_LOG_ENQUEUE_TIMEOUT = float(os.environ.get("AUDIT_LOG_ENQUEUE_TIMEOUT", 0.05))
+AUDIT_LOG_SHUTDOWN_TIMEOUT = float(os.environ.get("AUDIT_LOG_SHUTDOWN_TIMEOUT", 10))
+AUDIT_LOG_FAST_EXECUTEMANY = os.environ.get("AUDIT_LOG_FAST_EXECUTEMANY", "true").lower() == "true"
+
+API_LOG_INSERT_SQL = """
+INSERT INTO api_logs (
+    id, endpoint_id, user_id, timestamp, request_method,
+    request_headers, request_body, response_status, response_time_ms,
+    user_agent, ip_address, token_id, error_message, response_body, correlation_id,
+    user_usage_id
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+USER_USAGE_INSERT_SQL = """
+INSERT INTO user_usage (
+    id, user_id, endpoint_id, timestamp,
+    images_generated, audio_seconds_processed, pages_processed,
+    documents_processed, model_used, prompt_tokens,
+    completion_tokens, total_tokens, cached_tokens, files_uploaded,
+    api_log_id, embedded_tokens
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Statements are applied in this order within a flush so a usage row's api_logs row exists first
+AUDIT_STATEMENTS = {
+    "api_logs": API_LOG_INSERT_SQL,
+    "user_usage": USER_USAGE_INSERT_SQL
+}
+
+def audit_timestamp():
+    """Timestamp in the same timezone as DATEADD(HOUR, 2, GETUTCDATE()), taken when the request is logged"""
+    return datetime.utcnow() + timedelta(hours=2)
+
+def build_api_log_row(log_id, endpoint_id, timestamp, user_id=None, token_id=None, request_method=None,
+                      request_headers=None, request_body=None, response_status=None,
+                      response_time_ms=None, user_agent=None, ip_address=None,
+                      error_message=None, response_body=None, correlation_id=None, user_usage_id=None):
+    """Build the parameter row for API_LOG_INSERT_SQL"""
+    return [
+        log_id, endpoint_id, user_id, timestamp, request_method,
+        request_headers, request_body, response_status, response_time_ms,
+        user_agent, ip_address, token_id, error_message, response_body, correlation_id,
+        user_usage_id
+    ]
+
+def build_user_usage_row(usage_id, metrics, api_log_id, timestamp):
+    """Build the parameter row for USER_USAGE_INSERT_SQL from extract_usage_metrics output"""
+    return [
+        usage_id,
+        metrics["user_id"],
+        metrics["endpoint_id"],
+        timestamp,
+        metrics["images_generated"],
+        metrics["audio_seconds_processed"],
+        metrics["pages_processed"],
+        metrics["documents_processed"],
+        metrics["model_used"],
+        metrics["prompt_tokens"],
+        metrics["completion_tokens"],
+        metrics["total_tokens"],
+        metrics["cached_tokens"],
+        metrics["files_uploaded"],
+        api_log_id,
+        metrics["embedded_tokens"]
+    ]
+
+
+class AuditLogWriter:
+    """
+    Background writer for api_logs and user_usage records
+
+    Requests enqueue parameter rows on a bounded in-process queue and return immediately.
+    A writer thread drains the queue every flush interval (or as soon as a batch fills) and
+    writes each table's rows with one executemany in a single transaction. When the queue is
+    full the configured policy applies; remaining records are flushed when the worker exits.
+    """
+
+    def __init__(self, enabled=AUDIT_LOG_ASYNC_ENABLED, queue_size=AUDIT_LOG_QUEUE_SIZE,
+                 batch_size=AUDIT_LOG_BATCH_SIZE, flush_interval=AUDIT_LOG_FLUSH_INTERVAL,
+                 full_policy=AUDIT_LOG_FULL_POLICY, enqueue_timeout=AUDIT_LOG_ENQUEUE_TIMEOUT):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopped = threading.Event()
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "flushes": 0, "written_inline": 0}
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._thread and self._thread.is_alive() and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == pid:
+                return
+            if self._pid != pid:
+                # Forked worker - the parent's queued records are the parent's to write
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._stopped.clear()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer")
+            self._thread.daemon = True
+            self._thread.start()
+            logger.info(f"Audit log writer started (batch size {self.batch_size}, queue size {self._queue.maxsize})")
+
+    def submit(self, kind, params):
+        """
+        Queue a record for writing
+
+        Args:
+            kind (str): One of AUDIT_STATEMENTS
+            params (list): Statement parameters
+
+        Returns:
+            bool: True if the record was queued or written, False if it was dropped
+        """
+        return self.submit_group([(kind, params)])
+
+    def submit_group(self, records):
+        """
+        Queue records that must be written together (e.g. an api_logs row and its user_usage row)
+
+        The group is queued as one item, so it always lands in the same flush and transaction.
+
+        Args:
+            records (list): (kind, params) tuples
+
+        Returns:
+            bool: True if the group was queued or written, False if it was dropped
+        """
+        if not self.enabled or self._stopped.is_set():
+            return self.write_batch([records], inline=True)
+
+        self._ensure_started()
+
+        try:
+            if self.full_policy == "block":
+                self._queue.put(records, timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait(records)
+        except queue.Full:
+            if self.full_policy == "sync":
+                return self.write_batch([records], inline=True)
+            if self.full_policy == "drop_oldest":
+                try:
+                    self._queue.get_nowait()
+                    self._queue.put_nowait(records)
+                    self._count("dropped")
+                    self._count("enqueued")
+                    return True
+                except (queue.Empty, queue.Full):
+                    pass
+            self._count("dropped")
+            logger.warning(f"Audit log queue full, dropped {', '.join(kind for kind, _ in records)} record")
+            return False
+
+        self._count("enqueued")
+        return True
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _drain(self, block_timeout):
+        records = []
+        try:
+            records.append(self._queue.get(timeout=block_timeout))
+        except queue.Empty:
+            return records
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(records) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                records.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return records
+
+    def _run(self):
+        while not self._stopped.is_set():
+            records = self._drain(self.flush_interval)
+            if records:
+                self.write_batch(records)
+
+    def write_batch(self, records, inline=False):
+        """Write queued groups by table in one transaction, isolating bad groups if the batch fails"""
+        from apis.utils.databaseService import DatabaseService
+
+        grouped = {kind: [] for kind in AUDIT_STATEMENTS}
+        for group in records:
+            for kind, params in group:
+                grouped[kind].append(params)
+
+        conn = None
+        cursor = None
+        try:
+            conn = DatabaseService.get_connection()
+            cursor = conn.cursor()
+            cursor.fast_executemany = AUDIT_LOG_FAST_EXECUTEMANY
+
+            for kind, rows in grouped.items():
+                if not rows:
+                    continue
+                if len(rows) == 1:
+                    cursor.execute(AUDIT_STATEMENTS[kind], rows[0])
+                else:
+                    cursor.executemany(AUDIT_STATEMENTS[kind], rows)
+
+            conn.commit()
+            self._count("written_inline" if inline else "written", len(records))
+            self._count("flushes")
+            return True
+
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            if len(records) == 1:
+                self._count("failed")
+                logger.error(f"Error writing {', '.join(kind for kind, _ in records[0])} audit record: {str(e)}")
+                return False
+            logger.error(f"Error writing audit log batch of {len(records)}, retrying records individually: {str(e)}")
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+        results = [self.write_batch([record], inline=inline) for record in records]
+        return all(results)
+
+    def flush(self, timeout=AUDIT_LOG_SHUTDOWN_TIMEOUT):
+        """Write everything still queued in this worker (used at shutdown)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            records = []
+            try:
+                while len(records) < self.batch_size:
+                    records.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not records:
+                return True
+            self.write_batch(records)
+        logger.warning(f"Audit log flush timed out with {self._queue.qsize()} records still queued")
+        return False
+
+    def shutdown(self, timeout=AUDIT_LOG_SHUTDOWN_TIMEOUT):
+        """Stop the writer thread and flush remaining records"""
+        self._stopped.set()
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval * 2)
+        return self.flush(timeout)
+
+    def get_stats(self):
+        """Return writer statistics"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+# SHARED WRITER FOR THIS WORKER
+audit_log_writer = AuditLogWriter()
+
+def _shutdown_audit_log_writer():
+    if audit_log_writer._pid == os.getpid():
+        audit_log_writer.shutdown()
+
+atexit.register(_shutdown_audit_log_writer)
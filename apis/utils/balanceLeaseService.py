@@ -0,0 +1,570 @@
+import os
+import time
+import atexit
+import socket
+import logging
+import threading
+from contextlib import ExitStack
+from apis.utils.databaseService import DatabaseService
+from apis.utils.balanceService import BalanceService
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# LEASE CONFIGURATION
+# Comma-separated user ids that deduct from worker-local leases, or "*" for every user
+BALANCE_LEASE_USER_IDS = os.environ.get("BALANCE_LEASE_USER_IDS", "")
+BALANCE_LEASE_BLOCK = float(os.environ.get("BALANCE_LEASE_BLOCK", 50))
+BALANCE_LEASE_EXPIRY_SECONDS = int(os.environ.get("BALANCE_LEASE_EXPIRY_SECONDS", 120))
+BALANCE_LEASE_IDLE_SECONDS = float(os.environ.get("BALANCE_LEASE_IDLE_SECONDS", 60))
+BALANCE_LEASE_SETTLE_INTERVAL = float(os.environ.get("BALANCE_LEASE_SETTLE_INTERVAL", 10))
+BALANCE_LEASE_SETTLE_THRESHOLD = float(os.environ.get("BALANCE_LEASE_SETTLE_THRESHOLD", 25))
+BALANCE_LEASE_RECOVERY_INTERVAL = float(os.environ.get("BALANCE_LEASE_RECOVERY_INTERVAL", 60))
+
+# Moves up to @block of credit (at least @minimum) from this month's balance into a new lease
+ACQUIRE_LEASE_SQL = """
+SET NOCOUNT ON;
+SET XACT_ABORT ON;
+
+DECLARE @user_id UNIQUEIDENTIFIER = ?;
+DECLARE @balance_month DATE = ?;
+DECLARE @block DECIMAL(10, 2) = ?;
+DECLARE @minimum DECIMAL(10, 2) = ?;
+DECLARE @worker_id NVARCHAR(200) = ?;
+DECLARE @expiry_seconds INT = ?;
+DECLARE @lease_id UNIQUEIDENTIFIER = NEWID();
+DECLARE @granted TABLE (before_balance DECIMAL(10, 2), after_balance DECIMAL(10, 2));
+
+BEGIN TRANSACTION;
+
+IF NOT EXISTS (
+    SELECT 1 FROM user_balances WITH (UPDLOCK, HOLDLOCK)
+    WHERE user_id = @user_id AND balance_month = @balance_month
+)
+BEGIN
+    INSERT INTO user_balances (user_id, balance_month, current_balance, last_updated)
+    SELECT u.id, @balance_month, COALESCE(u.aic_balance, sbc.monthly_balance, 100), DATEADD(HOUR, 2, GETUTCDATE())
+    FROM users u
+    LEFT JOIN scope_balance_config sbc ON sbc.scope = u.scope
+    WHERE u.id = @user_id;
+END
+
+UPDATE user_balances
+SET current_balance = current_balance - CASE WHEN current_balance >= @block THEN @block ELSE current_balance END,
+    last_updated = DATEADD(HOUR, 2, GETUTCDATE())
+OUTPUT deleted.current_balance, inserted.current_balance INTO @granted
+WHERE user_id = @user_id
+  AND balance_month = @balance_month
+  AND current_balance >= @minimum;
+
+INSERT INTO balance_leases (id, user_id, balance_month, worker_id, leased_amount, consumed_amount, status, expires_at)
+SELECT @lease_id, @user_id, @balance_month, @worker_id, before_balance - after_balance, 0, 'open',
+       DATEADD(SECOND, @expiry_seconds, DATEADD(HOUR, 2, GETUTCDATE()))
+FROM @granted;
+
+COMMIT TRANSACTION;
+
+SELECT @lease_id, before_balance - after_balance, after_balance FROM @granted;
+"""
+
+# Records consumption so far and extends the lease; returns 0 rows if the lease was already expired
+SETTLE_LEASE_SQL = """
+UPDATE balance_leases
+SET consumed_amount = ?,
+    expires_at = DATEADD(SECOND, ?, DATEADD(HOUR, 2, GETUTCDATE()))
+WHERE id = ? AND status = 'open'
+"""
+
+# Closes the lease and returns its unused credit to the month's balance
+CLOSE_LEASE_SQL = """
+SET NOCOUNT ON;
+SET XACT_ABORT ON;
+
+DECLARE @lease_id UNIQUEIDENTIFIER = ?;
+DECLARE @consumed DECIMAL(10, 2) = ?;
+DECLARE @closed TABLE (user_id UNIQUEIDENTIFIER, balance_month DATE, unused DECIMAL(10, 2));
+
+BEGIN TRANSACTION;
+
+UPDATE balance_leases
+SET status = 'closed',
+    consumed_amount = @consumed,
+    settled_at = DATEADD(HOUR, 2, GETUTCDATE())
+OUTPUT inserted.user_id, inserted.balance_month, inserted.leased_amount - inserted.consumed_amount INTO @closed
+WHERE id = @lease_id AND status = 'open';
+
+UPDATE ub
+SET current_balance = ub.current_balance + c.unused,
+    last_updated = DATEADD(HOUR, 2, GETUTCDATE())
+FROM user_balances ub
+JOIN @closed c ON ub.user_id = c.user_id AND ub.balance_month = c.balance_month;
+
+COMMIT TRANSACTION;
+
+SELECT COUNT(*) FROM @closed;
+"""
+
+# Expires leases whose worker stopped heart-beating and returns their unused credit
+RECOVER_EXPIRED_LEASES_SQL = """
+SET NOCOUNT ON;
+SET XACT_ABORT ON;
+
+DECLARE @expired TABLE (user_id UNIQUEIDENTIFIER, balance_month DATE, unused DECIMAL(10, 2));
+
+BEGIN TRANSACTION;
+
+UPDATE balance_leases
+SET status = 'expired',
+    settled_at = DATEADD(HOUR, 2, GETUTCDATE())
+OUTPUT inserted.user_id, inserted.balance_month, inserted.leased_amount - inserted.consumed_amount INTO @expired
+WHERE status = 'open' AND expires_at < DATEADD(HOUR, 2, GETUTCDATE());
+
+UPDATE ub
+SET current_balance = ub.current_balance + e.unused,
+    last_updated = DATEADD(HOUR, 2, GETUTCDATE())
+FROM user_balances ub
+JOIN (
+    SELECT user_id, balance_month, SUM(unused) AS unused
+    FROM @expired
+    GROUP BY user_id, balance_month
+) e ON ub.user_id = e.user_id AND ub.balance_month = e.balance_month;
+
+COMMIT TRANSACTION;
+
+SELECT COUNT(*) FROM @expired;
+"""
+
+
+class BalanceLease:
+    """A block of credit leased from user_balances and consumed in this worker's memory"""
+
+    def __init__(self, lease_id, user_id, balance_month, leased_amount):
+        self.lease_id = lease_id
+        self.user_id = user_id
+        self.balance_month = balance_month
+        self.leased_amount = leased_amount
+        self.consumed = 0.0
+        self.settled = 0.0
+        # endpoint_id -> consumed amount not yet written to balance_transactions
+        self.pending_by_endpoint = {}
+        self.last_used = time.monotonic()
+        # Set once the lease row was found expired - the next deduction rolls over to a new lease
+        self.expired = False
+        # Held while consumption of this lease is written, so a settlement and a close never charge the same amount
+        self.db_lock = threading.Lock()
+
+    @property
+    def remaining(self):
+        return self.leased_amount - self.consumed
+
+    @property
+    def unsettled(self):
+        return self.consumed - self.settled
+
+
+class BalanceLeaseManager:
+    """
+    Worker-local balance reservations with batched settlement
+
+    Users enabled for leasing deduct from an in-memory lease instead of user_balances.
+    A background thread records consumption (balance_leases.consumed_amount and aggregated
+    balance_transactions rows) every settle interval or once a lease's unsettled amount
+    passes the threshold, heart-beats lease expiry, closes idle leases and expires leases
+    abandoned by dead workers so their unused credit returns to the user.
+    """
+
+    def __init__(self, user_ids=BALANCE_LEASE_USER_IDS, block=BALANCE_LEASE_BLOCK,
+                 expiry_seconds=BALANCE_LEASE_EXPIRY_SECONDS, idle_seconds=BALANCE_LEASE_IDLE_SECONDS,
+                 settle_interval=BALANCE_LEASE_SETTLE_INTERVAL, settle_threshold=BALANCE_LEASE_SETTLE_THRESHOLD,
+                 recovery_interval=BALANCE_LEASE_RECOVERY_INTERVAL):
+        ids = [user_id.strip().lower() for user_id in (user_ids or "").split(",") if user_id.strip()]
+        self.all_users = "*" in ids
+        self.user_ids = set(ids) - {"*"}
+        self.block = block
+        self.expiry_seconds = expiry_seconds
+        self.idle_seconds = idle_seconds
+        self.settle_interval = settle_interval
+        self.settle_threshold = settle_threshold
+        self.recovery_interval = recovery_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._leases = {}
+        # Leases taken out of use whose close failed - retried by the settlement thread
+        self._retired = []
+        self._user_locks = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._last_recovery = 0.0
+
+    @property
+    def enabled(self):
+        return self.all_users or bool(self.user_ids)
+
+    def is_enabled_for(self, user_id):
+        """Check whether a user deducts from worker-local leases"""
+        return self.all_users or (user_id is not None and str(user_id).lower() in self.user_ids)
+
+    def _user_lock(self, user_id):
+        key = str(user_id).lower()
+        with self._lock:
+            lock = self._user_locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._user_locks[key] = lock
+            return lock
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="balance-lease-settler")
+            self._thread.daemon = True
+            self._thread.start()
+            logger.info(f"Balance lease settlement thread started for worker {self.worker_id}")
+
+    def deduct(self, user_id, endpoint_id, amount):
+        """
+        Deduct from the user's lease, leasing a new block when it runs out
+
+        Returns:
+            tuple: (success, remaining_lease_credit_or_error) - same contract as BalanceService.check_and_deduct_balance
+        """
+        self._ensure_started()
+        amount = float(amount)
+        key = str(user_id).lower()
+        current_month = BalanceService.get_first_day_of_month()
+
+        with self._user_lock(key):
+            lease = self._leases.get(key)
+
+            if lease and (lease.expired or lease.balance_month != current_month or lease.remaining < amount):
+                self._close_lease(lease)
+                lease = None
+
+            if lease is None:
+                lease, error = self._acquire_lease(user_id, current_month, amount)
+                if error:
+                    return False, error
+                self._leases[key] = lease
+
+            lease.consumed += amount
+            lease.pending_by_endpoint[endpoint_id] = lease.pending_by_endpoint.get(endpoint_id, 0.0) + amount
+            lease.last_used = time.monotonic()
+            remaining = lease.remaining
+
+            if lease.unsettled >= self.settle_threshold:
+                self._wakeup.set()
+
+        return True, remaining
+
+    def refund(self, user_id, endpoint_id, amount):
+        """
+        Return a deduction made with deduct()
+
+        The amount goes back to the user's open lease; if that lease has rolled over since the
+        deduction, it is returned to the balance directly.
+
+        Returns:
+            tuple: (success, remaining_lease_credit_or_error)
+        """
+        amount = float(amount)
+        key = str(user_id).lower()
+
+        with self._user_lock(key):
+            lease = self._leases.get(key)
+            pending = lease.pending_by_endpoint.get(endpoint_id, 0.0) if lease else 0.0
+            if lease and pending >= amount:
+                lease.consumed -= amount
+                if pending - amount > 0:
+                    lease.pending_by_endpoint[endpoint_id] = pending - amount
+                else:
+                    lease.pending_by_endpoint.pop(endpoint_id, None)
+                return True, lease.remaining
+
+        return BalanceService.refund_balance(user_id, endpoint_id, amount)
+
+    def _acquire_lease(self, user_id, balance_month, minimum):
+        conn = None
+        cursor = None
+        try:
+            conn = DatabaseService.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(ACQUIRE_LEASE_SQL, [
+                user_id, balance_month, max(self.block, minimum), minimum, self.worker_id, self.expiry_seconds
+            ])
+            result = cursor.fetchone()
+            conn.commit()
+
+            if not result:
+                logger.warning(f"Insufficient balance to lease {minimum} for user {user_id}")
+                return None, "Insufficient balance"
+
+            lease = BalanceLease(str(result[0]), user_id, balance_month, float(result[1]))
+            logger.info(f"Leased {lease.leased_amount} credit for user {user_id} (lease {lease.lease_id}), {float(result[2])} left in balance")
+            return lease, None
+
+        except Exception as e:
+            logger.error(f"Error acquiring balance lease: {str(e)}")
+            if conn:
+                conn.rollback()
+            return None, str(e)
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    def _settle(self, leases):
+        """Write consumption for a batch of leases in one transaction"""
+        if not leases:
+            return
+
+        snapshots = []
+        for lease in leases:
+            with self._user_lock(lease.user_id):
+                pending = lease.pending_by_endpoint
+                lease.pending_by_endpoint = {}
+                snapshots.append((lease, lease.consumed, pending))
+
+        # No user lock may be taken while the lease locks are held - deduct() closes leases under the user lock
+        with ExitStack() as stack:
+            for lease, _, _ in snapshots:
+                stack.enter_context(lease.db_lock)
+            settled = self._write_settlement(snapshots)
+
+        if not settled:
+            # Put the pending amounts back so the next settlement retries them
+            for lease, _, pending in snapshots:
+                with self._user_lock(lease.user_id):
+                    for endpoint_id, amount in pending.items():
+                        lease.pending_by_endpoint[endpoint_id] = lease.pending_by_endpoint.get(endpoint_id, 0.0) + amount
+
+    def _write_settlement(self, snapshots):
+        """Record the snapshots' consumption (caller holds their lease locks); returns whether it was committed"""
+        conn = None
+        cursor = None
+        try:
+            conn = DatabaseService.get_connection()
+            cursor = conn.cursor()
+
+            expired = []
+            transactions = []
+            for lease, consumed, pending in snapshots:
+                cursor.execute(SETTLE_LEASE_SQL, [consumed, self.expiry_seconds, lease.lease_id])
+
+                if cursor.rowcount == 0:
+                    cursor.execute("SELECT status FROM balance_leases WHERE id = ?", [lease.lease_id])
+                    row = cursor.fetchone()
+                    if row and row[0] == 'expired':
+                        # The recovery sweep (or an admin balance update) expired the lease and returned its
+                        # credit beyond the last settled consumption - charge what was consumed since directly
+                        cursor.execute("""
+                            UPDATE user_balances
+                            SET current_balance = current_balance - ?,
+                                last_updated = DATEADD(HOUR, 2, GETUTCDATE())
+                            WHERE user_id = ? AND balance_month = ?
+                        """, [consumed - lease.settled, lease.user_id, lease.balance_month])
+                        expired.append(lease)
+                    # A 'closed' lease was closed by a concurrent rollover, which accounted its consumption
+
+                for endpoint_id, amount in pending.items():
+                    transactions.append([lease.user_id, endpoint_id, amount, lease.leased_amount - consumed])
+
+            if transactions:
+                cursor.fast_executemany = True
+                cursor.executemany("""
+                    INSERT INTO balance_transactions
+                    (id, user_id, endpoint_id, deducted_amount, balance_after)
+                    VALUES (NEWID(), ?, ?, ?, ?)
+                """, transactions)
+
+            conn.commit()
+
+            for lease, consumed, _ in snapshots:
+                lease.settled = max(lease.settled, consumed)
+            # Consumption after the snapshot is charged when the expired lease is closed
+            for lease in expired:
+                lease.expired = True
+            return True
+
+        except Exception as e:
+            logger.error(f"Error settling balance leases: {str(e)}")
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    def _close_lease(self, lease):
+        """
+        Settle a lease and return its unused credit (caller holds the user lock or is shutting down)
+
+        The lease is taken out of use either way. If the close fails it is kept in the retired
+        list and retried by the settlement thread; should the recovery sweep expire the row
+        meanwhile, the retry charges the consumption the sweep did not see.
+
+        Returns:
+            bool: Whether the lease was closed
+        """
+        self._forget(lease)
+
+        closed = False
+        with lease.db_lock:
+            conn = None
+            cursor = None
+            try:
+                conn = DatabaseService.get_connection()
+                cursor = conn.cursor()
+
+                if lease.pending_by_endpoint:
+                    cursor.fast_executemany = True
+                    cursor.executemany("""
+                        INSERT INTO balance_transactions
+                        (id, user_id, endpoint_id, deducted_amount, balance_after)
+                        VALUES (NEWID(), ?, ?, ?, ?)
+                    """, [[lease.user_id, endpoint_id, amount, lease.remaining] for endpoint_id, amount in lease.pending_by_endpoint.items()])
+
+                cursor.execute(CLOSE_LEASE_SQL, [lease.lease_id, lease.consumed])
+                result = cursor.fetchone()
+
+                if not result or not result[0]:
+                    # Already expired - charge consumption since the last settlement
+                    cursor.execute("""
+                        UPDATE user_balances
+                        SET current_balance = current_balance - ?,
+                            last_updated = DATEADD(HOUR, 2, GETUTCDATE())
+                        WHERE user_id = ? AND balance_month = ?
+                    """, [lease.consumed - lease.settled, lease.user_id, lease.balance_month])
+
+                conn.commit()
+                lease.pending_by_endpoint = {}
+                lease.settled = lease.consumed
+                closed = True
+                logger.info(f"Closed balance lease {lease.lease_id} for user {lease.user_id}: consumed {lease.consumed} of {lease.leased_amount}")
+
+            except Exception as e:
+                logger.error(f"Error closing balance lease {lease.lease_id}, will retry: {str(e)}")
+                if conn:
+                    conn.rollback()
+            finally:
+                if cursor:
+                    cursor.close()
+                if conn:
+                    conn.close()
+
+        with self._lock:
+            if closed:
+                if lease in self._retired:
+                    self._retired.remove(lease)
+            elif lease not in self._retired:
+                self._retired.append(lease)
+        return closed
+
+    def _forget(self, lease):
+        key = str(lease.user_id).lower()
+        with self._lock:
+            if self._leases.get(key) is lease:
+                del self._leases[key]
+
+    def recover_expired_leases(self):
+        """Expire leases abandoned by dead workers and return their unused credit"""
+        conn = None
+        cursor = None
+        try:
+            conn = DatabaseService.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(RECOVER_EXPIRED_LEASES_SQL)
+            result = cursor.fetchone()
+            conn.commit()
+            recovered = result[0] if result else 0
+            if recovered:
+                logger.warning(f"Recovered {recovered} expired balance leases")
+            return recovered
+        except Exception as e:
+            logger.error(f"Error recovering expired balance leases: {str(e)}")
+            if conn:
+                conn.rollback()
+            return 0
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.settle_interval)
+            self._wakeup.clear()
+            try:
+                self.settle_all()
+            except Exception as e:
+                logger.error(f"Error in balance lease settlement loop: {str(e)}")
+
+    def settle_all(self):
+        """Settle every lease, close idle ones and periodically run the recovery sweep"""
+        now = time.monotonic()
+        with self._lock:
+            leases = list(self._leases.values())
+
+        idle = [lease for lease in leases if now - lease.last_used >= self.idle_seconds]
+        active = [lease for lease in leases if lease not in idle]
+
+        # Active leases are always heart-beaten so their expiry keeps moving forward
+        self._settle(active)
+
+        for lease in idle:
+            with self._user_lock(lease.user_id):
+                if time.monotonic() - lease.last_used >= self.idle_seconds:
+                    self._close_lease(lease)
+
+        with self._lock:
+            retired = list(self._retired)
+        for lease in [lease for lease in active if lease.expired and lease not in retired] + retired:
+            with self._user_lock(lease.user_id):
+                with self._lock:
+                    tracked = self._leases.get(str(lease.user_id).lower()) is lease or lease in self._retired
+                if tracked:  # Otherwise already closed by a rollover
+                    self._close_lease(lease)
+
+        if now - self._last_recovery >= self.recovery_interval:
+            self._last_recovery = now
+            self.recover_expired_leases()
+
+    def shutdown(self):
+        """Close every lease held by this worker, returning unused credit"""
+        self._stopped.set()
+        self._wakeup.set()
+        with self._lock:
+            leases = list(self._leases.values()) + list(self._retired)
+        for lease in leases:
+            self._close_lease(lease)
+
+
+_manager = None
+_manager_pid = None
+_manager_lock = threading.Lock()
+
+def get_balance_lease_manager():
+    """Get the lease manager for this worker process"""
+    global _manager, _manager_pid
+    pid = os.getpid()
+    if _manager is None or _manager_pid != pid:
+        with _manager_lock:
+            if _manager is None or _manager_pid != pid:
+                # Leases belong to the process that took them - never reuse a parent's after fork
+                _manager = BalanceLeaseManager()
+                _manager_pid = pid
+    return _manager
+
+def _shutdown_balance_leases():
+    if _manager is not None and _manager_pid == os.getpid() and _manager.enabled:
+        _manager.shutdown()
+
+atexit.register(_shutdown_balance_leases)
@@ -1,7 +1,10 @@
 from functools import wraps
 from flask import request, g, jsonify, make_response
 from apis.utils.balanceService import BalanceService
+from apis.utils.balanceLeaseService import get_balance_lease_manager
 from apis.utils.databaseService import DatabaseService
+from apis.utils.requestContext import resolve_request_context
+from apis.utils.llmResponseCache import is_request_served_from_cache, LLM_CACHE_CHARGE_HITS
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,8 +17,11 @@ def check_balance(f):
             if request.path.startswith('/admin'):
                 return f(*args, **kwargs)
 
+            # Resolve token, user and endpoint once for the whole middleware stack
+            context = resolve_request_context()
+            
             # Get endpoint ID
-            endpoint_id = DatabaseService.get_endpoint_id_by_path(request.path)
+            endpoint_id = context["endpoint_id"]
             if not endpoint_id:
                 logger.error(f"Endpoint not configured for balance tracking: {request.path}")
                 return make_response(jsonify({
@@ -23,28 +29,9 @@ def check_balance(f):
                     "message": "Endpoint not configured for balance tracking"
                 }), 500)
 
-            # Check if user_id is already in g (set by previous middleware)
+            # Get user_id from context (set by the route or resolved from token / API key)
             user_id = getattr(g, 'user_id', None)
             
-            # If user_id is not in g, try to get it from token or API key
-            if not user_id:
-                # Try from X-Token header (custom_llm uses this)
-                token = request.headers.get('X-Token')
-                if token:
-                    token_details = DatabaseService.get_token_details_by_value(token)
-                    if token_details:
-                        user_id = token_details.get("user_id")
-                        g.user_id = user_id  # Set it for subsequent middleware
-                
-                # If still no user_id, try from API-Key
-                if not user_id:
-                    api_key = request.headers.get('API-Key')
-                    if api_key:
-                        user_info = DatabaseService.validate_api_key(api_key)
-                        if user_info:
-                            user_id = user_info["id"]
-                            g.user_id = user_id  # Set it for subsequent middleware
-            
             if not user_id:
                 logger.error("User ID not found in request context or authentication headers")
                 return make_response(jsonify({
@@ -56,8 +43,13 @@ def check_balance(f):
             endpoint_cost = DatabaseService.get_endpoint_cost_by_id(endpoint_id)
             logger.info(f"Endpoint {endpoint_id} cost: {endpoint_cost}")
 
-            # Check and deduct balance using the endpoint-specific cost
-            success, result = BalanceService.check_and_deduct_balance(user_id, endpoint_id, endpoint_cost)
+            # Check and deduct balance using the endpoint-specific cost - leased users deduct
+            # from worker-local credit that is settled to the database in batches
+            lease_manager = get_balance_lease_manager()
+            if lease_manager.is_enabled_for(user_id):
+                success, result = lease_manager.deduct(user_id, endpoint_id, endpoint_cost)
+            else:
+                success, result = BalanceService.check_and_deduct_balance(user_id, endpoint_id, endpoint_cost)
             if not success:
                 if result == "Insufficient balance":
                     logger.warning(f"Insufficient balance for user {user_id}")
@@ -74,7 +66,20 @@ def check_balance(f):
 
             # Log successful balance deduction
             logger.info(f"Balance successfully deducted for user {user_id}, endpoint {endpoint_id}, cost {endpoint_cost}")
-            return f(*args, **kwargs)
+            response = f(*args, **kwargs)
+
+            # Requests answered entirely from the LLM response cache cost nothing unless configured otherwise
+            if is_request_served_from_cache() and not LLM_CACHE_CHARGE_HITS and endpoint_cost:
+                if lease_manager.is_enabled_for(user_id):
+                    refunded, result = lease_manager.refund(user_id, endpoint_id, endpoint_cost)
+                else:
+                    refunded, result = BalanceService.refund_balance(user_id, endpoint_id, endpoint_cost)
+                if refunded:
+                    logger.info(f"Refunded {endpoint_cost} to user {user_id} for a cached response")
+                else:
+                    logger.error(f"Could not refund cached response for user {user_id}: {result}")
+
+            return response
             
         except Exception as e:
             logger.error(f"Error in balance middleware: {str(e)}")
@@ -83,4 +88,24 @@ def check_balance(f):
                 "message": f"An error occurred: {str(e)}"
             }), 500)
 
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+
+def deduct_additional_cost(user_id, endpoint_id, amount):
+    """
+    Charge a request for more than the single call check_balance deducted (e.g. every prompt of a batch)
+
+    Returns:
+        tuple: (success, result) as from BalanceService.check_and_deduct_balance
+    """
+    lease_manager = get_balance_lease_manager()
+    if lease_manager.is_enabled_for(user_id):
+        return lease_manager.deduct(user_id, endpoint_id, amount)
+    return BalanceService.check_and_deduct_balance(user_id, endpoint_id, amount)
+
+def refund_additional_cost(user_id, endpoint_id, amount):
+    """Return a deduction made with deduct_additional_cost"""
+    lease_manager = get_balance_lease_manager()
+    if lease_manager.is_enabled_for(user_id):
+        return lease_manager.refund(user_id, endpoint_id, amount)
+    return BalanceService.refund_balance(user_id, endpoint_id, amount)
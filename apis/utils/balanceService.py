@@ -1,10 +1,127 @@
 from datetime import datetime, date
+import os
 import logging
 import pytz
 from apis.utils.databaseService import DatabaseService
 
 logger = logging.getLogger(__name__)
 
+# USE THE SINGLE-ROUND-TRIP DEDUCTION PATH (SET TO false TO FALL BACK TO THE LEGACY PATH)
+BALANCE_ATOMIC_DEDUCTION = os.environ.get("BALANCE_ATOMIC_DEDUCTION", "true").lower() == "true"
+
+# Creates the month's balance row if needed and conditionally deducts in one transaction.
+# UPDLOCK/HOLDLOCK serialises concurrent first-of-month inserts for the same user and the
+# guarded UPDATE (current_balance >= amount) makes overspending impossible under concurrency.
+ATOMIC_DEDUCT_BALANCE_SQL = """
+SET NOCOUNT ON;
+SET XACT_ABORT ON;
+
+DECLARE @user_id UNIQUEIDENTIFIER = ?;
+DECLARE @endpoint_id UNIQUEIDENTIFIER = ?;
+DECLARE @amount DECIMAL(10, 2) = ?;
+DECLARE @balance_month DATE = ?;
+DECLARE @deducted TABLE (balance_after DECIMAL(10, 2));
+DECLARE @user_exists BIT = 0;
+
+BEGIN TRANSACTION;
+
+IF NOT EXISTS (
+    SELECT 1 FROM user_balances WITH (UPDLOCK, HOLDLOCK)
+    WHERE user_id = @user_id AND balance_month = @balance_month
+)
+BEGIN
+    INSERT INTO user_balances (user_id, balance_month, current_balance, last_updated)
+    SELECT u.id, @balance_month, COALESCE(u.aic_balance, sbc.monthly_balance, 100), DATEADD(HOUR, 2, GETUTCDATE())
+    FROM users u
+    LEFT JOIN scope_balance_config sbc ON sbc.scope = u.scope
+    WHERE u.id = @user_id;
+END
+
+UPDATE user_balances
+SET current_balance = current_balance - @amount,
+    last_updated = DATEADD(HOUR, 2, GETUTCDATE())
+OUTPUT inserted.current_balance INTO @deducted
+WHERE user_id = @user_id
+  AND balance_month = @balance_month
+  AND current_balance >= @amount;
+
+INSERT INTO balance_transactions (id, user_id, endpoint_id, deducted_amount, balance_after)
+SELECT NEWID(), @user_id, @endpoint_id, @amount, balance_after FROM @deducted;
+
+COMMIT TRANSACTION;
+
+IF EXISTS (SELECT 1 FROM users WHERE id = @user_id) SET @user_exists = 1;
+
+SELECT
+    CASE WHEN EXISTS (SELECT 1 FROM @deducted) THEN 1 ELSE 0 END AS deducted,
+    COALESCE(
+        (SELECT TOP 1 balance_after FROM @deducted),
+        (SELECT current_balance FROM user_balances WHERE user_id = @user_id AND balance_month = @balance_month)
+    ) AS current_balance,
+    @user_exists AS user_exists;
+"""
+
+# Returns a deduction to this month's balance and records it as a negative transaction
+REFUND_BALANCE_SQL = """
+SET NOCOUNT ON;
+SET XACT_ABORT ON;
+
+DECLARE @user_id UNIQUEIDENTIFIER = ?;
+DECLARE @endpoint_id UNIQUEIDENTIFIER = ?;
+DECLARE @amount DECIMAL(10, 2) = ?;
+DECLARE @balance_month DATE = ?;
+DECLARE @refunded TABLE (balance_after DECIMAL(10, 2));
+
+BEGIN TRANSACTION;
+
+UPDATE user_balances
+SET current_balance = current_balance + @amount,
+    last_updated = DATEADD(HOUR, 2, GETUTCDATE())
+OUTPUT inserted.current_balance INTO @refunded
+WHERE user_id = @user_id AND balance_month = @balance_month;
+
+INSERT INTO balance_transactions (id, user_id, endpoint_id, deducted_amount, balance_after)
+SELECT NEWID(), @user_id, @endpoint_id, -@amount, balance_after FROM @refunded;
+
+COMMIT TRANSACTION;
+
+SELECT TOP 1 balance_after FROM @refunded;
+"""
+
+# Reads this month's balance including the credit open balance leases (see balanceLeaseService)
+# hold but have not consumed yet. balance_leases only exists where leasing is set up.
+CURRENT_BALANCE_SQL = """
+SET NOCOUNT ON;
+
+DECLARE @user_id UNIQUEIDENTIFIER = ?;
+DECLARE @balance_month DATE = ?;
+DECLARE @leased DECIMAL(10, 2) = 0;
+
+IF OBJECT_ID(N'balance_leases', N'U') IS NOT NULL
+    SELECT @leased = COALESCE(SUM(leased_amount - consumed_amount), 0)
+    FROM balance_leases
+    WHERE user_id = @user_id AND balance_month = @balance_month AND status = 'open';
+
+SELECT ub.current_balance + @leased, u.scope, sbc.description
+FROM user_balances ub
+JOIN users u ON ub.user_id = u.id
+LEFT JOIN scope_balance_config sbc ON u.scope = sbc.scope
+WHERE ub.user_id = @user_id AND ub.balance_month = @balance_month;
+"""
+
+# An absolute balance replaces the credit open leases hold: they are expired without returning
+# their unused credit, and their workers charge consumption since the last settlement against
+# the new balance before rolling over to a new lease
+EXPIRE_USER_LEASES_SQL = """
+SET NOCOUNT ON;
+
+IF OBJECT_ID(N'balance_leases', N'U') IS NOT NULL
+    UPDATE balance_leases
+    SET status = 'expired',
+        settled_at = DATEADD(HOUR, 2, GETUTCDATE())
+    WHERE user_id = ? AND balance_month = ? AND status = 'open';
+"""
+
 class BalanceService:
     @staticmethod
     def get_first_day_of_month():
@@ -97,6 +214,114 @@ class BalanceService:
     @staticmethod
     def check_and_deduct_balance(user_id, endpoint_id, deduction_amount=None):
         """Check if user has sufficient balance and deduct if they do"""
+        if BALANCE_ATOMIC_DEDUCTION:
+            return BalanceService.deduct_balance_atomic(user_id, endpoint_id, deduction_amount)
+        return BalanceService.check_and_deduct_balance_legacy(user_id, endpoint_id, deduction_amount)
+
+    @staticmethod
+    def deduct_balance_atomic(user_id, endpoint_id, deduction_amount=None):
+        """Initialise the month's balance if needed and deduct in a single atomic round-trip
+        
+        Args:
+            user_id (str): UUID of the user
+            endpoint_id (str): UUID of the endpoint being charged
+            deduction_amount (float): Amount to deduct (defaults to the endpoint's cost)
+            
+        Returns:
+            tuple: (success, new_balance_or_error) - same contract as check_and_deduct_balance
+        """
+        conn = None
+        cursor = None
+        try:
+            if deduction_amount is None:
+                endpoint = DatabaseService.get_endpoint_by_id(endpoint_id)
+                if not endpoint:
+                    logger.error(f"Endpoint {endpoint_id} not found")
+                    return False, "Endpoint not found"
+                deduction_amount = endpoint["cost"]
+            
+            deduction_amount = float(deduction_amount)
+            current_month = BalanceService.get_first_day_of_month()
+            
+            conn = DatabaseService.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(ATOMIC_DEDUCT_BALANCE_SQL, [user_id, endpoint_id, deduction_amount, current_month])
+            result = cursor.fetchone()
+            conn.commit()
+            
+            if not result or not result[2]:
+                logger.error(f"User {user_id} not found")
+                return False, "Failed to initialize balance"
+            
+            deducted = bool(result[0])
+            current_balance = float(result[1]) if result[1] is not None else None
+            
+            if current_balance is None:
+                logger.error(f"No balance record found for user {user_id} for {current_month}")
+                return False, "No balance record found"
+            
+            if not deducted:
+                logger.warning(f"Insufficient balance for user {user_id}: {current_balance} < {deduction_amount}")
+                return False, "Insufficient balance"
+            
+            logger.info(f"Successfully deducted {deduction_amount} from user {user_id}, new balance: {current_balance}")
+            return True, current_balance
+            
+        except Exception as e:
+            logger.error(f"Error deducting balance: {str(e)}")
+            if conn:
+                conn.rollback()
+            return False, str(e)
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    @staticmethod
+    def refund_balance(user_id, endpoint_id, amount):
+        """Return a deduction that turned out not to be chargeable (e.g. a cached LLM response)
+        
+        Args:
+            user_id (str): UUID of the user
+            endpoint_id (str): UUID of the endpoint that was charged
+            amount (float): Amount to return
+            
+        Returns:
+            tuple: (success, new_balance_or_error)
+        """
+        conn = None
+        cursor = None
+        try:
+            current_month = BalanceService.get_first_day_of_month()
+            
+            conn = DatabaseService.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(REFUND_BALANCE_SQL, [user_id, endpoint_id, float(amount), current_month])
+            result = cursor.fetchone()
+            conn.commit()
+            
+            if not result:
+                logger.error(f"No balance record found for user {user_id} for {current_month}")
+                return False, "No balance record found"
+            
+            logger.info(f"Refunded {amount} to user {user_id}, new balance: {result[0]}")
+            return True, float(result[0])
+            
+        except Exception as e:
+            logger.error(f"Error refunding balance: {str(e)}")
+            if conn:
+                conn.rollback()
+            return False, str(e)
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    @staticmethod
+    def check_and_deduct_balance_legacy(user_id, endpoint_id, deduction_amount=None):
+        """Check if user has sufficient balance and deduct if they do (multi-query path)"""
         conn = None
         cursor = None
         try:
@@ -195,13 +420,7 @@ class BalanceService:
 
             current_month = BalanceService.get_first_day_of_month()
 
-            cursor.execute("""
-                SELECT ub.current_balance, u.scope, sbc.description
-                FROM user_balances ub
-                JOIN users u ON ub.user_id = u.id
-                LEFT JOIN scope_balance_config sbc ON u.scope = sbc.scope
-                WHERE ub.user_id = ? AND ub.balance_month = ?
-            """, [user_id, current_month])
+            cursor.execute(CURRENT_BALANCE_SQL, [user_id, current_month])
 
             result = cursor.fetchone()
             if not result:
@@ -241,6 +460,9 @@ class BalanceService:
             
             current_month = BalanceService.get_first_day_of_month()
 
+            # Expire open leases in the same transaction so their credit is not added on top
+            cursor.execute(EXPIRE_USER_LEASES_SQL, [user_id, current_month])
+
             # Check if balance record exists
             cursor.execute("""
                 SELECT id FROM user_balances
@@ -1,6 +1,6 @@
 import os 
 from openai import AzureOpenAI
-from flask import jsonify, request, g, make_response
+from flask import jsonify, request, g, make_response, has_request_context
 
 # MICROSOFT ENTRA CONFIGURATION 
 class Config:
@@ -300,8 +300,20 @@ def get_document_intelligence_config():
 
 def create_api_response(data, status_code=200):
     """Helper function to create consistent API responses"""
+    # Tell callers when every LLM call behind this response was answered from the response cache
+    llm_cache_status = getattr(g, 'llm_cache_status', None) if has_request_context() else None
+    if llm_cache_status == "HIT" and isinstance(data, dict):
+        data = {**data, "cached": True}
+    
     response = make_response(jsonify(data))
     response.status_code = status_code
+    if llm_cache_status:
+        response.headers['X-LLM-Cache'] = llm_cache_status
+    
+    # Keep the original dict so logging and usage middleware don't decode the body again
+    if has_request_context():
+        g.response_data = data
+        g.response_data_for = response
     
     # Add correlation ID to response if available in g context
     correlation_id = getattr(g, 'correlation_id', None)
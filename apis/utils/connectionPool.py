@@ -0,0 +1,248 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# POOL CONFIGURATION - SIZES ARE PER WORKER PROCESS
+DB_POOL_ENABLED = os.environ.get("DB_POOL_ENABLED", "true").lower() == "true"
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.environ.get("DB_POOL_HEALTH_CHECK_AFTER", 30))
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the pool timeout"""
+    pass
+
+
+class PooledConnection:
+    """
+    Proxy around a DB-API connection checked out from a ConnectionPool
+
+    Behaves like the underlying connection, except that close() hands the
+    connection back to the pool instead of closing the socket. A proxy that is
+    garbage collected without being closed releases its slot and discards the
+    connection, since its transaction state is unknown.
+    """
+
+    def __init__(self, pool, raw_connection, created_at):
+        self._pool = pool
+        self._raw = raw_connection
+        self._created_at = created_at
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw, name, value)
+
+    def cursor(self, *args, **kwargs):
+        return self._raw.cursor(*args, **kwargs)
+
+    def commit(self):
+        return self._raw.commit()
+
+    def rollback(self):
+        return self._raw.rollback()
+
+    def close(self):
+        """Return the connection to the pool"""
+        if self._returned:
+            return
+        self._returned = True
+        self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __del__(self):
+        try:
+            if not self._returned:
+                self._returned = True
+                self._pool._release(self._raw, self._created_at, discard=True)
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded pool of database connections
+
+    Args:
+        connection_factory (callable): Function returning a new DB-API connection
+        max_size (int): Maximum number of open connections (idle + in use)
+        timeout (float): Seconds to wait for a free connection before raising PoolTimeoutError
+        max_lifetime (float): Connections older than this are closed and replaced
+        health_check_after (float): Connections idle for longer than this are pinged before reuse
+        health_check_query (str): Query used to ping a connection
+    """
+
+    def __init__(self, connection_factory, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 max_lifetime=DB_POOL_MAX_LIFETIME, health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                 health_check_query="SELECT 1"):
+        self.connection_factory = connection_factory
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.health_check_query = health_check_query
+
+        # Idle connections as (raw_connection, created_at, last_used_at)
+        self._idle = deque()
+        self._open_count = 0
+        self._condition = threading.Condition(threading.Lock())
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "health_check_failures": 0,
+            "connections_discarded": 0
+        }
+
+    def get_connection(self):
+        """Check out a connection, waiting up to the pool timeout for one to become free"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        with self._condition:
+            while True:
+                if self._idle:
+                    raw, created_at, last_used_at = self._idle.pop()
+                    break
+
+                if self._open_count < self.max_size:
+                    # Reserve a slot and open the connection outside the lock
+                    self._open_count += 1
+                    raw = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection "
+                        f"(pool size {self.max_size})"
+                    )
+                waited = True
+                self._condition.wait(remaining)
+
+        try:
+            if raw is None:
+                raw, created_at = self._open()
+            else:
+                raw, created_at = self._validate(raw, created_at, last_used_at)
+        except Exception:
+            with self._condition:
+                self._open_count -= 1
+                self._condition.notify()
+            raise
+
+        wait_ms = (time.monotonic() - start) * 1000
+        with self._condition:
+            self._stats["checkouts"] += 1
+            self._stats["total_wait_ms"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+            if waited:
+                self._stats["waits"] += 1
+
+        return PooledConnection(self, raw, created_at)
+
+    def _open(self):
+        raw = self.connection_factory()
+        with self._condition:
+            self._stats["connections_created"] += 1
+        return raw, time.monotonic()
+
+    def _validate(self, raw, created_at, last_used_at):
+        """Recycle expired connections and ping connections that have been idle for a while"""
+        now = time.monotonic()
+
+        if self.max_lifetime and now - created_at >= self.max_lifetime:
+            self._close_quietly(raw)
+            with self._condition:
+                self._stats["connections_recycled"] += 1
+            return self._open()
+
+        if self.health_check_after is not None and now - last_used_at >= self.health_check_after:
+            try:
+                cursor = raw.cursor()
+                cursor.execute(self.health_check_query)
+                cursor.fetchall()
+                cursor.close()
+            except Exception as e:
+                logger.warning(f"Pooled database connection failed health check, reconnecting: {str(e)}")
+                self._close_quietly(raw)
+                with self._condition:
+                    self._stats["health_check_failures"] += 1
+                return self._open()
+
+        return raw, created_at
+
+    def _release(self, raw, created_at, discard=False):
+        """Return a connection to the idle set, or close it and free its slot"""
+        if not discard:
+            try:
+                # Never hand an open transaction to the next caller
+                raw.rollback()
+            except Exception:
+                discard = True
+
+        if not discard and self.max_lifetime and time.monotonic() - created_at >= self.max_lifetime:
+            discard = True
+
+        if discard:
+            self._close_quietly(raw)
+
+        with self._condition:
+            if discard:
+                self._open_count -= 1
+                self._stats["connections_discarded"] += 1
+            else:
+                self._idle.append((raw, created_at, time.monotonic()))
+            self._condition.notify()
+
+    def _close_quietly(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Close every idle connection (connections in use are closed when returned)"""
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open_count -= len(idle)
+            self._condition.notify_all()
+        for raw, _, _ in idle:
+            self._close_quietly(raw)
+
+    def get_stats(self):
+        """Return pool size, checkout and wait-time metrics"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats["max_size"] = self.max_size
+            stats["open"] = self._open_count
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._open_count - len(self._idle)
+        stats["avg_wait_ms"] = stats["total_wait_ms"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
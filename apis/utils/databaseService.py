@@ -1,13 +1,52 @@
 import os
 import pyodbc
 import logging
+import threading
 import uuid
 import json 
+from flask import g, has_request_context
+from apis.utils.connectionPool import ConnectionPool, DB_POOL_ENABLED
+from apis.utils.endpointRegistry import endpoint_registry, ENDPOINT_REGISTRY_ENABLED
+from apis.utils.accessCache import user_access_cache, ACCESS_CACHE_ENABLED
 
 # CONFIGURE LOGGING
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# REQUEST-SCOPED LOOKUP MEMO
+# Lookups that every middleware and route repeats (token, user, endpoint) are memoised
+# on the Flask g object so they hit the database at most once per request.
+def get_request_memo(namespace, key):
+    """Get a memoised lookup result for the current request (None if absent or outside a request)"""
+    if not has_request_context() or key is None:
+        return None
+    memo = getattr(g, '_db_request_memo', None)
+    if not memo:
+        return None
+    return memo.get(namespace, {}).get(key)
+
+def set_request_memo(namespace, key, value):
+    """Memoise a lookup result for the remainder of the current request"""
+    if not has_request_context() or key is None or value is None:
+        return
+    memo = getattr(g, '_db_request_memo', None)
+    if memo is None:
+        memo = {}
+        g._db_request_memo = memo
+    memo.setdefault(namespace, {})[key] = value
+
+def clear_request_memo(namespace=None):
+    """Drop memoised lookups after a write so the rest of the request sees fresh data"""
+    if not has_request_context():
+        return
+    memo = getattr(g, '_db_request_memo', None)
+    if not memo:
+        return
+    if namespace:
+        memo.pop(namespace, None)
+    else:
+        memo.clear()
+
 # DATABASE SERVICE
 class DatabaseService:
     DB_CONFIG={
@@ -78,11 +117,61 @@ class DatabaseService:
                 'error': str(e)
             }
     
+    # CONNECTION POOL - CREATED LAZILY PER WORKER PROCESS
+    _pool = None
+    _pool_pid = None
+    _pool_lock = threading.Lock()
+    
+    @staticmethod
+    def create_connection():
+        """Open a new, unpooled connection to the database"""
+        return pyodbc.connect(DatabaseService.CONNECTION_STRING)
+    
+    @staticmethod
+    def get_pool():
+        """Get the connection pool for this worker process, creating it on first use"""
+        pid = os.getpid()
+        if DatabaseService._pool is None or DatabaseService._pool_pid != pid:
+            with DatabaseService._pool_lock:
+                if DatabaseService._pool is None or DatabaseService._pool_pid != pid:
+                    # A pool inherited across fork shares sockets with the parent - start fresh
+                    DatabaseService._pool = ConnectionPool(DatabaseService.create_connection)
+                    DatabaseService._pool_pid = pid
+                    logger.info(f"Database connection pool created for worker {pid} (max size {DatabaseService._pool.max_size})")
+        return DatabaseService._pool
+    
+    @staticmethod
+    def configure_pool(connection_factory=None, **pool_options):
+        """Replace the connection pool, e.g. with a different size or a stand-in connection factory
+        
+        Args:
+            connection_factory (callable): Function returning a new DB-API connection
+                (defaults to DatabaseService.create_connection)
+            **pool_options: Keyword arguments passed to ConnectionPool
+        """
+        with DatabaseService._pool_lock:
+            if DatabaseService._pool is not None:
+                DatabaseService._pool.close_all()
+            DatabaseService._pool = ConnectionPool(connection_factory or DatabaseService.create_connection, **pool_options)
+            DatabaseService._pool_pid = os.getpid()
+        return DatabaseService._pool
+    
+    @staticmethod
+    def get_pool_stats():
+        """Get checkout and wait-time metrics for this worker's connection pool"""
+        if not DB_POOL_ENABLED:
+            return {"enabled": False}
+        stats = DatabaseService.get_pool().get_stats()
+        stats["enabled"] = True
+        stats["pid"] = DatabaseService._pool_pid
+        return stats
+    
     @staticmethod
     def get_connection():
         try:
-            conn = pyodbc.connect(DatabaseService.CONNECTION_STRING)
-            return conn
+            if not DB_POOL_ENABLED:
+                return DatabaseService.create_connection()
+            return DatabaseService.get_pool().get_connection()
         except Exception as e:
             logger.error(f"Database connection error: {str(e)}")
             raise
@@ -91,6 +180,10 @@ class DatabaseService:
     @staticmethod
     def validate_api_key(api_key):
         """Validate API key and return user details if valid"""
+        cached = get_request_memo('api_key', api_key)
+        if cached:
+            return cached
+        
         try:
             conn = DatabaseService.get_connection()
             cursor = conn.cursor()
@@ -107,7 +200,7 @@ class DatabaseService:
             conn.close()
             
             if user:
-                return {
+                user_info = {
                     "id": str(user[0]),
                     "user_name": user[1],
                     "user_email": user[2],
@@ -118,6 +211,8 @@ class DatabaseService:
                     "scope": user[7],
                     "active": user[8]
                 }
+                set_request_memo('api_key', api_key, user_info)
+                return user_info
             return None
             
         except Exception as e:
@@ -128,6 +223,10 @@ class DatabaseService:
     @staticmethod
     def get_token_details_by_value(token_value):
         """Get token details by token value"""
+        cached = get_request_memo('token', token_value)
+        if cached:
+            return cached
+        
         try:
             conn = DatabaseService.get_connection()
             cursor = conn.cursor()
@@ -153,18 +252,97 @@ class DatabaseService:
             if not result:
                 return None
                 
-            return {
+            token_details = {
                 "id": result[0],
                 "token_value": result[1],
                 "user_id": result[2],
                 "token_scope": result[3],
                 "token_expiration_time": result[4]
             }
+            set_request_memo('token', token_value, token_details)
+            return token_details
             
         except Exception as e:
             logger.error(f"Token details retrieval error: {str(e)}")
             return None
     
+    @staticmethod
+    def get_token_and_user_by_value(token_value):
+        """Get token details and the owning user's details in a single query
+        
+        Seeds the request memo for get_token_details_by_value and get_user_by_id so
+        middleware and routes resolving the same token do not query again.
+        
+        Args:
+            token_value (str): The token to look up
+            
+        Returns:
+            tuple: (token_details, user_details) - either may be None
+        """
+        cached_token = get_request_memo('token', token_value)
+        if cached_token:
+            return cached_token, DatabaseService.get_user_by_id(cached_token["user_id"])
+        
+        try:
+            conn = DatabaseService.get_connection()
+            cursor = conn.cursor()
+            
+            query = """
+            SELECT 
+                tt.id,
+                tt.token_value,
+                tt.user_id,
+                tt.token_scope,
+                tt.expires_on as token_expiration_time,
+                u.id, u.user_name, u.user_email, u.common_name, u.company,
+                u.department, u.api_key, u.scope, u.active, u.comment
+            FROM 
+                token_transactions tt
+            LEFT JOIN 
+                users u ON tt.user_id = u.id
+            WHERE 
+                tt.token_value = ?
+            """
+            
+            cursor.execute(query, [token_value])
+            result = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            
+            if not result:
+                return None, None
+            
+            token_details = {
+                "id": result[0],
+                "token_value": result[1],
+                "user_id": result[2],
+                "token_scope": result[3],
+                "token_expiration_time": result[4]
+            }
+            set_request_memo('token', token_value, token_details)
+            
+            user_details = None
+            if result[5] is not None:
+                user_details = {
+                    "id": str(result[5]),
+                    "user_name": result[6],
+                    "user_email": result[7],
+                    "common_name": result[8],
+                    "company": result[9],
+                    "department": result[10],
+                    "api_key": str(result[11]),
+                    "scope": result[12],
+                    "active": bool(result[13]),
+                    "comment": result[14]
+                }
+                set_request_memo('user', str(result[2]), user_details)
+            
+            return token_details, user_details
+            
+        except Exception as e:
+            logger.error(f"Token and user retrieval error: {str(e)}")
+            return None, None
+    
     @staticmethod
     def log_token_transaction(user_id, token_scope, expires_in, expires_on, token_value):
         """Log token generation transaction to database"""
@@ -236,6 +414,8 @@ class DatabaseService:
             cursor.close()
             conn.close()
             
+            clear_request_memo('token')
+            
             return rows_affected > 0
             
         except Exception as e:
@@ -412,6 +592,10 @@ class DatabaseService:
         Returns:
             dict: User details if found, None otherwise
         """
+        cached = get_request_memo('user', str(user_id) if user_id else None)
+        if cached:
+            return cached
+        
         try:
             conn = DatabaseService.get_connection()
             cursor = conn.cursor()
@@ -428,7 +612,7 @@ class DatabaseService:
             conn.close()
             
             if user:
-                return {
+                user_details = {
                     "id": str(user[0]),
                     "user_name": user[1],
                     "user_email": user[2],
@@ -440,6 +624,8 @@ class DatabaseService:
                     "active": bool(user[8]),
                     "comment": user[9]
                 }
+                set_request_memo('user', str(user_id), user_details)
+                return user_details
             return None
             
         except Exception as e:
@@ -504,6 +690,12 @@ class DatabaseService:
             cursor.close()
             conn.close()
             
+            clear_request_memo('user')
+            clear_request_memo('api_key')
+            
+            # Scope changes affect admin access
+            user_access_cache.invalidate(user_id)
+            
             return rows_affected > 0, updated_fields
             
         except Exception as e:
@@ -559,6 +751,10 @@ class DatabaseService:
             cursor.close()
             conn.close()
             
+            clear_request_memo('user')
+            clear_request_memo('api_key')
+            user_access_cache.invalidate(user_id)
+            
             return rows_affected > 0
             
         except Exception as e:
@@ -568,6 +764,15 @@ class DatabaseService:
     @staticmethod
     def get_endpoint_id_by_path(endpoint_path):
         """Get endpoint ID by path"""
+        if ENDPOINT_REGISTRY_ENABLED:
+            available, endpoint = endpoint_registry.get_by_path(endpoint_path)
+            if endpoint:
+                return endpoint["id"]
+        
+        cached = get_request_memo('endpoint_path', endpoint_path)
+        if cached:
+            return cached
+        
         try:
             conn = DatabaseService.get_connection()
             cursor = conn.cursor()
@@ -582,6 +787,14 @@ class DatabaseService:
             cursor.close()
             conn.close()
             
+            if result:
+                set_request_memo('endpoint_path', endpoint_path, result[0])
+                set_request_memo('endpoint_cost', result[0], result[1])
+                
+                # Endpoint exists but the registry does not know it yet (e.g. added on another node)
+                if ENDPOINT_REGISTRY_ENABLED:
+                    endpoint_registry.invalidate(publish=False)
+            
             return result[0] if result else None
             
         except Exception as e:
@@ -591,6 +804,15 @@ class DatabaseService:
     @staticmethod
     def get_endpoint_cost_by_id(endpoint_id):
         """Get endpoint cost by ID"""
+        if ENDPOINT_REGISTRY_ENABLED:
+            available, endpoint = endpoint_registry.get_by_id(endpoint_id)
+            if endpoint:
+                return endpoint["cost"]
+        
+        cached = get_request_memo('endpoint_cost', endpoint_id)
+        if cached is not None:
+            return cached
+        
         try:
             conn = DatabaseService.get_connection()
             cursor = conn.cursor()
@@ -605,104 +827,15 @@ class DatabaseService:
             cursor.close()
             conn.close()
             
+            if result:
+                set_request_memo('endpoint_cost', endpoint_id, result[0])
+            
             return result[0] if result else 1  # Default to 1 if not found
             
         except Exception as e:
             logger.error(f"Error getting endpoint cost: {str(e)}")
             return 1  # Default to 1 in case of error
     
-    @staticmethod
-    def log_api_call(endpoint_id, user_id=None, token_id=None, request_method=None, 
-                    request_headers=None, request_body=None, response_status=None, 
-                    response_time_ms=None, user_agent=None, ip_address=None, 
-                    error_message=None, response_body=None, correlation_id=None):
-        """Log API call to database"""
-        try:
-            conn = DatabaseService.get_connection()
-            cursor = conn.cursor()
-            
-            log_id = str(uuid.uuid4())
-            
-            query = """
-            INSERT INTO api_logs (
-                id, endpoint_id, user_id, timestamp, request_method, 
-                request_headers, request_body, response_status, response_time_ms,
-                user_agent, ip_address, token_id, error_message, response_body, correlation_id
-            )
-            VALUES (
-                ?, ?, ?, DATEADD(HOUR, 2, GETUTCDATE()), ?, 
-                ?, ?, ?, ?,
-                ?, ?, ?, ?, ?, ?
-            )
-            """
-            
-            # Convert dictionary to JSON string if necessary
-            if request_headers and isinstance(request_headers, dict):
-                request_headers = json.dumps(request_headers)
-                
-            if request_body and isinstance(request_body, dict):
-                request_body = json.dumps(request_body)
-                
-            if response_body and isinstance(response_body, dict):
-                response_body = json.dumps(response_body)
-            
-            cursor.execute(query, [
-                log_id, endpoint_id, user_id, request_method,
-                request_headers, request_body, response_status, response_time_ms,
-                user_agent, ip_address, token_id, error_message, response_body, correlation_id
-            ])
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return log_id
-            
-        except Exception as e:
-            logger.error(f"Error logging API call: {str(e)}")
-            return None
-
-    @staticmethod
-    def update_api_log_with_usage_id(api_log_id, usage_id):
-        """Update an api_logs record with the corresponding user_usage_id
-        
-        Args:
-            api_log_id (str): The ID of the API log entry
-            usage_id (str): The ID of the user_usage entry
-            
-        Returns:
-            bool: True if successful, False otherwise
-        """
-        try:
-            conn = DatabaseService.get_connection()
-            cursor = conn.cursor()
-            
-            query = """
-            UPDATE api_logs
-            SET user_usage_id = ?
-            WHERE id = ?
-            """
-            
-            cursor.execute(query, [usage_id, api_log_id])
-            
-            # Check if any rows were affected
-            rows_affected = cursor.rowcount
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            if rows_affected > 0:
-                logger.info(f"Updated API log {api_log_id} with usage ID {usage_id}")
-                return True
-            else:
-                logger.warning(f"No API log found with ID {api_log_id} to update")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error updating API log with usage ID: {str(e)}")
-            return False
-
     # New methods for endpoint access management
 
     @staticmethod
@@ -715,6 +848,11 @@ class DatabaseService:
         Returns:
             dict: Endpoint details if found, None otherwise
         """
+        if ENDPOINT_REGISTRY_ENABLED:
+            available, endpoint = endpoint_registry.get_by_id(endpoint_id)
+            if endpoint:
+                return dict(endpoint)
+        
         try:
             conn = DatabaseService.get_connection()
             cursor = conn.cursor()
@@ -881,6 +1019,7 @@ class DatabaseService:
             conn.close()
             
             logger.info(f"Endpoint access granted: User {user_id} can now access endpoint {endpoint_id}")
+            user_access_cache.invalidate(user_id)
             return True, access_id
             
         except Exception as e:
@@ -945,6 +1084,7 @@ class DatabaseService:
             conn.close()
             
             logger.info(f"All endpoint access granted: User {user_id} can now access {added_count} endpoints")
+            user_access_cache.invalidate(user_id)
             return True, added_count
             
         except Exception as e:
@@ -979,6 +1119,8 @@ class DatabaseService:
             cursor.close()
             conn.close()
             
+            user_access_cache.invalidate(user_id)
+            
             if rows_affected > 0:
                 logger.info(f"Endpoint access removed: User {user_id} no longer has access to endpoint {endpoint_id}")
             else:
@@ -1015,6 +1157,7 @@ class DatabaseService:
             conn.close()
             
             logger.info(f"All endpoint access removed: User {user_id} had {rows_affected} endpoint access records removed")
+            user_access_cache.invalidate(user_id)
             return rows_affected
             
         except Exception as e:
@@ -1034,6 +1177,11 @@ class DatabaseService:
         Returns:
             bool: True if the user has access, False otherwise
         """
+        if ACCESS_CACHE_ENABLED:
+            has_access = user_access_cache.has_access(user_id, endpoint_id)
+            if has_access is not None:
+                return has_access
+        
         try:
             conn = DatabaseService.get_connection()
             cursor = conn.cursor()
@@ -1063,3 +1211,39 @@ class DatabaseService:
         except Exception as e:
             logger.error(f"Error checking endpoint access: {str(e)}")
             return False
+
+    @staticmethod
+    def get_user_access_set(user_id):
+        """Load a user's admin flag and granted endpoint ids in a single query
+        
+        Args:
+            user_id (str): UUID of the user
+            
+        Returns:
+            tuple: (is_admin, frozenset of lower-case endpoint ids), or None if the user does not exist or on error
+        """
+        try:
+            conn = DatabaseService.get_connection()
+            cursor = conn.cursor()
+            
+            query = """
+            SELECT u.scope, uea.endpoint_id
+            FROM users u
+            LEFT JOIN user_endpoint_access uea ON uea.user_id = u.id
+            WHERE u.id = ?
+            """
+            cursor.execute(query, [user_id])
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            
+            if not rows:
+                return None
+            
+            is_admin = rows[0][0] == 0
+            endpoint_ids = frozenset(str(row[1]).lower() for row in rows if row[1] is not None)
+            return is_admin, endpoint_ids
+            
+        except Exception as e:
+            logger.error(f"Error loading endpoint access set: {str(e)}")
+            return None
@@ -0,0 +1,380 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# ROUTER CONFIGURATION
+ROUTER_EWMA_ALPHA = float(os.environ.get("ROUTER_EWMA_ALPHA", 0.2))
+# Consecutive failures, or a smoothed error rate (after ROUTER_MIN_SAMPLES calls), that open a region's circuit
+ROUTER_FAILURE_THRESHOLD = int(os.environ.get("ROUTER_FAILURE_THRESHOLD", 3))
+ROUTER_ERROR_RATE_THRESHOLD = float(os.environ.get("ROUTER_ERROR_RATE_THRESHOLD", 0.5))
+ROUTER_MIN_SAMPLES = int(os.environ.get("ROUTER_MIN_SAMPLES", 10))
+# How long an open circuit stays open before a single half-open probe is allowed (doubles per failed probe)
+ROUTER_OPEN_SECONDS = float(os.environ.get("ROUTER_OPEN_SECONDS", 30))
+ROUTER_MAX_OPEN_SECONDS = float(os.environ.get("ROUTER_MAX_OPEN_SECONDS", 300))
+# Back-off for a 429 without a Retry-After header
+ROUTER_DEFAULT_RETRY_AFTER = float(os.environ.get("ROUTER_DEFAULT_RETRY_AFTER", 10))
+# A healthy region is still demoted below later regions while its latency EWMA is this many times the best
+ROUTER_LATENCY_TOLERANCE = float(os.environ.get("ROUTER_LATENCY_TOLERANCE", 2.0))
+# Send a hedged request to the next region once the first has run longer than this latency
+# percentile of its recent calls (0 disables hedging)
+ROUTER_HEDGE_PERCENTILE = float(os.environ.get("ROUTER_HEDGE_PERCENTILE", 0))
+ROUTER_HEDGE_MIN_SAMPLES = int(os.environ.get("ROUTER_HEDGE_MIN_SAMPLES", 20))
+ROUTER_LATENCY_WINDOW = int(os.environ.get("ROUTER_LATENCY_WINDOW", 200))
+ROUTER_HEDGE_WORKERS = int(os.environ.get("ROUTER_HEDGE_WORKERS", 16))
+
+# Status codes caused by the request itself (bad input, content filter, too large) - failing over won't help
+REQUEST_ERROR_STATUS_CODES = {400, 413, 422}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+def get_status_code(error):
+    """Get the HTTP status code from an OpenAI / Azure SDK exception (None if it has none)"""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        response = getattr(error, 'response', None)
+        status_code = getattr(response, 'status_code', None)
+    return status_code if isinstance(status_code, int) else None
+
+def get_retry_after(error):
+    """Get the Retry-After delay in seconds from an exception's response headers (None if absent)"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers.get('retry-after-ms')) / 1000
+        if headers.get('retry-after'):
+            return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+    return None
+
+def is_request_error(error):
+    """Check whether an error was caused by the request rather than the region"""
+    return get_status_code(error) in REQUEST_ERROR_STATUS_CODES
+
+
+class RegionHealth:
+    """Latency, error rate, throttling and circuit-breaker state for one region"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.state = CLOSED
+        self.latency_ewma = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.open_seconds = ROUTER_OPEN_SECONDS
+        self.throttled_until = 0.0
+        self.probe_in_flight = False
+        self.latencies = deque(maxlen=ROUTER_LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """Check whether the region may take a call now (claims the probe slot when half-open)"""
+        now = self.clock()
+        with self.lock:
+            if now < self.throttled_until:
+                return False
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now >= self.open_until:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def is_available(self):
+        """Check availability without claiming a half-open probe"""
+        now = self.clock()
+        with self.lock:
+            if now < self.throttled_until:
+                return False
+            if self.state == OPEN:
+                return now >= self.open_until
+            if self.state == HALF_OPEN:
+                return not self.probe_in_flight
+            return True
+
+    def _update_error_rate(self, failed):
+        self.samples += 1
+        self.error_rate += ROUTER_EWMA_ALPHA * ((1.0 if failed else 0.0) - self.error_rate)
+
+    def record_success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += ROUTER_EWMA_ALPHA * (latency - self.latency_ewma)
+            self._update_error_rate(False)
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                logger.info("Region circuit closed after successful probe")
+            self.state = CLOSED
+            self.probe_in_flight = False
+            self.open_seconds = ROUTER_OPEN_SECONDS
+
+    def record_failure(self, status_code=None, retry_after=None):
+        now = self.clock()
+        with self.lock:
+            if status_code == 429:
+                # Throttling says nothing about the region's health - just stay away until it lifts
+                self.throttled_until = now + (retry_after if retry_after is not None else ROUTER_DEFAULT_RETRY_AFTER)
+                if self.state == HALF_OPEN:
+                    self.probe_in_flight = False
+                return
+
+            self._update_error_rate(True)
+            self.consecutive_failures += 1
+
+            if self.state == HALF_OPEN:
+                self.open_seconds = min(self.open_seconds * 2, ROUTER_MAX_OPEN_SECONDS)
+                self._open(now)
+            elif self.state == CLOSED and (
+                self.consecutive_failures >= ROUTER_FAILURE_THRESHOLD or
+                (self.samples >= ROUTER_MIN_SAMPLES and self.error_rate >= ROUTER_ERROR_RATE_THRESHOLD)
+            ):
+                self._open(now)
+
+    def release_probe(self):
+        """Free a claimed half-open probe slot that ended without a verdict (e.g. a request error)"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def _open(self, now):
+        self.state = OPEN
+        self.open_until = now + self.open_seconds
+        self.probe_in_flight = False
+
+    def latency_percentile(self, percentile):
+        """Latency at the given percentile of recent successful calls (None without enough samples)"""
+        with self.lock:
+            if len(self.latencies) < ROUTER_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                "consecutive_failures": self.consecutive_failures,
+                "throttled_for_s": max(0.0, round(self.throttled_until - self.clock(), 1))
+            }
+
+
+class DeploymentRegion:
+    """A named client for one region and its health"""
+
+    def __init__(self, name, client, clock=time.monotonic):
+        self.name = name
+        self.client = client
+        self.health = RegionHealth(clock)
+
+
+class DeploymentRouter:
+    """
+    Picks the best healthy region for each call and fails over to the rest
+
+    Regions keep their configured preference order (e.g. data residency) unless one is
+    throttled (429 / Retry-After), has an open circuit, or its latency EWMA is well above
+    the best region's. Circuits open after consecutive failures or a high error rate and
+    let one half-open probe through once the open period ends. Optionally a hedged request
+    goes to the next region when the first runs past a latency percentile, and the first
+    successful answer wins.
+
+    Clients are only used through request_fn, so any object can stand in for a client.
+    """
+
+    def __init__(self, name, regions, clock=time.monotonic, hedge_percentile=ROUTER_HEDGE_PERCENTILE,
+                 latency_tolerance=ROUTER_LATENCY_TOLERANCE):
+        self.name = name
+        self.clock = clock
+        self.regions = [DeploymentRegion(region_name, client, clock) for region_name, client in regions]
+        self.hedge_percentile = hedge_percentile
+        self.latency_tolerance = latency_tolerance
+
+    def candidates(self):
+        """Regions in the order they should be tried for the next call"""
+        available = [region for region in self.regions if region.health.is_available()]
+        if not available:
+            # Everything is unhealthy - trying in preference order beats failing without trying
+            return list(self.regions)
+
+        latencies = [region.health.latency_ewma for region in available if region.health.latency_ewma is not None]
+        best_latency = min(latencies) if latencies else None
+
+        def demoted(region):
+            latency = region.health.latency_ewma
+            return best_latency is not None and latency is not None and latency > best_latency * self.latency_tolerance
+
+        ordered = sorted(available, key=lambda region: (demoted(region), self.regions.index(region)))
+        return ordered + [region for region in self.regions if region not in available]
+
+    def _attempt(self, region, request_fn, claimed):
+        start = self.clock()
+        try:
+            result = request_fn(region.client)
+        except Exception as e:
+            if is_request_error(e):
+                if claimed:
+                    region.health.release_probe()
+            else:
+                region.health.record_failure(get_status_code(e), get_retry_after(e))
+            raise
+        region.health.record_success(self.clock() - start)
+        return result
+
+    def _hedge_delay(self, region):
+        if not self.hedge_percentile:
+            return None
+        return region.health.latency_percentile(self.hedge_percentile)
+
+    def _call_hedged(self, first, claimed, second, request_fn, delay, tried):
+        futures = {_hedge_executor().submit(self._attempt, first, request_fn, claimed): first}
+        done, _ = wait(futures, timeout=delay)
+
+        if not done and second.health.try_acquire():
+            logger.info(f"{self.name}: {first.name} slower than p{self.hedge_percentile:g} ({delay:.2f}s), hedging to {second.name}")
+            tried.add(second.name)
+            futures[_hedge_executor().submit(self._attempt, second, request_fn, True)] = second
+
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result(), futures[future]
+                except Exception as e:
+                    last_error = e
+                    if is_request_error(e):
+                        raise
+        raise last_error
+
+    def call(self, request_fn, limiter=None):
+        """
+        Run request_fn(client) against the best region, failing over to the others
+
+        Args:
+            request_fn (callable): Makes the request with the given region's client
+            limiter (RegionLimiter, optional): Per-region concurrency cap - the call waits for a
+                slot and starts in the best region that has one free
+
+        Returns:
+            tuple: (result, region_name)
+
+        Raises:
+            The request error immediately for errors caused by the request itself,
+            otherwise the last region's error once every region has failed
+        """
+        candidates = self.candidates()
+        if limiter is None or not candidates:
+            return self._call(candidates, request_fn)
+
+        available = [region.name for region in candidates if region.health.is_available()]
+        slot = limiter.acquire(available or [candidates[0].name])
+        try:
+            # Failover attempts run under the slot of the region the call started in
+            candidates = sorted(candidates, key=lambda region: region.name != slot)
+            return self._call(candidates, request_fn)
+        finally:
+            limiter.release(slot)
+
+    def _call(self, candidates, request_fn):
+        tried = set()
+        last_error = None
+
+        for index, region in enumerate(candidates):
+            if region.name in tried:
+                continue
+            claimed = region.health.try_acquire()
+            if not claimed and any(r.health.is_available() for r in candidates[index + 1:] if r.name not in tried):
+                continue
+            tried.add(region.name)
+
+            try:
+                delay = self._hedge_delay(region)
+                second = next((r for r in candidates[index + 1:] if r.name not in tried), None)
+                if delay is not None and second is not None:
+                    result, used = self._call_hedged(region, claimed, second, request_fn, delay, tried)
+                else:
+                    logger.info(f"{self.name}: attempting request using {region.name} client")
+                    result, used = self._attempt(region, request_fn, claimed), region
+                return result, used.name
+
+            except Exception as e:
+                if is_request_error(e):
+                    raise
+                last_error = e
+                logger.warning(f"{self.name}: error with {region.name} client: {str(e)}")
+
+        if last_error is None:
+            last_error = RuntimeError(f"No {self.name} region available")
+        raise last_error
+
+    def get_stats(self):
+        """Return health statistics per region"""
+        return {region.name: region.health.get_stats() for region in self.regions}
+
+
+class RegionLimiter:
+    """
+    Caps the concurrent calls one kind of traffic (e.g. batch jobs) sends to each region
+
+    acquire() takes a slot in the first of the given regions with one free and only waits
+    while all of them are busy, so work spills over to the next-best region instead of
+    queueing behind the preferred one.
+    """
+
+    def __init__(self, per_region):
+        self.per_region = max(1, per_region)
+        self.active = {}
+        self.condition = threading.Condition()
+
+    def acquire(self, region_names):
+        """Wait for a free slot in one of region_names (in preference order); returns the region"""
+        with self.condition:
+            while True:
+                for name in region_names:
+                    if self.active.get(name, 0) < self.per_region:
+                        self.active[name] = self.active.get(name, 0) + 1
+                        return name
+                self.condition.wait()
+
+    def release(self, region_name):
+        with self.condition:
+            self.active[region_name] -= 1
+            self.condition.notify_all()
+
+    def get_stats(self):
+        with self.condition:
+            return {"per_region": self.per_region, "active": dict(self.active)}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _hedge_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=ROUTER_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+    return _executor
@@ -0,0 +1,239 @@
+import os
+import json
+import fcntl
+import hashlib
+import logging
+import tempfile
+import threading
+import unicodedata
+import numpy as np
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# EMBEDDING CACHE CONFIGURATION
+# Node-local directory of cached chunk embeddings shared by all workers - "" disables the cache
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join(tempfile.gettempdir(), "embedding-cache"))
+# Storage type of cached vectors - float16 halves the disk and page cache footprint
+EMBEDDING_CACHE_DTYPE = os.environ.get("EMBEDDING_CACHE_DTYPE", "float16")
+# Size limit of one model's vector file - new embeddings are no longer cached beyond it
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MAX_BYTES", 4 * 1024 * 1024 * 1024))
+
+KEYS_FILE = "keys.bin"
+VECTORS_FILE = "vectors.bin"
+META_FILE = "meta.json"
+KEY_SIZE = hashlib.sha256().digest_size
+
+def normalise_text(text):
+    """Normalise chunk text for cache keys - Unicode NFC with whitespace runs collapsed"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def embedding_model_name(embeddings):
+    """Identify the model (and output dimensions) an embedding client produces vectors with"""
+    name = getattr(embeddings, "deployment", None) or getattr(embeddings, "model", None) or type(embeddings).__name__
+    dimensions = getattr(embeddings, "dimensions", None)
+    return f"{name}:{dimensions}" if dimensions else name
+
+
+class ModelEmbeddingStore:
+    """
+    Append-only embedding file of one model
+
+    vectors.bin holds one fixed-size row per cached text and keys.bin the sha256 key of each
+    row in the same order, so the in-memory index is just key -> row number. Writers append
+    under an exclusive file lock, vectors before keys, so a key never points at a row that
+    was not written; readers pick up rows other workers appended when they miss.
+    """
+
+    def __init__(self, folder, model, dtype, max_bytes):
+        self.folder = folder
+        self.model = model
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.dimension = None
+        self.rows = {}
+        self.loaded = 0
+        self.vectors = None
+        self.full = False
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self._read_meta()
+
+    @property
+    def row_size(self):
+        return self.dimension * self.dtype.itemsize
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.folder, META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return
+        if meta.get("dtype") != self.dtype.name:
+            # Written with another storage type - keep using it so existing rows stay readable
+            self.dtype = np.dtype(meta["dtype"])
+        self.dimension = meta["dimension"]
+
+    def _refresh(self):
+        """Index the rows appended since the last refresh (caller holds self.lock)"""
+        if self.dimension is None:
+            self._read_meta()
+            if self.dimension is None:
+                return
+        keys_path = os.path.join(self.folder, KEYS_FILE)
+        vectors_path = os.path.join(self.folder, VECTORS_FILE)
+        try:
+            complete = min(os.path.getsize(keys_path) // KEY_SIZE, os.path.getsize(vectors_path) // self.row_size)
+        except FileNotFoundError:
+            return
+        if complete <= self.loaded:
+            return
+
+        with open(keys_path, "rb") as f:
+            f.seek(self.loaded * KEY_SIZE)
+            data = f.read((complete - self.loaded) * KEY_SIZE)
+        for offset in range(0, len(data), KEY_SIZE):
+            self.rows.setdefault(data[offset:offset + KEY_SIZE], self.loaded + offset // KEY_SIZE)
+        self.loaded = complete
+        self.vectors = np.memmap(vectors_path, dtype=self.dtype, mode="r", shape=(complete, self.dimension))
+
+    def get_many(self, keys):
+        with self.lock:
+            if any(key not in self.rows for key in keys):
+                self._refresh()
+            found = {key: self.rows[key] for key in keys if key in self.rows}
+            vectors = self.vectors
+        return {key: np.asarray(vectors[row], dtype=np.float32) for key, row in found.items()}
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors)
+        with self.lock, open(os.path.join(self.folder, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self.dimension is None:
+                    self._read_meta()
+                if self.dimension is None:
+                    self.dimension = vectors.shape[1]
+                    with open(os.path.join(self.folder, META_FILE), "w", encoding="utf-8") as f:
+                        json.dump({"model": self.model, "dimension": self.dimension, "dtype": self.dtype.name}, f)
+                elif vectors.shape[1] != self.dimension:
+                    logger.warning(f"Embedding cache for {self.model} holds {self.dimension}-dimensional vectors, not caching {vectors.shape[1]}-dimensional ones")
+                    return
+
+                # Rows other workers appended meanwhile are not written twice
+                self._refresh()
+                new_positions = []
+                seen = set()
+                for position, key in enumerate(keys):
+                    if key not in self.rows and key not in seen:
+                        seen.add(key)
+                        new_positions.append(position)
+                if not new_positions:
+                    return
+
+                vectors_path = os.path.join(self.folder, VECTORS_FILE)
+                size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+                if size + len(new_positions) * self.row_size > self.max_bytes:
+                    if not self.full:
+                        logger.warning(f"Embedding cache for {self.model} reached {self.max_bytes} bytes, no longer caching new embeddings")
+                        self.full = True
+                    return
+
+                # Drop rows or keys left by an interrupted writer so rows stay aligned with keys
+                keys_path = os.path.join(self.folder, KEYS_FILE)
+                if size != self.loaded * self.row_size:
+                    with open(vectors_path, "r+b") as f:
+                        f.truncate(self.loaded * self.row_size)
+                if os.path.exists(keys_path) and os.path.getsize(keys_path) != self.loaded * KEY_SIZE:
+                    with open(keys_path, "r+b") as f:
+                        f.truncate(self.loaded * KEY_SIZE)
+
+                with open(vectors_path, "ab") as f:
+                    f.write(vectors[new_positions].astype(self.dtype).tobytes())
+                with open(keys_path, "ab") as f:
+                    f.write(b"".join(keys[position] for position in new_positions))
+                self._refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    """
+    Persistent, node-local cache of chunk embeddings
+
+    Vectors are keyed by the embedding model and the sha256 of the normalised chunk text, so
+    boilerplate, repeated sections and re-uploaded documents are embedded once per node and
+    model. Each model has its own ModelEmbeddingStore directory.
+    """
+
+    def __init__(self, root=EMBEDDING_CACHE_DIR, dtype=EMBEDDING_CACHE_DTYPE, max_bytes=EMBEDDING_CACHE_MAX_BYTES):
+        self.root = root
+        self.dtype = dtype
+        self.max_bytes = max_bytes
+        self.stores = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "errors": 0}
+        if self.root:
+            try:
+                os.makedirs(self.root, exist_ok=True)
+            except Exception as e:
+                logger.error(f"Could not create embedding cache directory {self.root}: {str(e)} - embeddings are not cached")
+                self.root = ""
+
+    @property
+    def enabled(self):
+        return bool(self.root)
+
+    @staticmethod
+    def key(text):
+        """Cache key of a chunk text"""
+        return hashlib.sha256(normalise_text(text).encode("utf-8")).digest()
+
+    def _store(self, model):
+        with self.lock:
+            store = self.stores.get(model)
+            if store is None:
+                folder = os.path.join(self.root, hashlib.sha256(model.encode("utf-8")).hexdigest()[:16])
+                store = ModelEmbeddingStore(folder, model, self.dtype, self.max_bytes)
+                self.stores[model] = store
+            return store
+
+    def get_many(self, model, keys):
+        """
+        Look up cached embeddings
+
+        Args:
+            model (str): Embedding model (see embedding_model_name)
+            keys (list): Cache keys of the texts
+
+        Returns:
+            dict: key -> float32 vector for the keys that are cached
+        """
+        if not self.enabled or not keys:
+            return {}
+        try:
+            found = self._store(model).get_many(keys)
+        except Exception as e:
+            logger.error(f"Error reading embedding cache: {str(e)}")
+            self.stats["errors"] += 1
+            return {}
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, model, keys, vectors):
+        """Cache the embeddings of texts (vectors has one row per key)"""
+        if not self.enabled or not keys:
+            return
+        try:
+            self._store(model).put_many(keys, vectors)
+        except Exception as e:
+            logger.error(f"Error writing embedding cache: {str(e)}")
+            self.stats["errors"] += 1
+
+    def get_stats(self):
+        return {**self.stats, "models": len(self.stores)}
+
+
+# SHARED EMBEDDING CACHE FOR THIS WORKER
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,270 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from apis.utils.deploymentRouter import get_status_code, get_retry_after, is_request_error
+from apis.utils.tokenBudget import count_tokens
+from apis.utils.embeddingCache import embedding_cache, embedding_model_name
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# EMBEDDING PIPELINE CONFIGURATION
+# Concurrent embedding requests per vectorstore build
+EMBEDDING_CONCURRENCY = int(os.environ.get("EMBEDDING_CONCURRENCY", 4))
+# Embedding tokens per minute all builds of a worker may send (the deployment's TPM quota share) - 0 is unlimited
+EMBEDDING_TOKENS_PER_MINUTE = int(os.environ.get("EMBEDDING_TOKENS_PER_MINUTE", 350000))
+# Texts and tokens per embedding request
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.environ.get("EMBEDDING_BATCH_MAX_TOKENS", 100000))
+EMBEDDING_MAX_RETRIES = int(os.environ.get("EMBEDDING_MAX_RETRIES", 5))
+# First back-off for failed requests (doubles per attempt) and for a 429 without a Retry-After header
+EMBEDDING_RETRY_DELAY = float(os.environ.get("EMBEDDING_RETRY_DELAY", 2))
+EMBEDDING_MAX_RETRY_DELAY = float(os.environ.get("EMBEDDING_MAX_RETRY_DELAY", 60))
+
+
+class TokenRateLimiter:
+    """
+    Token bucket of embedding tokens per minute, shared by all builds of a worker
+
+    A 429 pauses the whole bucket until the Retry-After has passed, so concurrent requests
+    back off together instead of each running into the limit again.
+    """
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.available = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self, tokens):
+        """Wait until tokens may be sent (a request larger than the bucket waits for a full bucket)"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.capacity <= 0:
+                        return
+                    self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                    self.updated = now
+                    needed = min(tokens, self.capacity)
+                    if self.available >= needed:
+                        self.available -= needed
+                        return
+                    wait = (needed - self.available) / self.rate
+                self.condition.wait(wait)
+
+    def pause(self, seconds):
+        """Stop all requests for seconds (after a 429)"""
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.available = 0.0
+            self.updated = time.monotonic()
+            self.condition.notify_all()
+
+
+class AdaptiveConcurrency:
+    """In-flight request cap that halves on throttling and grows back by one per success streak"""
+
+    def __init__(self, limit):
+        self.max_limit = max(1, limit)
+        self.limit = self.max_limit
+        self.active = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, throttled=False):
+        with self.condition:
+            self.active -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+            else:
+                self.successes += 1
+                if self.limit < self.max_limit and self.successes >= self.limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+
+class EmbeddingPipeline:
+    """
+    Embeds documents with concurrent, token-budgeted requests and builds FAISS indexes from them
+
+    Texts found in the node's embedding cache are not sent at all. The rest are grouped into
+    requests of at most batch_size texts and EMBEDDING_BATCH_MAX_TOKENS tokens. Requests run on
+    up to `concurrency` threads, each first taking its tokens from the worker's
+    TokenRateLimiter. A 429 pauses the limiter for the Retry-After and halves the build's
+    concurrency; other failures are retried with exponential back-off. Vectors are kept as
+    float32 and added to the index with a single add_embeddings call.
+
+    Args:
+        embeddings: LangChain embeddings client (AzureOpenAIEmbeddings)
+        concurrency (int): Maximum requests in flight
+        batch_size (int): Texts per request
+        max_retries (int): Attempts per request
+        retry_delay (float): First back-off in seconds
+    """
+
+    def __init__(self, embeddings, concurrency=EMBEDDING_CONCURRENCY, batch_size=EMBEDDING_BATCH_SIZE,
+                 max_retries=EMBEDDING_MAX_RETRIES, retry_delay=EMBEDDING_RETRY_DELAY, rate_limiter=None):
+        self.embeddings = embeddings
+        self.model = embedding_model_name(embeddings)
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max(1, max_retries)
+        self.retry_delay = retry_delay
+        self.rate_limiter = rate_limiter or embedding_rate_limiter
+
+    def batches(self, texts):
+        """Split texts into requests; yields (start, end, tokens)"""
+        start = 0
+        tokens = 0
+        for position, text in enumerate(texts):
+            text_tokens = count_tokens(text)
+            if position > start and (position - start >= self.batch_size or tokens + text_tokens > EMBEDDING_BATCH_MAX_TOKENS):
+                yield start, position, tokens
+                start, tokens = position, 0
+            tokens += text_tokens
+        if start < len(texts):
+            yield start, len(texts), tokens
+
+    def embed_texts(self, texts):
+        """
+        Embed texts, taking the vectors of texts embedded before from the embedding cache
+
+        Each distinct text missing from the cache is embedded once and then cached.
+
+        Returns:
+            tuple: (float32 array with one row per text, stats dict with embedded_tokens (sent
+                to the model), cached_tokens (served from the cache), requests, retries and throttled)
+        """
+        stats = {"embedded_tokens": 0, "cached_tokens": 0, "requests": 0, "retries": 0, "throttled": 0}
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32), stats
+
+        keys = [embedding_cache.key(text) for text in texts]
+        vectors_by_key = embedding_cache.get_many(self.model, keys)
+
+        # First position of every distinct text that is not cached
+        pending = {}
+        for position, key in enumerate(keys):
+            if key not in vectors_by_key and key not in pending:
+                pending[key] = position
+
+        if pending:
+            pending_keys = list(pending)
+            vectors, stats["embedded_tokens"] = self._embed_uncached([texts[pending[key]] for key in pending_keys], stats)
+            vectors_by_key.update(zip(pending_keys, vectors))
+            embedding_cache.put_many(self.model, pending_keys, vectors)
+
+        stats["cached_tokens"] = sum(count_tokens(texts[position]) for position, key in enumerate(keys) if pending.get(key) != position)
+        matrix = np.stack([vectors_by_key[key] for key in keys]).astype(np.float32, copy=False)
+        logger.info(f"Embedded {len(pending)} of {len(texts)} texts ({stats['embedded_tokens']} tokens, {stats['cached_tokens']} cached) "
+                    f"in {stats['requests']} requests, {stats['retries']} retries, {stats['throttled']} throttled")
+        return matrix, stats
+
+    def _embed_uncached(self, texts, stats):
+        """Embed texts with concurrent requests; returns (float32 array, tokens sent)"""
+        concurrency = AdaptiveConcurrency(self.concurrency)
+        stats_lock = threading.Lock()
+
+        def run(batch):
+            start, end, tokens = batch
+            vectors = self._embed_batch(texts[start:end], tokens, concurrency, stats, stats_lock)
+            return start, vectors
+
+        batches = list(self.batches(texts))
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches)), thread_name_prefix="embedding") as executor:
+            results = list(executor.map(run, batches))
+
+        dimension = results[0][1].shape[1]
+        matrix = np.empty((len(texts), dimension), dtype=np.float32)
+        for start, vectors in results:
+            matrix[start:start + len(vectors)] = vectors
+        return matrix, sum(tokens for _, _, tokens in batches)
+
+    def _embed_batch(self, texts, tokens, concurrency, stats, stats_lock):
+        for attempt in range(1, self.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            concurrency.acquire()
+            throttled = False
+            try:
+                with stats_lock:
+                    stats["requests"] += 1
+                return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            except Exception as e:
+                status_code = get_status_code(e)
+                if is_request_error(e) or attempt == self.max_retries:
+                    raise
+                delay = min(self.retry_delay * 2 ** (attempt - 1), EMBEDDING_MAX_RETRY_DELAY)
+                if status_code == 429:
+                    throttled = True
+                    retry_after = get_retry_after(e)
+                    delay = retry_after if retry_after is not None else delay
+                    self.rate_limiter.pause(delay)
+                with stats_lock:
+                    stats["retries"] += 1
+                    stats["throttled"] += 1 if throttled else 0
+                logger.warning(f"Embedding request failed (attempt {attempt}/{self.max_retries}, status {status_code}): {str(e)} - retrying in {delay:.1f}s")
+                # Jitter keeps throttled requests from retrying in lockstep
+                time.sleep(delay * random.uniform(1.0, 1.2))
+            finally:
+                concurrency.release(throttled)
+
+    def build_vectorstore(self, documents, normalize_L2=False):
+        """
+        Embed documents and build a FAISS vectorstore from them
+
+        Args:
+            documents (list): LangChain Documents
+            normalize_L2 (bool): Normalise vectors (as FAISS.from_documents(..., normalize_L2=True))
+
+        Returns:
+            tuple: (FAISS vectorstore, stats dict as from embed_texts)
+        """
+        texts = [doc.page_content for doc in documents]
+        if not texts:
+            raise ValueError("No documents to embed")
+        vectors, stats = self.embed_texts(texts)
+
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        vectorstore = FAISS(self.embeddings, index, InMemoryDocstore(), {}, normalize_L2=normalize_L2)
+        vectorstore.add_embeddings(zip(texts, vectors), metadatas=[doc.metadata for doc in documents])
+        return vectorstore, stats
+
+    def add_documents(self, vectorstore, documents):
+        """
+        Embed documents and add them to an existing FAISS vectorstore
+
+        Args:
+            vectorstore (FAISS): Vectorstore loaded in memory
+            documents (list): LangChain Documents
+
+        Returns:
+            dict: Stats as from embed_texts
+        """
+        texts = [doc.page_content for doc in documents]
+        vectors, stats = self.embed_texts(texts)
+        if texts:
+            vectorstore.add_embeddings(zip(texts, vectors), metadatas=[doc.metadata for doc in documents])
+        return stats
+
+
+# SHARED EMBEDDING RATE LIMITER FOR THIS WORKER
+embedding_rate_limiter = TokenRateLimiter(EMBEDDING_TOKENS_PER_MINUTE)
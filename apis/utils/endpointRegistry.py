@@ -0,0 +1,172 @@
+import os
+import time
+import logging
+import threading
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# REGISTRY CONFIGURATION
+ENDPOINT_REGISTRY_ENABLED = os.environ.get("ENDPOINT_REGISTRY_ENABLED", "true").lower() == "true"
+ENDPOINT_REGISTRY_TTL = float(os.environ.get("ENDPOINT_REGISTRY_TTL", 300))
+# Optional cross-worker invalidation channel: a file whose modification time is bumped on every
+# endpoint write. Point every worker (or every node, on a shared volume) at the same path.
+ENDPOINT_REGISTRY_SYNC_FILE = os.environ.get("ENDPOINT_REGISTRY_SYNC_FILE")
+ENDPOINT_REGISTRY_SYNC_CHECK_INTERVAL = float(os.environ.get("ENDPOINT_REGISTRY_SYNC_CHECK_INTERVAL", 2))
+
+
+class FileInvalidationChannel:
+    """Cross-worker invalidation signal based on the modification time of a shared file"""
+
+    def __init__(self, path, check_interval=ENDPOINT_REGISTRY_SYNC_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._last_check = 0.0
+        self._last_seen = self._read_version()
+
+    def _read_version(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def publish(self):
+        """Signal every worker watching the file that their copy is stale"""
+        try:
+            with open(self.path, 'a'):
+                os.utime(self.path, None)
+            self._last_seen = self._read_version()
+        except OSError as e:
+            logger.warning(f"Could not publish endpoint registry invalidation to {self.path}: {str(e)}")
+
+    def changed(self):
+        """Return True if another worker published an invalidation since the last check"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        version = self._read_version()
+        if version != self._last_seen:
+            self._last_seen = version
+            return True
+        return False
+
+
+class EndpointRegistry:
+    """
+    In-memory copy of the endpoints table
+
+    Loaded once per worker and refreshed after the TTL, when invalidate() is called by an
+    endpoint write, or when another worker signals a change through the invalidation channel.
+    Lookups are plain dict reads; if a refresh fails the previous copy keeps being served.
+    """
+
+    def __init__(self, ttl=ENDPOINT_REGISTRY_TTL, channel=None):
+        self.ttl = ttl
+        self.channel = channel
+        self._by_path = {}
+        self._by_id = {}
+        self._loaded_at = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load every endpoint from the database, replacing the current copy"""
+        from apis.utils.databaseService import DatabaseService
+
+        conn = DatabaseService.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+            SELECT id, endpoint_path, endpoint_name, cost, description, active
+            FROM endpoints
+            """)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+        by_path = {}
+        by_id = {}
+        for row in rows:
+            endpoint = {
+                "id": str(row[0]),
+                "endpoint_path": row[1],
+                "endpoint_name": row[2],
+                "cost": float(row[3]) if row[3] is not None else 1.0,
+                "description": row[4],
+                "active": bool(row[5])
+            }
+            by_path[endpoint["endpoint_path"]] = endpoint
+            by_id[endpoint["id"].lower()] = endpoint
+
+        # Swap both maps in at once so readers never see a half-built registry
+        self._by_path, self._by_id = by_path, by_id
+        self._loaded_at = time.monotonic()
+        self._stale = False
+        logger.info(f"Endpoint registry loaded with {len(by_id)} endpoints")
+        return len(by_id)
+
+    def _ensure_fresh(self):
+        if self.channel and self.channel.changed():
+            self._stale = True
+
+        expired = self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+        if not (self._stale or expired):
+            return True
+
+        # Only one thread reloads; the others keep reading the current copy
+        if not self._lock.acquire(blocking=self._loaded_at is None):
+            return True
+        try:
+            expired = self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+            if self._stale or expired:
+                self.load()
+            return True
+        except Exception as e:
+            logger.error(f"Error refreshing endpoint registry: {str(e)}")
+            return self._loaded_at is not None
+        finally:
+            self._lock.release()
+
+    def get_by_path(self, endpoint_path):
+        """
+        Get an endpoint by path
+
+        Returns:
+            tuple: (available, endpoint) - available is False if the registry could not be loaded
+        """
+        if not self._ensure_fresh():
+            return False, None
+        return True, self._by_path.get(endpoint_path)
+
+    def get_by_id(self, endpoint_id):
+        """
+        Get an endpoint by id
+
+        Returns:
+            tuple: (available, endpoint) - available is False if the registry could not be loaded
+        """
+        if not self._ensure_fresh():
+            return False, None
+        if endpoint_id is None:
+            return True, None
+        return True, self._by_id.get(str(endpoint_id).lower())
+
+    def invalidate(self, publish=True):
+        """Mark the registry stale so the next lookup reloads it
+
+        Args:
+            publish (bool): Also signal other workers through the invalidation channel
+        """
+        self._stale = True
+        if publish and self.channel:
+            self.channel.publish()
+        logger.info("Endpoint registry invalidated")
+
+
+# SHARED REGISTRY FOR THIS WORKER
+endpoint_registry = EndpointRegistry(
+    channel=FileInvalidationChannel(ENDPOINT_REGISTRY_SYNC_FILE) if ENDPOINT_REGISTRY_SYNC_FILE else None
+)
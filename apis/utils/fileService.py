@@ -192,6 +192,86 @@ class FileService:
                 except:
                     pass
     
+    @staticmethod
+    def get_file_urls(file_ids, user_id=None):
+        """
+        Get access URLs for several previously uploaded files with a single query
+
+        Args:
+            file_ids (list): IDs of the files to retrieve
+            user_id (str, optional): ID of the user requesting the files
+
+        Returns:
+            tuple: (files, errors)
+                files maps file_id to the same file_info dict as get_file_url
+                errors maps file_id to an error message for files that cannot be used
+        """
+        files = {}
+        errors = {}
+        file_ids = list(dict.fromkeys(str(file_id) for file_id in file_ids or []))
+        if not file_ids:
+            return files, errors
+
+        db_conn = None
+        cursor = None
+
+        try:
+            db_conn = DatabaseService.get_connection()
+            cursor = db_conn.cursor()
+
+            placeholders = ", ".join("?" for _ in file_ids)
+            query = f"""
+            SELECT id, user_id, original_filename, blob_url, content_type, upload_date
+            FROM file_uploads
+            WHERE id IN ({placeholders})
+            """
+
+            cursor.execute(query, file_ids)
+            rows = {str(row[0]).lower(): row for row in cursor.fetchall()}
+
+            user_scope = 0
+            if user_id:
+                cursor.execute("SELECT scope FROM users WHERE id = ?", [user_id])
+                user_scope_result = cursor.fetchone()
+                user_scope = user_scope_result[0] if user_scope_result else 1  # Default to regular user if not found
+
+            for file_id in file_ids:
+                file_info = rows.get(file_id.lower())
+                if not file_info:
+                    errors[file_id] = f"File with ID {file_id} not found"
+                    continue
+
+                # Admins (scope=0) can access any file, everyone else only their own
+                if user_id and user_scope != 0 and str(file_info[1]) != user_id:
+                    errors[file_id] = "You don't have permission to access this file"
+                    continue
+
+                files[file_id] = {
+                    "file_name": file_info[2],
+                    "file_url": file_info[3],
+                    "content_type": file_info[4],
+                    "upload_date": file_info[5].isoformat() if file_info[5] else None
+                }
+
+            return files, errors
+
+        except Exception as e:
+            logger.error(f"Error retrieving file URLs: {str(e)}")
+            return {}, {file_id: str(e) for file_id in file_ids}
+
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except:
+                    pass
+
+            if db_conn:
+                try:
+                    db_conn.close()
+                except:
+                    pass
+
     @staticmethod
     def delete_file(file_id, user_id=None, container_name=FILE_UPLOAD_CONTAINER):
         """
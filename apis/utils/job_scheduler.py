@@ -90,6 +90,24 @@ def process_pending_jobs():
                 thread.daemon = True
                 thread.start()
                 logger.info(f"Started processing thread for TTS job {job['job_id']}")
+        
+        # Get pending LLM batch jobs
+        llm_batch_jobs, error = JobService.get_pending_jobs('llm_batch', limit=2)
+        if error:
+            logger.error(f"Error getting pending LLM batch jobs: {error}")
+        
+        if llm_batch_jobs and len(llm_batch_jobs) > 0:
+            logger.info(f"Found {len(llm_batch_jobs)} pending LLM batch jobs")
+            
+            for job in llm_batch_jobs:
+                # Process each job in a separate thread - the job fans its prompts out itself
+                thread = threading.Thread(
+                    target=JobProcessor.process_llm_batch_job,
+                    args=(job['job_id'], job['user_id'], job['parameters'])
+                )
+                thread.daemon = True
+                thread.start()
+                logger.info(f"Started processing thread for LLM batch job {job['job_id']}")
                 
         # Process generic jobs for other endpoints - extensible for future needs
         generic_jobs, error = JobService.get_pending_jobs(limit=5)
@@ -98,7 +116,7 @@ def process_pending_jobs():
             
         if generic_jobs and len(generic_jobs) > 0:
             # Only look at jobs that aren't already covered by the specific handlers
-            other_jobs = [job for job in generic_jobs if job['job_type'] not in ['stt', 'stt_diarize', 'tts']]
+            other_jobs = [job for job in generic_jobs if job['job_type'] not in ['stt', 'stt_diarize', 'tts', 'llm_batch']]
             
             if other_jobs:
                 logger.info(f"Found {len(other_jobs)} pending jobs of other types")
@@ -0,0 +1,617 @@
+import os
+import base64
+import logging
+import threading
+from contextlib import contextmanager
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from openai import AzureOpenAI
+from azure.ai.inference import ChatCompletionsClient
+from azure.ai.inference.models import SystemMessage, UserMessage
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
+from apis.utils.attachmentFetcher import attachment_fetcher
+from apis.utils.attachmentCache import attachment_cache
+from apis.utils.deploymentRouter import DeploymentRouter
+from apis.utils.llmStreaming import openai_stream_options
+from apis.utils.llmResponseCache import llm_response_cache, get_request_cache_control, record_cache_outcome
+from apis.utils.llmSemanticCache import llm_semantic_cache
+from apis.utils.tokenBudget import TokenBudget, get_context_limit, register_context_limit
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# CLIENT POOL CONFIGURATION
+# Keep-alive connections kept per endpoint - size for the worker's concurrent LLM calls (gunicorn threads)
+LLM_POOL_MAXSIZE = int(os.environ.get("LLM_POOL_MAXSIZE", 32))
+# Idle keep-alive connections are closed after this many seconds (Azure OpenAI clients)
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", 60))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 10))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", 300))
+
+# PROVIDERS
+AZURE_OPENAI = "azure_openai"
+AZURE_INFERENCE = "azure_inference"
+
+OPENAI_API_VERSION = "2024-02-01"
+INFERENCE_API_VERSION = "2024-05-01-preview"
+
+# Multimodal models only accept these image formats
+ALLOWED_IMAGE_EXTENSIONS = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg'
+}
+
+# Longest system prompt kept when a small-context model's prompts are trimmed
+SYSTEM_PROMPT_MAX_TOKENS = 2000
+
+
+class ModelDeployment:
+    """One region's deployment of a model - the client is created once and shared by the worker"""
+
+    def __init__(self, region, endpoint, api_key, provider=AZURE_OPENAI, api_version=None, model=None):
+        self.region = region
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.provider = provider
+        self.api_version = api_version or (OPENAI_API_VERSION if provider == AZURE_OPENAI else INFERENCE_API_VERSION)
+        # Deployment name sent to the endpoint when it differs from the model name (e.g. "-2" replicas)
+        self.model = model
+
+    @property
+    def is_configured(self):
+        return bool(self.endpoint and self.api_key)
+
+    @property
+    def client(self):
+        return client_pool.get_client(self.provider, self.endpoint, self.api_key, self.api_version)
+
+
+class ModelSpec:
+    """
+    How to call one model: its deployments, message shape, parameters and limits
+
+    Args:
+        name (str): Model name sent to the deployments and reported to callers
+        label (str): Human-readable name used in log messages
+        deployments (list): ModelDeployment per region, in preference order
+        router (str): Models with the same router name share one DeploymentRouter (and its
+            region health); defaults to the model name
+        system_role (str): "system", "developer" or None to fold the system prompt into the user message
+        content_parts (bool): Send text as [{"type": "text", ...}] content parts
+        multimodal (bool): Accepts file_ids and sends images as image_url parts
+        max_context_tokens (int): Input limit checked before calling the model when model_metadata
+            has no maxContextTokens for it
+        image_tokens (int): Flat tokens per image; None costs each image by its resolution (512px tiles)
+        max_output_tokens (int): Clamp for the caller's max_tokens
+        truncate_input (bool): Also trim the prompts so max_tokens of output still fits the context window
+        text_response_format (dict): response_format sent when JSON output is not requested
+        fixed_params (dict): Parameters sent on every call
+        detailed_errors (bool): Report "All <label> model endpoints are unavailable" when every region fails
+        aliases (tuple): Other names API callers use for the model (conversation and RAG model keys)
+        streaming (bool): The deployments can relay the completion as a stream
+    """
+
+    def __init__(self, name, label, deployments, router=None, system_role="system", content_parts=False,
+                 multimodal=False, max_context_tokens=None, image_tokens=None,
+                 max_output_tokens=None, truncate_input=False, text_response_format=None,
+                 fixed_params=None, detailed_errors=False, aliases=(), streaming=True):
+        self.name = name
+        self.label = label
+        self.deployments = deployments
+        self.router = router or name
+        self.provider = deployments[0].provider
+        self.system_role = system_role
+        self.content_parts = content_parts
+        self.multimodal = multimodal
+        self.max_context_tokens = max_context_tokens
+        self.image_tokens = image_tokens
+        self.max_output_tokens = max_output_tokens
+        self.truncate_input = truncate_input
+        self.text_response_format = text_response_format
+        self.fixed_params = fixed_params or {}
+        self.detailed_errors = detailed_errors
+        self.aliases = tuple(aliases)
+        self.streaming = streaming
+
+    @property
+    def names(self):
+        return (self.name, self.label) + self.aliases
+
+    @property
+    def context_limit(self):
+        """model_metadata.maxContextTokens, else max_context_tokens"""
+        return get_context_limit(*self.names, default=self.max_context_tokens)
+
+
+class LLMClientPool:
+    """
+    Long-lived SDK clients and HTTP connection pools shared by every request in the worker
+
+    Clients are keyed by (provider, endpoint, api_key, api_version), so models deployed on the
+    same endpoint reuse one client instead of building a new client (and TCP/TLS connection)
+    per call. Azure AI Inference clients on the same endpoint also share one keep-alive
+    requests.Session whose pool is sized for the worker's concurrency; Azure OpenAI clients get
+    an httpx client with the same limits. Everything is rebuilt after a fork, since
+    connections must not be shared between worker processes.
+    """
+
+    def __init__(self, pool_maxsize=LLM_POOL_MAXSIZE, keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT):
+        self.pool_maxsize = pool_maxsize
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.clients = {}
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def get_client(self, provider, endpoint, api_key, api_version):
+        key = (provider, endpoint, api_key, api_version)
+        client = self.clients.get(key) if self._pid == os.getpid() else None
+        if client is not None:
+            return client
+
+        with self.lock:
+            if self._pid != os.getpid():
+                # Forked worker - open connections belong to the parent
+                self.clients = {}
+                self.sessions = {}
+                self._pid = os.getpid()
+            client = self.clients.get(key)
+            if client is None:
+                client = self._create_client(provider, endpoint, api_key, api_version)
+                self.clients[key] = client
+                logger.info(f"Created {provider} client for {endpoint} (api_version {api_version})")
+            return client
+
+    def _get_session(self, endpoint):
+        """Keep-alive session for an endpoint (caller holds the lock)"""
+        session = self.sessions.get(endpoint)
+        if session is None:
+            session = requests.Session()
+            # Retries stay with the SDK's retry policy and the deployment router
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=self.pool_maxsize,
+                max_retries=Retry(total=False, redirect=False, raise_on_status=False)
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self.sessions[endpoint] = session
+        return session
+
+    def _create_client(self, provider, endpoint, api_key, api_version):
+        if provider == AZURE_OPENAI:
+            return AzureOpenAI(
+                azure_endpoint=endpoint,
+                api_key=api_key,
+                max_retries=0,
+                api_version=api_version,
+                http_client=httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=None,
+                        max_keepalive_connections=self.pool_maxsize,
+                        keepalive_expiry=self.keepalive_expiry
+                    ),
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+                )
+            )
+        return ChatCompletionsClient(
+            endpoint=endpoint,
+            credential=AzureKeyCredential(api_key),
+            api_version=api_version,
+            transport=RequestsTransport(
+                session=self._get_session(endpoint),
+                session_owner=False,
+                connection_timeout=self.connect_timeout,
+                read_timeout=self.read_timeout
+            )
+        )
+
+    def get_stats(self):
+        """Return the number of pooled clients and sessions"""
+        return {"clients": len(self.clients), "sessions": len(self.sessions), "pool_maxsize": self.pool_maxsize}
+
+
+class LLMEngine:
+    """
+    Runs a chat completion for any registered model
+
+    Each call goes through the same steps: multimodal preprocessing of file_ids, a context
+    window check, message building for the model's provider, routing to the best healthy
+    deployment with failover, and a uniform service response.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.routers = {}
+        self.lock = threading.Lock()
+        # Per-thread call settings (the RegionLimiter of a batch job)
+        self.local = threading.local()
+
+    def register(self, spec):
+        """Add a model to the registry (replacing any model with the same name)"""
+        self.models[spec.name] = spec
+        register_context_limit(spec.names, spec.max_context_tokens)
+        return spec
+
+    def get_model(self, name):
+        """Get a registered ModelSpec by model name or alias (None if unknown)"""
+        spec = self.models.get(name)
+        if spec is None:
+            spec = next((spec for spec in self.models.values() if name in spec.aliases), None)
+        return spec
+
+    @contextmanager
+    def limit_regions(self, limiter):
+        """Send the calls this thread makes inside the block through a RegionLimiter"""
+        previous = getattr(self.local, "limiter", None)
+        self.local.limiter = limiter
+        try:
+            yield
+        finally:
+            self.local.limiter = previous
+
+    def get_router(self, spec):
+        """Get the DeploymentRouter for a model, built from its configured deployments on first use"""
+        router = self.routers.get(spec.router)
+        if router is not None:
+            return router
+
+        with self.lock:
+            router = self.routers.get(spec.router)
+            if router is None:
+                regions = []
+                for deployment in spec.deployments:
+                    if not deployment.is_configured:
+                        logger.warning(f"Skipping {spec.label} {deployment.region} deployment - missing endpoint or API key")
+                        continue
+                    regions.append((deployment.region, deployment))
+                router = DeploymentRouter(spec.router, regions)
+                self.routers[spec.router] = router
+            return router
+
+    def complete(self, model, system_prompt, user_input, params=None, json_output=False,
+                 file_ids=None, user_id=None, stream=False):
+        """
+        Run a chat completion against a registered model
+
+        Args:
+            model (str): Registered model name
+            system_prompt (str): System instructions
+            user_input (str): User message text
+            params (dict): Model parameters (temperature, max_tokens, top_p, ...) - None values are omitted
+            json_output (bool): Request a JSON object response
+            file_ids (list): File ids to attach as images (multimodal models only)
+            user_id (str): Owner of the files
+            stream (bool): Return the response stream instead of the completed result
+
+        Returns:
+            dict: {"success": True, "result", "model", "client_used", token counts[, file stats]}
+                  or {"success": False, "error"}. When streaming, "stream" replaces "result"
+                  and the token counts.
+        """
+        spec = self.models.get(model)
+        if spec is None:
+            return {
+                "success": False,
+                "error": f"Unknown model: {model}"
+            }
+        if stream and not spec.streaming:
+            return {
+                "success": False,
+                "error": f"400: {spec.label} does not support streaming"
+            }
+
+        file_stats = None
+
+        try:
+            params = {key: value for key, value in (params or {}).items() if value is not None}
+            if spec.max_output_tokens and params.get("max_tokens", 0) > spec.max_output_tokens:
+                params["max_tokens"] = spec.max_output_tokens
+                logger.info(f"Reduced max_tokens to {spec.max_output_tokens} for {spec.label} model constraints")
+
+            message_content = None
+            if spec.multimodal:
+                message_content, file_stats = build_multimodal_content(
+                    user_input, file_ids, user_id, include_empty_text=(spec.provider == AZURE_OPENAI)
+                )
+
+            images = file_stats["images_processed"] if file_stats else 0
+            context_limit = spec.context_limit
+            if context_limit:
+                estimated_tokens = count_prompt_tokens(spec, system_prompt, user_input, message_content)
+                if estimated_tokens > context_limit:
+                    return {
+                        "success": False,
+                        "error": f"Request exceeds {spec.label} context window limit. Estimated {estimated_tokens} tokens, but maximum is {context_limit}. Please reduce the number of images or shorten your text prompt."
+                    }
+                if spec.truncate_input:
+                    # Leave room for the response within a small context window
+                    system_prompt, user_input = truncate_to_context(spec, context_limit, system_prompt, user_input, params, message_content)
+
+            # Identical deterministic requests are answered from the response cache, near-duplicate
+            # text-only prompts on /llm and /nlp from the semantic cache
+            cache_key = None
+            semantic_key = None
+            semantic_vector = None
+            use_semantic = not stream and not file_ids and llm_semantic_cache.applies_to_request()
+            if llm_response_cache.enabled or use_semantic:
+                cache_control = get_request_cache_control()
+                cached = None
+                if not stream and llm_response_cache.is_cacheable(params, cache_control):
+                    cache_key = llm_response_cache.make_key(spec.name, system_prompt, user_input, params, json_output, message_content)
+                    cached = llm_response_cache.lookup(cache_key, cache_control)
+                if cached is None and use_semantic and "no-store" not in cache_control:
+                    semantic_key = llm_semantic_cache.bucket_key(spec.name, system_prompt, params, json_output)
+                    cached, semantic_vector = llm_semantic_cache.lookup(semantic_key, user_input, cache_control)
+                record_cache_outcome(cached is not None)
+                if cached is not None:
+                    logger.info(f"{spec.label} request answered from the {'semantic' if 'cache_similarity' in cached else 'response'} cache")
+                    return cached
+
+            messages = build_messages(spec, system_prompt, user_input, message_content, images)
+            request_fn = self._request_fn(spec, messages, params, json_output, stream)
+
+            router = self.get_router(spec)
+            logger.info(f"Attempting {spec.label} request")
+            response, client_used = router.call(request_fn, limiter=getattr(self.local, "limiter", None))
+
+            if stream:
+                return streamed_service_response(response, spec.name, client_used, file_stats)
+
+            logger.info(f"{spec.label} request successful using {client_used} client")
+            service_response = build_service_response(spec, response, client_used, file_stats)
+            if cache_key:
+                llm_response_cache.store(cache_key, service_response)
+            if semantic_key:
+                llm_semantic_cache.store(semantic_key, semantic_vector, service_response)
+            return service_response
+
+        except Exception as e:
+            logger.error(f"{spec.label} API error: {str(e)}")
+            error = str(e)
+            if spec.detailed_errors:
+                error = f"All {spec.label} model endpoints are unavailable. Last error: {error}"
+            return {
+                "success": False,
+                "error": error
+            }
+
+    def _request_fn(self, spec, messages, params, json_output, stream):
+        response_format = {"type": "json_object"} if json_output else spec.text_response_format
+
+        if spec.provider == AZURE_OPENAI:
+            def request_fn(deployment):
+                payload = {**spec.fixed_params, **params}
+                if response_format is not None:
+                    payload["response_format"] = response_format
+                return deployment.client.chat.completions.create(
+                    model=deployment.model or spec.name,
+                    messages=messages,
+                    **payload,
+                    **openai_stream_options(stream)
+                )
+            return request_fn
+
+        def request_fn(deployment):
+            payload = {**spec.fixed_params, **params}
+            if response_format is not None:
+                payload["response_format"] = response_format
+            return deployment.client.complete(
+                stream=stream,
+                messages=messages,
+                model=deployment.model or spec.name,
+                **payload
+            )
+        return request_fn
+
+    def get_stats(self):
+        """Return region health per router and response, semantic and attachment cache statistics"""
+        return {
+            "routers": {name: router.get_stats() for name, router in self.routers.items()},
+            "response_cache": llm_response_cache.get_stats(),
+            "semantic_cache": llm_semantic_cache.get_stats(),
+            "attachment_cache": attachment_cache.get_stats()
+        }
+
+
+def build_multimodal_content(user_input, file_ids, user_id, include_empty_text=True):
+    """
+    Build the user message content parts for a multimodal request
+
+    Supported images are downloaded in parallel and inlined as base64 data URLs straight from
+    memory (or taken ready-encoded from the attachment cache); files that cannot be fetched or
+    are not images are reported to the model as text notes.
+
+    Returns:
+        tuple: (message_content, file_stats)
+    """
+    message_content = []
+    file_stats = {
+        "images_processed": 0
+    }
+
+    # First add the user's input text
+    if user_input or include_empty_text:
+        message_content.append({
+            "type": "text",
+            "text": user_input
+        })
+
+    if not file_ids or not isinstance(file_ids, list):
+        return message_content, file_stats
+
+    unsupported_files = []
+
+    fetched_files = attachment_fetcher.fetch(
+        file_ids, user_id, accept=is_image_file_for_multimodal, kind="data_url", encode=image_data_url
+    )
+    for fetched in fetched_files:
+        if not fetched["found"]:
+            logger.error(f"Error retrieving file {fetched['file_id']}: {fetched['error']}")
+            continue
+
+        if not fetched["accepted"]:
+            unsupported_files.append(fetched["file_name"])
+            logger.warning(f"Unsupported file format: {fetched['file_name']} ({fetched['content_type']})")
+            continue
+
+        if fetched["error"]:
+            message_content.append({
+                "type": "text",
+                "text": f"\n\n{fetched['error']}"
+            })
+            continue
+
+        file_stats["images_processed"] += 1
+        message_content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": fetched["value"]
+            }
+        })
+
+    # Add information about unsupported files
+    if unsupported_files:
+        message_content.append({
+            "type": "text",
+            "text": f"\n\nNote: The following files were not processed as they are not supported image formats (only PNG, JPG, JPEG are supported): {', '.join(unsupported_files)}"
+        })
+
+    return message_content, file_stats
+
+def image_data_url(data, content_type):
+    """Inline image bytes as a base64 data URL"""
+    return f"data:{content_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+def count_prompt_tokens(spec, system_prompt, user_input, message_content=None):
+    """Count prompt tokens with the model's tokenizer - text parts one by one, images by resolution"""
+    budget = TokenBudget(spec.name, limit=spec.context_limit)
+    budget.add(system_prompt, message=True)
+    if message_content is None:
+        budget.add(user_input, message=True)
+        return budget.used
+
+    budget.add(tokens=0, message=True)
+    for part in message_content:
+        if part["type"] == "image_url":
+            budget.add_image(part["image_url"]["url"], spec.image_tokens)
+        else:
+            budget.add(part.get("text"))
+    return budget.used
+
+def truncate_to_context(spec, context_limit, system_prompt, user_input, params, message_content=None):
+    """
+    Trim the prompts of a small-context model so they fit its context window
+
+    The images are counted first, the system prompt is capped at SYSTEM_PROMPT_MAX_TOKENS and
+    the user input gets exactly what is left after max_tokens of output.
+
+    Returns:
+        tuple: (system_prompt, user_input)
+    """
+    budget = TokenBudget(spec.name, limit=context_limit, reserve=params.get("max_tokens", 0))
+    for part in message_content or []:
+        if part["type"] == "image_url":
+            budget.add_image(part["image_url"]["url"], spec.image_tokens)
+
+    trimmed_system_prompt = budget.fit(system_prompt, marker="...", max_tokens=SYSTEM_PROMPT_MAX_TOKENS, message=True)
+    if trimmed_system_prompt != system_prompt:
+        logger.info("Truncated system prompt to fit within token limits")
+
+    trimmed_user_input = budget.fit(user_input, marker="... [truncated to fit model limits]", message=True)
+    if trimmed_user_input != user_input:
+        # Keep the text part of the multimodal content in step
+        if message_content and message_content[0]["type"] == "text":
+            message_content[0]["text"] = trimmed_user_input
+        logger.info("Truncated user input to fit within token limits")
+
+    return trimmed_system_prompt, trimmed_user_input
+
+def build_messages(spec, system_prompt, user_input, message_content=None, images=0):
+    """Build the provider-specific message list for a model"""
+    if spec.provider == AZURE_INFERENCE:
+        messages = []
+        if system_prompt:
+            messages.append(SystemMessage(content=system_prompt))
+        # Multimodal content only when an image made it in - otherwise plain text
+        if message_content is not None and images > 0:
+            messages.append(UserMessage(content=message_content))
+        else:
+            messages.append(UserMessage(content=user_input))
+        return messages
+
+    def content(text):
+        return [{"type": "text", "text": text}] if spec.content_parts else text
+
+    if spec.system_role is None:
+        # Model has no system role, so include the system prompt in the user message
+        return [{"role": "user", "content": content(f"{system_prompt}\n\nProvided text: {user_input}")}]
+
+    user_content = message_content if message_content is not None else content(user_input)
+    return [
+        {"role": spec.system_role, "content": content(system_prompt)},
+        {"role": "user", "content": user_content}
+    ]
+
+def build_service_response(spec, response, client_used, file_stats=None):
+    """Build the service result dict from a completed response"""
+    usage = response.usage
+    prompt_tokens = usage.prompt_tokens
+    completion_tokens = usage.completion_tokens
+    total_tokens = getattr(usage, 'total_tokens', None) or prompt_tokens + completion_tokens
+
+    result = {
+        "success": True,
+        "result": response.choices[0].message.content,
+        "model": spec.name,
+        "client_used": client_used,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": total_tokens,
+        "cached_tokens": usage.cached_tokens if hasattr(usage, 'cached_tokens') else 0
+    }
+    if file_stats is not None:
+        result["files_processed"] = file_stats["images_processed"]
+        result["file_processing_details"] = file_stats
+    return result
+
+def streamed_service_response(stream, model, client_used, file_stats=None):
+    """Service result for a streamed call - the route relays the chunks and builds the final response"""
+    result = {
+        "success": True,
+        "stream": stream,
+        "model": model,
+        "client_used": client_used
+    }
+    if file_stats is not None:
+        result["files_processed"] = file_stats.get("images_processed", 0)
+        result["file_processing_details"] = file_stats
+    return result
+
+def is_image_file_for_multimodal(filename, content_type):
+    """Check if the file is a supported image for multimodal models"""
+    # Check by filename extension
+    if '.' in filename:
+        ext = filename.rsplit('.', 1)[1].lower()
+        if ext in ALLOWED_IMAGE_EXTENSIONS:
+            return True
+
+    # Check by content type
+    if content_type and content_type.startswith('image/'):
+        # Extract format from MIME type
+        if content_type in ALLOWED_IMAGE_EXTENSIONS.values():
+            return True
+
+    return False
+
+
+# SHARED CLIENTS AND ENGINE FOR THIS WORKER
+client_pool = LLMClientPool()
+llm_engine = LLMEngine()
@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from flask import request, g, has_request_context
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# RESPONSE CACHE CONFIGURATION
+# Backend for exact-match LLM responses: none (disabled), memory, sqlite or redis
+LLM_CACHE_BACKEND = os.environ.get("LLM_CACHE_BACKEND", "none").lower()
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_SECONDS", 3600))
+# Only requests at or below this temperature are cached unless the caller opts in with Cache-Control: max-age
+LLM_CACHE_MAX_TEMPERATURE = float(os.environ.get("LLM_CACHE_MAX_TEMPERATURE", 0.1))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 10000))
+# Size cap for the in-process backend (serialised responses)
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+LLM_CACHE_SQLITE_PATH = os.environ.get("LLM_CACHE_SQLITE_PATH", "/tmp/llm_response_cache.sqlite3")
+LLM_CACHE_REDIS_URL = os.environ.get("LLM_CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Charge the endpoint cost for requests answered entirely from the cache
+LLM_CACHE_CHARGE_HITS = os.environ.get("LLM_CACHE_CHARGE_HITS", "false").lower() == "true"
+
+HIT = "HIT"
+MISS = "MISS"
+
+
+class MemoryCacheBackend:
+    """In-process LRU capped by entry count and total size"""
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value, stored_at
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (value, now, now + ttl)
+            self.size += len(value)
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class SQLiteCacheBackend:
+    """On-disk cache shared by the workers on one host"""
+
+    def __init__(self, path=LLM_CACHE_SQLITE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.writes = 0
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_response_cache_expires ON llm_response_cache (expires_at)")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or getattr(self.local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value, stored_at FROM llm_response_cache WHERE cache_key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_response_cache (cache_key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, value, now, now + ttl)
+        )
+        self.writes += 1
+        # Prune now and then rather than on every write
+        if self.writes % 100 == 0:
+            conn.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (now,))
+            conn.execute("""
+                DELETE FROM llm_response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_response_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM llm_response_cache")
+        conn.commit()
+
+
+class RedisCacheBackend:
+    """Cache shared by every host through Redis (or a Redis-compatible local server)"""
+
+    def __init__(self, url=LLM_CACHE_REDIS_URL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = "llm-response:"
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        entry = json.loads(value)
+        return entry["value"], entry["stored_at"]
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.prefix + key, int(ttl), json.dumps({"value": value, "stored_at": time.time()}))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+class LLMResponseCache:
+    """
+    Exact-match cache for completed LLM service responses
+
+    Responses are keyed by a hash of (model, system prompt, user input, parameters, JSON mode,
+    attached file content). Only deterministic requests (an explicit temperature up to
+    LLM_CACHE_MAX_TEMPERATURE) are cached unless the caller opts in with Cache-Control: max-age.
+    Request Cache-Control directives are honoured:
+        no-store    neither read nor write the cache
+        no-cache    skip the lookup but store the fresh response
+        max-age=N   only accept a cached response stored within the last N seconds
+    Cache failures never fail the request - they are logged and treated as a miss.
+    """
+
+    def __init__(self, backend_name=LLM_CACHE_BACKEND, ttl=LLM_CACHE_TTL_SECONDS, max_temperature=LLM_CACHE_MAX_TEMPERATURE):
+        self.backend_name = backend_name
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.backend = None
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    @property
+    def enabled(self):
+        return self.backend_name not in ("", "none", "off", "false")
+
+    def get_backend(self):
+        if self.backend is None and self.enabled:
+            with self.lock:
+                if self.backend is None:
+                    self.backend = self._create_backend()
+        return self.backend
+
+    def _create_backend(self):
+        try:
+            if self.backend_name == "memory":
+                return MemoryCacheBackend()
+            if self.backend_name == "sqlite":
+                return SQLiteCacheBackend()
+            if self.backend_name == "redis":
+                return RedisCacheBackend()
+        except ImportError:
+            logger.error("LLM response cache backend 'redis' needs the redis package - response caching disabled")
+        except Exception as e:
+            logger.error(f"Could not start LLM response cache backend '{self.backend_name}': {str(e)} - response caching disabled")
+        else:
+            logger.error(f"Unknown LLM response cache backend '{self.backend_name}' - response caching disabled")
+        self.backend_name = "none"
+        return None
+
+    def is_cacheable(self, params, cache_control):
+        """Check whether a request may use the cache"""
+        if not self.enabled or "no-store" in cache_control:
+            return False
+        if "max-age" in cache_control:
+            return True
+        # Models called without a temperature (o1-mini, o3-mini) sample at their default
+        temperature = (params or {}).get("temperature")
+        return temperature is not None and temperature <= self.max_temperature
+
+    def make_key(self, model, system_prompt, user_input, params, json_output, message_content=None):
+        """Hash everything that determines the response - attached images by their content hash"""
+        file_hashes = []
+        for part in message_content or []:
+            if part.get("type") == "image_url":
+                file_hashes.append(hashlib.sha256(part["image_url"]["url"].encode("utf-8")).hexdigest())
+
+        material = json.dumps({
+            "model": model,
+            "system_prompt": system_prompt,
+            "user_input": user_input,
+            "params": params,
+            "json_output": bool(json_output),
+            "files": file_hashes
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def lookup(self, key, cache_control):
+        """
+        Get a cached service response
+
+        Returns:
+            dict: The cached response with cached=True and zero usage, or None
+        """
+        if "no-cache" in cache_control:
+            return None
+        try:
+            backend = self.get_backend()
+            entry = backend.get(key) if backend else None
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"LLM response cache lookup failed: {str(e)}")
+            return None
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        value, stored_at = entry
+        age = max(0.0, time.time() - stored_at)
+        if "max-age" in cache_control and age > cache_control["max-age"]:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        cached = json.loads(value)
+        cached.update({
+            "cached": True,
+            "cache_age_seconds": int(age),
+            "client_used": "cache",
+            # Nothing was sent to the model for this response
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "cached_tokens": 0
+        })
+        return cached
+
+    def store(self, key, service_response):
+        """Cache a successful service response"""
+        if not service_response.get("success"):
+            return
+        try:
+            backend = self.get_backend()
+            if backend:
+                backend.set(key, json.dumps(service_response, default=str), self.ttl)
+                self.stats["stores"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"LLM response cache store failed: {str(e)}")
+
+    def get_stats(self):
+        return {"backend": self.backend_name, **self.stats}
+
+
+def parse_cache_control(header):
+    """Parse a Cache-Control header into {directive: value} (value is None or an int)"""
+    directives = {}
+    for part in (header or "").split(","):
+        name, _, value = part.strip().partition("=")
+        name = name.strip().lower()
+        if not name:
+            continue
+        if value:
+            try:
+                directives[name] = int(value.strip().strip('"'))
+            except ValueError:
+                continue
+        else:
+            directives[name] = None
+    return directives
+
+def get_request_cache_control():
+    """Cache-Control directives sent with the current request (empty outside a request)"""
+    if not has_request_context():
+        return {}
+    return parse_cache_control(request.headers.get("Cache-Control"))
+
+def record_cache_outcome(hit):
+    """
+    Note whether an LLM call in this request was answered from the cache
+
+    g.llm_cache_status is HIT only while every LLM call of the request was a hit, so
+    check_balance knows whether the request cost anything.
+    """
+    if not has_request_context():
+        return
+    if not hit:
+        g.llm_cache_status = MISS
+    elif getattr(g, 'llm_cache_status', None) is None:
+        g.llm_cache_status = HIT
+
+def is_request_served_from_cache():
+    """Check whether every LLM call of the current request was answered from the cache"""
+    return has_request_context() and getattr(g, 'llm_cache_status', None) == HIT
+
+
+# SHARED RESPONSE CACHE FOR THIS WORKER
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import faiss
+import numpy as np
+from flask import request, g, has_request_context
+from langchain_openai import AzureOpenAIEmbeddings
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# SEMANTIC CACHE CONFIGURATION
+LLM_SEMANTIC_CACHE_ENABLED = os.environ.get("LLM_SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+# Cosine similarity at or above which a stored answer is reused
+LLM_SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("LLM_SEMANTIC_CACHE_THRESHOLD", 0.95))
+LLM_SEMANTIC_CACHE_TTL_SECONDS = int(os.environ.get("LLM_SEMANTIC_CACHE_TTL_SECONDS", 3600))
+# Prompts kept per (tenant, model, system prompt, parameters) bucket, and buckets kept per worker
+LLM_SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_SEMANTIC_CACHE_MAX_ENTRIES", 1000))
+LLM_SEMANTIC_CACHE_MAX_BUCKETS = int(os.environ.get("LLM_SEMANTIC_CACHE_MAX_BUCKETS", 500))
+# Request paths whose LLM calls may be answered semantically
+LLM_SEMANTIC_CACHE_PATHS = [path.strip() for path in os.environ.get("LLM_SEMANTIC_CACHE_PATHS", "/llm/,/nlp/").split(",") if path.strip()]
+# Same embeddings deployment as apis/rag
+EMBEDDING_DEPLOYMENT = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-large")
+
+
+def normalise_prompt(text):
+    """Lower-case and collapse whitespace so trivially different prompts embed the same"""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+class SemanticCacheBucket:
+    """Recent prompts of one bucket in a FAISS inner-product index over unit vectors (cosine similarity)"""
+
+    def __init__(self, dimension):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        # id -> (stored_at, serialised service response); insertion order is age order
+        self.entries = OrderedDict()
+        self.next_id = 0
+
+    def evict(self, now, ttl, max_entries):
+        """Drop entries older than ttl and the oldest entries beyond max_entries"""
+        expired = []
+        for entry_id, (stored_at, _) in self.entries.items():
+            if now - stored_at < ttl and len(self.entries) - len(expired) <= max_entries:
+                break
+            expired.append(entry_id)
+        if expired:
+            self.index.remove_ids(np.array(expired, dtype=np.int64))
+            for entry_id in expired:
+                del self.entries[entry_id]
+        return len(expired)
+
+    def search(self, vector):
+        if not self.entries:
+            return None, 0.0
+        scores, ids = self.index.search(vector, 1)
+        if ids[0][0] < 0:
+            return None, 0.0
+        return int(ids[0][0]), float(scores[0][0])
+
+    def add(self, vector, value, now):
+        entry_id = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+        self.entries[entry_id] = (now, value)
+
+
+class LLMSemanticCache:
+    """
+    Reuses answers to near-duplicate prompts
+
+    Prompts are normalised, embedded with the RAG embeddings deployment and searched in a
+    FAISS index per bucket. A bucket is one tenant (user), model, system prompt and parameter
+    set, so answers never cross users or instructions. A stored answer is returned when the
+    cosine similarity reaches the threshold. Entries expire by age, buckets are capped in size
+    and the least recently used buckets are dropped.
+    """
+
+    def __init__(self, enabled=LLM_SEMANTIC_CACHE_ENABLED, threshold=LLM_SEMANTIC_CACHE_THRESHOLD,
+                 ttl=LLM_SEMANTIC_CACHE_TTL_SECONDS, max_entries=LLM_SEMANTIC_CACHE_MAX_ENTRIES,
+                 max_buckets=LLM_SEMANTIC_CACHE_MAX_BUCKETS, paths=LLM_SEMANTIC_CACHE_PATHS, embed_fn=None):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_buckets = max_buckets
+        self.paths = paths
+        self.embed_fn = embed_fn
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+    def _embed(self, text):
+        if self.embed_fn is None:
+            with self.lock:
+                if self.embed_fn is None:
+                    embeddings = AzureOpenAIEmbeddings(
+                        azure_deployment=EMBEDDING_DEPLOYMENT,
+                        api_key=os.environ.get("OPENAI_API_KEY"),
+                        azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT")
+                    )
+                    self.embed_fn = embeddings.embed_query
+        vector = np.array([self.embed_fn(text)], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def applies_to_request(self):
+        """Check whether the current request's path uses the semantic cache"""
+        if not self.enabled:
+            return False
+        if not has_request_context():
+            return False
+        return any(request.path.startswith(path) for path in self.paths)
+
+    def bucket_key(self, model, system_prompt, params, json_output):
+        """Tenant, model, system prompt and parameters - only prompts sharing all of them are comparable"""
+        tenant = str(getattr(g, 'user_id', None) or "anonymous")
+        material = json.dumps({
+            "model": model,
+            "system_prompt": system_prompt,
+            "params": params,
+            "json_output": bool(json_output)
+        }, sort_keys=True, default=str)
+        return f"{tenant}:{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+    def lookup(self, bucket_key, user_input, cache_control=None):
+        """
+        Find a stored answer for a near-duplicate prompt
+
+        Cache-Control is honoured as by the exact-match cache: no-cache skips the search (the
+        fresh answer is still stored) and max-age rejects older answers.
+
+        Returns:
+            tuple: (cached service response or None, query vector for store() or None)
+        """
+        cache_control = cache_control or {}
+        try:
+            vector = self._embed(normalise_prompt(user_input))
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Semantic cache embedding failed: {str(e)}")
+            return None, None
+        if "no-cache" in cache_control:
+            return None, vector
+
+        self.stats["lookups"] += 1
+        now = time.time()
+        with self.lock:
+            bucket = self.buckets.get(bucket_key)
+            if bucket is None:
+                self.stats["misses"] += 1
+                return None, vector
+            self.buckets.move_to_end(bucket_key)
+            self.stats["evictions"] += bucket.evict(now, self.ttl, self.max_entries)
+            entry_id, similarity = bucket.search(vector)
+            if entry_id is None or similarity < self.threshold:
+                self.stats["misses"] += 1
+                return None, vector
+            stored_at, value = bucket.entries[entry_id]
+        if "max-age" in cache_control and now - stored_at > cache_control["max-age"]:
+            self.stats["misses"] += 1
+            return None, vector
+
+        self.stats["hits"] += 1
+        cached = json.loads(value)
+        cached.update({
+            "cached": True,
+            "cache_similarity": round(similarity, 4),
+            "cache_age_seconds": int(now - stored_at),
+            "client_used": "semantic-cache",
+            # Nothing was sent to the model for this response
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "cached_tokens": 0
+        })
+        return cached, vector
+
+    def store(self, bucket_key, vector, service_response):
+        """Remember a successful answer under the prompt's embedding"""
+        if vector is None or not service_response.get("success"):
+            return
+        now = time.time()
+        value = json.dumps(service_response, default=str)
+        with self.lock:
+            bucket = self.buckets.get(bucket_key)
+            if bucket is None:
+                bucket = SemanticCacheBucket(vector.shape[1])
+                self.buckets[bucket_key] = bucket
+                while len(self.buckets) > self.max_buckets:
+                    _, dropped = self.buckets.popitem(last=False)
+                    self.stats["evictions"] += len(dropped.entries)
+            self.buckets.move_to_end(bucket_key)
+            bucket.add(vector, value, now)
+            self.stats["evictions"] += bucket.evict(now, self.ttl, self.max_entries)
+            self.stats["stores"] += 1
+
+    def get_stats(self):
+        with self.lock:
+            entries = sum(len(bucket.entries) for bucket in self.buckets.values())
+            buckets = len(self.buckets)
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "buckets": buckets,
+            "entries": entries,
+            "threshold": self.threshold
+        }
+
+
+# SHARED SEMANTIC CACHE FOR THIS WORKER
+llm_semantic_cache = LLMSemanticCache()
@@ -0,0 +1,139 @@
+import json
+import logging
+from flask import Response, g, stream_with_context, has_request_context
+from apis.utils.tokenBudget import count_tokens
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+def openai_stream_options(stream):
+    """Extra chat.completions.create arguments for a streamed call (usage arrives in the last chunk)"""
+    if not stream:
+        return {}
+    return {"stream": True, "stream_options": {"include_usage": True}}
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def is_streaming_response(response):
+    """Check whether a route returned an SSE response whose body has not been produced yet"""
+    return has_request_context() and getattr(g, 'stream_finalizers', None) is not None and getattr(response, 'is_streamed', False)
+
+def add_stream_finalizer(finalizer):
+    """
+    Register a callback to run with the final response data once the stream closes
+
+    Used by the logging and usage middleware, which cannot see the streamed body when the
+    route returns. Callbacks run in registration order inside the request context.
+    """
+    g.stream_finalizers.append(finalizer)
+
+def _usage_value(usage, name):
+    if usage is None:
+        return None
+    value = getattr(usage, name, None)
+    if value is None and isinstance(usage, dict):
+        value = usage.get(name)
+    return value
+
+def create_sse_response(chunks, build_final_data, system_prompt="", user_input="", model=None):
+    """
+    Relay a streamed chat completion to the client as Server-Sent Events
+
+    Emits a "delta" event per content delta, then a "done" event carrying the same dict the
+    non-streaming endpoint returns (or an "error" event). Token usage comes from the stream's
+    usage chunk; if the client disconnects before it arrives, usage is counted from the text with
+    the model's tokenizer. The final data is made available to the logging and usage
+    middleware through the registered stream finalizers.
+
+    Args:
+        chunks: Iterable of OpenAI / Azure AI Inference streaming chunks
+        build_final_data (callable): build_final_data(result_text, usage_dict) -> response dict
+        system_prompt (str): Used to estimate prompt tokens when the stream ends early
+        user_input (str): Used to estimate prompt tokens when the stream ends early
+        model (str): Model whose tokenizer counts the text when the stream ends early
+
+    Returns:
+        Response: A text/event-stream response
+    """
+    finalizers = []
+    g.stream_finalizers = finalizers
+
+    def generate():
+        parts = []
+        usage = None
+        final_data = None
+        try:
+            for chunk in chunks:
+                if getattr(chunk, 'usage', None):
+                    usage = chunk.usage
+                for choice in getattr(chunk, 'choices', None) or []:
+                    delta = getattr(choice, 'delta', None)
+                    content = getattr(delta, 'content', None) if delta is not None else None
+                    if content:
+                        parts.append(content)
+                        yield sse_event("delta", {"content": content})
+
+            final_data = build_final_data("".join(parts), _usage_dict(usage, parts, system_prompt, user_input, model))
+            yield sse_event("done", final_data)
+
+        except GeneratorExit:
+            logger.warning("Client disconnected during streamed response")
+            raise
+
+        except Exception as e:
+            logger.error(f"Error while streaming response: {str(e)}")
+            final_data = {
+                "response": "500",
+                "message": str(e)
+            }
+            yield sse_event("error", final_data)
+
+        finally:
+            if final_data is None:
+                # Stream cut short - account for what was generated so far
+                final_data = build_final_data("".join(parts), _usage_dict(usage, parts, system_prompt, user_input, model))
+            g.response_data = final_data
+            g.response_data_for = response
+            for finalizer in finalizers:
+                try:
+                    finalizer(final_data)
+                except Exception as e:
+                    logger.error(f"Error finalising streamed response: {str(e)}")
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+
+    correlation_id = getattr(g, 'correlation_id', None)
+    if correlation_id:
+        response.headers['X-Correlation-ID'] = correlation_id
+
+    return response
+
+def _usage_dict(usage, parts, system_prompt, user_input, model=None):
+    prompt_tokens = _usage_value(usage, 'prompt_tokens')
+    completion_tokens = _usage_value(usage, 'completion_tokens')
+
+    if prompt_tokens is None or completion_tokens is None:
+        prompt_tokens = count_tokens(system_prompt, model) + count_tokens(user_input, model)
+        completion_tokens = count_tokens("".join(parts), model)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cached_tokens": 0,
+            "usage_estimated": True
+        }
+
+    details = _usage_value(usage, 'prompt_tokens_details')
+    cached_tokens = _usage_value(details, 'cached_tokens') if details is not None else None
+
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": _usage_value(usage, 'total_tokens') or prompt_tokens + completion_tokens,
+        "cached_tokens": cached_tokens or 0
+    }
@@ -4,12 +4,38 @@ from flask import request, g
 from functools import wraps
 import uuid
 from apis.utils.databaseService import DatabaseService
+from apis.utils.requestContext import resolve_request_context, get_response_data
+from apis.utils.requestRecord import get_request_record, is_request_record_deferred
+from apis.utils.llmStreaming import is_streaming_response, add_stream_finalizer
+import os
+import random
 import logging
 from datetime import datetime
 
 # CONFIGURE LOGGING
 logger = logging.getLogger(__name__)
 
+# BODY LOGGING CONFIGURATION
+# Request/response bodies longer than this are truncated before being stored in api_logs (0 = no limit)
+API_LOG_BODY_MAX_CHARS = int(os.environ.get("API_LOG_BODY_MAX_CHARS", 32768))
+# Fraction of successful responses whose body is stored; error responses are always stored
+API_LOG_RESPONSE_BODY_SAMPLE_RATE = float(os.environ.get("API_LOG_RESPONSE_BODY_SAMPLE_RATE", 1.0))
+
+def serialize_body_for_logging(data):
+    """Serialise a request/response body for api_logs, truncated to API_LOG_BODY_MAX_CHARS"""
+    if not data:
+        return None
+    body = json.dumps(data)
+    if API_LOG_BODY_MAX_CHARS and len(body) > API_LOG_BODY_MAX_CHARS:
+        return f"{body[:API_LOG_BODY_MAX_CHARS]}...[TRUNCATED {len(body) - API_LOG_BODY_MAX_CHARS} chars]"
+    return body
+
+def should_log_response_body(response_status):
+    """Decide whether this response's body is stored (sampling applies to successful responses only)"""
+    if response_status is None or response_status >= 400:
+        return True
+    return API_LOG_RESPONSE_BODY_SAMPLE_RATE >= 1 or random.random() < API_LOG_RESPONSE_BODY_SAMPLE_RATE
+
 def redact_sensitive_response_data(response_data):
     """Remove sensitive information from response data before logging"""
     if not response_data or not isinstance(response_data, dict):
@@ -29,35 +55,19 @@ def redact_sensitive_response_data(response_data):
 
 def get_token_details():
     """Extract token details from request"""
-    # Try X-Token header first
-    token = request.headers.get('X-Token')
-    if token:
-        return DatabaseService.get_token_details_by_value(token)
-    
-    # Try token in request body
-    if request.is_json:
-        data = request.get_json()
-        if data and 'token' in data:
-            token = data.get('token')
-            return DatabaseService.get_token_details_by_value(token)
-    
-    return None
+    return resolve_request_context()["token_details"]
 
 def get_user_id_from_request():
     """Extract user ID from various authentication methods"""
-    user_id = None
+    context = resolve_request_context()
     
     # Try to get user_id from API key (admin functions)
-    api_key = request.headers.get('API-Key')
-    if api_key:
-        admin_info = DatabaseService.validate_api_key(api_key)
-        if admin_info:
-            return admin_info["id"]
+    if context["api_key_user"]:
+        return context["api_key_user"]["id"]
     
     # Try to get user_id from token details
-    token_details = get_token_details()
-    if token_details:
-        return token_details.get("user_id")
+    if context["token_details"]:
+        return context["token_details"].get("user_id")
     
     # Fallback to user_id stored in Flask g object
     return getattr(g, 'user_id', None)
@@ -128,47 +138,55 @@ def api_logger(f):
             # Get user_id using the helper function
             user_id = get_user_id_from_request()
             
-            # Get endpoint ID from database
-            endpoint_id = DatabaseService.get_endpoint_id_by_path(endpoint)
+            # Get endpoint ID resolved for this request
+            endpoint_id = resolve_request_context()["endpoint_id"]
             if not endpoint_id:
                 logger.warning(f"Endpoint not found in database: {endpoint}")
                 return response
             
             # Extract response data
             response_status = response.status_code
-            try:
-                response_data = response.get_json() if hasattr(response, 'get_json') else None
+            response_data_for_logging = None
+            if should_log_response_body(response_status):
+                # Read the dict the route built rather than decoding the body again
+                response_data = get_response_data(response)
                 # Redact sensitive information from response data before logging
                 response_data_for_logging = redact_sensitive_response_data(response_data)
-            except:
-                response_data = None
-                response_data_for_logging = None
                 
-            # Log successful request - IMPORTANT: Store the returned log_id
-            log_id = DatabaseService.log_api_call(
+            # Record the request - written together with its usage row by track_usage when it
+            # wraps this route, otherwise queued straight away
+            record = get_request_record()
+            record.set_log(
                 endpoint_id=endpoint_id,
                 user_id=user_id,
                 token_id=token_id,
                 request_method=method,
                 request_headers=json.dumps(headers_for_logging),
-                request_body=json.dumps(body) if body else None,
+                request_body=serialize_body_for_logging(body),
                 response_status=response_status,
                 response_time_ms=response_time,
                 user_agent=user_agent,
                 ip_address=ip_address,
-                response_body=json.dumps(response_data_for_logging) if response_data_for_logging else None,
-                correlation_id=correlation_id  # Pass the correlation ID
+                response_body=serialize_body_for_logging(response_data_for_logging),
+                correlation_id=correlation_id
             )
+            if is_streaming_response(response):
+                # The body is produced after this returns - complete the log once the stream closes
+                def finalize_streamed_log(final_data):
+                    record.log_fields["response_time_ms"] = int((time.time() - start_time) * 1000)
+                    if should_log_response_body(response_status):
+                        record.log_fields["response_body"] = serialize_body_for_logging(redact_sensitive_response_data(final_data))
+                    if not is_request_record_deferred():
+                        record.persist()
+                add_stream_finalizer(finalize_streamed_log)
+            elif not is_request_record_deferred():
+                record.persist()
             
             # Store the log ID in g for usageMiddleware to access
-            if log_id:
-                # Set in Flask g object
-                g.current_api_log_id = log_id
-                # Also set directly on request object as a backup
-                setattr(request, '_api_log_id', log_id)
-                logger.info(f"API Log ID set: {log_id}, Correlation ID: {correlation_id}")
-            else:
-                logger.warning("Failed to get API Log ID from DatabaseService")
+            g.current_api_log_id = record.log_id
+            # Also set directly on request object as a backup
+            setattr(request, '_api_log_id', record.log_id)
+            logger.info(f"API Log ID set: {record.log_id}, Correlation ID: {correlation_id}")
             
             return response
             
@@ -176,33 +194,36 @@ def api_logger(f):
             # Calculate response time
             response_time = int((time.time() - start_time) * 1000)
             
-            # Get endpoint ID from database
-            endpoint_id = DatabaseService.get_endpoint_id_by_path(endpoint)
+            # Get endpoint ID resolved for this request
+            endpoint_id = resolve_request_context()["endpoint_id"]
             
             # Get user_id using the helper function
             user_id = get_user_id_from_request()
             
-            # Log failed request
-            error_log_id = DatabaseService.log_api_call(
-                endpoint_id=endpoint_id,
-                user_id=user_id,
-                token_id=token_id,
-                request_method=method,
-                request_headers=json.dumps(headers_for_logging),
-                request_body=json.dumps(body) if body else None,
-                response_status=500,
-                response_time_ms=response_time,
-                user_agent=user_agent,
-                ip_address=ip_address,
-                error_message=str(e),
-                correlation_id=correlation_id  # Pass the correlation ID
-            )
-            
-            # Store the error log ID in g
-            if error_log_id:
-                g.current_api_log_id = error_log_id
-                setattr(request, '_api_log_id', error_log_id)
-                logger.info(f"Error API Log ID set: {error_log_id}, Correlation ID: {correlation_id}")
+            # Record failed request - an outer track_usage persists it before re-raising
+            record = get_request_record()
+            if endpoint_id:
+                record.set_log(
+                    endpoint_id=endpoint_id,
+                    user_id=user_id,
+                    token_id=token_id,
+                    request_method=method,
+                    request_headers=json.dumps(headers_for_logging),
+                    request_body=serialize_body_for_logging(body),
+                    response_status=500,
+                    response_time_ms=response_time,
+                    user_agent=user_agent,
+                    ip_address=ip_address,
+                    error_message=str(e),
+                    correlation_id=correlation_id
+                )
+                if not is_request_record_deferred():
+                    record.persist()
+                
+                # Store the error log ID in g
+                g.current_api_log_id = record.log_id
+                setattr(request, '_api_log_id', record.log_id)
+                logger.info(f"Error API Log ID set: {record.log_id}, Correlation ID: {correlation_id}")
             
             # Re-raise the exception
             raise
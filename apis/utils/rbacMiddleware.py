@@ -1,6 +1,7 @@
 from functools import wraps
 from flask import request, g, jsonify, make_response
 from apis.utils.databaseService import DatabaseService
+from apis.utils.requestContext import resolve_request_context
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,8 +14,11 @@ def check_endpoint_access(f):
             if request.path.startswith('/admin'):
                 return f(*args, **kwargs)
 
+            # Resolve token, user and endpoint once for the whole middleware stack
+            context = resolve_request_context()
+            
             # Get endpoint ID
-            endpoint_id = DatabaseService.get_endpoint_id_by_path(request.path)
+            endpoint_id = context["endpoint_id"]
             if not endpoint_id:
                 logger.error(f"Endpoint not configured for access control: {request.path}")
                 return make_response(jsonify({
@@ -22,28 +26,9 @@ def check_endpoint_access(f):
                     "message": "Endpoint not configured for access control"
                 }), 500)
 
-            # Get user_id from context
+            # Get user_id from context (set by the route or resolved from token / API key)
             user_id = getattr(g, 'user_id', None)
             
-            # If user_id is not in g, try to get it from token or API key
-            if not user_id:
-                # Try from X-Token header
-                token = request.headers.get('X-Token')
-                if token:
-                    token_details = DatabaseService.get_token_details_by_value(token)
-                    if token_details:
-                        user_id = token_details.get("user_id")
-                        g.user_id = user_id  # Set it for subsequent middleware
-                
-                # If still no user_id, try from API-Key
-                if not user_id:
-                    api_key = request.headers.get('API-Key')
-                    if api_key:
-                        user_info = DatabaseService.validate_api_key(api_key)
-                        if user_info:
-                            user_id = user_info["id"]
-                            g.user_id = user_id  # Set it for subsequent middleware
-            
             if not user_id:
                 logger.error("User ID not found in request context or authentication headers")
                 return make_response(jsonify({
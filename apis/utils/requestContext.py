@@ -0,0 +1,103 @@
+from flask import request, g
+from apis.utils.databaseService import DatabaseService
+import logging
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+def get_request_token():
+    """Extract the token from the X-Token header or the JSON request body"""
+    token = request.headers.get('X-Token')
+    if token:
+        return token
+
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if data and isinstance(data, dict) and 'token' in data:
+            return data.get('token')
+
+    return None
+
+def resolve_request_context():
+    """
+    Resolve the caller and endpoint for the current request once
+
+    Populates g with:
+        token_details: token_transactions row for the request token (or None)
+        user_details: users row for the token owner, falling back to the API-Key user
+        api_key_user: users row for the API-Key header (or None)
+        endpoint_id: endpoints.id for request.path (or None)
+        user_id / token_id: ids used by the middleware and routes
+
+    Safe to call from every decorator - only the first call does any work, and
+    the underlying DatabaseService lookups are memoised for the rest of the request.
+
+    Returns:
+        dict: The resolved context
+    """
+    context = getattr(g, 'auth_context', None)
+    if context is not None:
+        return context
+
+    token_details = None
+    user_details = None
+    api_key_user = None
+
+    token = get_request_token()
+    if token:
+        token_details, user_details = DatabaseService.get_token_and_user_by_value(token)
+
+    api_key = request.headers.get('API-Key')
+    if api_key:
+        api_key_user = DatabaseService.validate_api_key(api_key)
+        if not user_details:
+            user_details = api_key_user
+
+    endpoint_id = DatabaseService.get_endpoint_id_by_path(request.path)
+
+    context = {
+        "token_details": token_details,
+        "user_details": user_details,
+        "api_key_user": api_key_user,
+        "endpoint_id": endpoint_id
+    }
+
+    g.auth_context = context
+    g.token_details = token_details
+    g.user_details = user_details
+    g.api_key_user = api_key_user
+    g.endpoint_id = endpoint_id
+
+    if token_details:
+        g.token_id = token_details["id"]
+
+    if not getattr(g, 'user_id', None):
+        if token_details:
+            g.user_id = token_details["user_id"]
+        elif api_key_user:
+            g.user_id = api_key_user["id"]
+
+    return context
+
+def get_response_data(response):
+    """
+    Get the dict a response was built from
+
+    create_api_response keeps the original data on g, so the middleware can read it
+    without decoding the serialised body. Falls back to response.get_json() for
+    responses built another way.
+
+    Returns:
+        dict: The response data, or None if the response is not JSON
+    """
+    if getattr(g, 'response_data_for', None) is response:
+        return g.response_data
+
+    # Reading a streamed body here would consume the stream before the client gets it
+    if getattr(response, 'is_streamed', False):
+        return None
+
+    try:
+        return response.get_json(silent=True) if hasattr(response, 'get_json') else None
+    except Exception:
+        return None
@@ -0,0 +1,90 @@
+import uuid
+import logging
+from flask import g
+from apis.utils.auditLogWriter import audit_log_writer, audit_timestamp, build_api_log_row, build_user_usage_row
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+
+class RequestRecord:
+    """
+    The api_logs row and user_usage row for one request, built up by the middleware stack
+
+    api_logger fills in the request metadata and track_usage the usage metrics. Both ids are
+    generated here, so the api_logs row carries its user_usage_id and the user_usage row its
+    api_log_id from the start, and the pair is persisted together in one transaction.
+    """
+
+    def __init__(self):
+        self.log_id = str(uuid.uuid4())
+        self.usage_id = None
+        self.log_fields = None
+        self.usage_metrics = None
+        self.persisted = False
+
+    def set_log(self, **fields):
+        """Record the api_logs fields (see auditLogWriter.build_api_log_row)"""
+        self.log_fields = fields
+
+    def set_usage(self, metrics):
+        """Record usage metrics from usageMiddleware.extract_usage_metrics"""
+        self.usage_metrics = metrics
+        self.reserve_usage_id()
+
+    def reserve_usage_id(self):
+        """Fix the user_usage id before usage is known, e.g. for a job that updates the row later"""
+        if self.usage_id is None:
+            self.usage_id = str(uuid.uuid4())
+        return self.usage_id
+
+    def persist(self):
+        """
+        Queue both rows for writing (once per request)
+
+        Returns:
+            bool: True if anything was queued
+        """
+        if self.persisted:
+            return False
+        self.persisted = True
+
+        if self.log_fields is None and self.usage_metrics is None:
+            return False
+
+        timestamp = audit_timestamp()
+        records = []
+
+        if self.log_fields is not None:
+            records.append(("api_logs", build_api_log_row(
+                self.log_id, timestamp=timestamp,
+                user_usage_id=self.usage_id if self.usage_metrics is not None else None, **self.log_fields
+            )))
+
+        if self.usage_metrics is not None:
+            api_log_id = self.log_id if self.log_fields is not None else None
+            records.append(("user_usage", build_user_usage_row(
+                self.usage_id, self.usage_metrics, api_log_id, timestamp
+            )))
+
+        queued = audit_log_writer.submit_group(records)
+        if queued:
+            logger.info(f"Request record queued: API log {self.log_id if self.log_fields is not None else None}, usage {self.usage_id}")
+        return queued
+
+
+def get_request_record():
+    """Get (or start) the record for the current request"""
+    record = getattr(g, 'request_record', None)
+    if record is None:
+        record = RequestRecord()
+        g.request_record = record
+    return record
+
+def defer_request_record():
+    """Mark that an outer middleware (track_usage) will persist the record once usage is known"""
+    g.request_record_deferred = True
+
+def is_request_record_deferred():
+    """Check whether persisting the record is left to an outer middleware"""
+    return getattr(g, 'request_record_deferred', False)
@@ -0,0 +1,312 @@
+import os
+import re
+import math
+import time
+import base64
+import struct
+import logging
+import threading
+import tiktoken
+from apis.utils.modelMetadataService import ModelMetadataService
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# TOKEN BUDGET CONFIGURATION
+# How long model_metadata.maxContextTokens values are reused before they are read again
+TOKEN_BUDGET_METADATA_TTL_SECONDS = int(os.environ.get("TOKEN_BUDGET_METADATA_TTL_SECONDS", 300))
+# Context window assumed for models without a limit in model_metadata or the engine registry
+TOKEN_BUDGET_DEFAULT_CONTEXT_TOKENS = int(os.environ.get("TOKEN_BUDGET_DEFAULT_CONTEXT_TOKENS", 128000))
+# Share of the context window an injected context file may take
+TOKEN_BUDGET_CONTEXT_SHARE = float(os.environ.get("TOKEN_BUDGET_CONTEXT_SHARE", 0.5))
+
+# Chat formatting overhead per message (role and separators) and once for the reply priming
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+
+# OpenAI image costing: the image is scaled to fit 2048x2048, then its short side to 768,
+# and costs 85 tokens plus 170 per 512px tile (detail=low is a flat 85)
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+IMAGE_TILE_SIZE = 512
+IMAGE_MAX_SIDE = 2048
+IMAGE_SHORT_SIDE = 768
+# Images whose size cannot be read are costed as a 1024x1024 image (4 tiles)
+DEFAULT_IMAGE_TOKENS = 765
+
+# Models on the GPT-4o tokenizer; everything else is counted with cl100k_base
+O200K_MODEL_PREFIXES = ("gpt-4o", "gpt-4.1", "o1", "o3", "o4")
+# Estimate used while the tokenizer cannot be loaded (tiktoken downloads encodings on first use)
+FALLBACK_CHARS_PER_TOKEN = 4
+ENCODING_RETRY_SECONDS = 300
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_encodings = {}
+_encoding_retry_at = {}
+_encodings_lock = threading.Lock()
+
+# Normalised model name -> context limit registered by the LLM engine
+_registered_limits = {}
+_metadata_limits = {}
+_metadata_loaded_at = 0
+_metadata_lock = threading.Lock()
+
+
+def encoding_name_for_model(model):
+    return "o200k_base" if (model or "").lower().startswith(O200K_MODEL_PREFIXES) else "cl100k_base"
+
+def get_encoding(model=None):
+    """
+    tiktoken encoding for a model, loaded once per process
+
+    Returns:
+        tiktoken.Encoding: The encoding, or None while it cannot be loaded
+    """
+    name = encoding_name_for_model(model)
+    encoding = _encodings.get(name)
+    if encoding is not None:
+        return encoding
+
+    with _encodings_lock:
+        if name in _encodings:
+            return _encodings[name]
+        if time.time() < _encoding_retry_at.get(name, 0):
+            return None
+        try:
+            encoding = tiktoken.get_encoding(name)
+        except Exception as e:
+            logger.warning(f"Could not load tiktoken encoding {name}: {str(e)}. Using approximate counts.")
+            _encoding_retry_at[name] = time.time() + ENCODING_RETRY_SECONDS
+            return None
+        _encodings[name] = encoding
+        return encoding
+
+def count_tokens(text, model=None):
+    """Count the tokens of a text for a model"""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // FALLBACK_CHARS_PER_TOKEN)
+    return len(encoding.encode_ordinary(text))
+
+def truncate_tokens(text, max_tokens, model=None, keep="head"):
+    """
+    Trim a text to at most max_tokens tokens
+
+    Only a window of the text around the kept end is encoded, grown until it holds more than
+    max_tokens tokens, so trimming a huge input does not tokenize all of it.
+
+    Args:
+        text (str): Text to trim
+        max_tokens (int): Token limit
+        model (str): Model whose tokenizer is used
+        keep (str): "head" keeps the beginning, "tail" the end
+
+    Returns:
+        tuple: (text, tokens, truncated)
+    """
+    if not text:
+        return text or "", 0, False
+    if max_tokens <= 0:
+        return "", 0, True
+
+    encoding = get_encoding(model)
+    if encoding is None:
+        max_chars = max_tokens * FALLBACK_CHARS_PER_TOKEN
+        if len(text) <= max_chars:
+            return text, -(-len(text) // FALLBACK_CHARS_PER_TOKEN), False
+        return (text[:max_chars] if keep == "head" else text[-max_chars:]), max_tokens, True
+
+    window = max_tokens * 8
+    while True:
+        piece = text[:window] if keep == "head" else text[-window:]
+        tokens = encoding.encode_ordinary(piece)
+        if len(tokens) > max_tokens:
+            kept = tokens[:max_tokens] if keep == "head" else tokens[-max_tokens:]
+            return encoding.decode(kept), max_tokens, True
+        if len(piece) == len(text):
+            return text, len(tokens), False
+        window *= 4
+
+def image_tokens(width, height, detail="auto"):
+    """Tokens an image of width x height costs (OpenAI tile accounting)"""
+    if detail == "low":
+        return IMAGE_BASE_TOKENS
+    if not width or not height:
+        return DEFAULT_IMAGE_TOKENS
+
+    if max(width, height) > IMAGE_MAX_SIDE:
+        scale = IMAGE_MAX_SIDE / max(width, height)
+        width, height = width * scale, height * scale
+    if min(width, height) > IMAGE_SHORT_SIDE:
+        scale = IMAGE_SHORT_SIDE / min(width, height)
+        width, height = width * scale, height * scale
+
+    tiles = math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(height / IMAGE_TILE_SIZE)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+def image_dimensions(data):
+    """
+    Read the size of PNG or JPEG image bytes from their header
+
+    Returns:
+        tuple: (width, height) or None
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 4 <= len(data):
+            if data[i] != 0xFF:
+                return None
+            marker = data[i + 1]
+            if marker == 0xFF:
+                # Fill byte
+                i += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                # Markers without a length
+                i += 2
+                continue
+            if marker in JPEG_SOF_MARKERS:
+                if i + 9 > len(data):
+                    return None
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return width, height
+            i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+def data_url_image_tokens(url, detail="auto"):
+    """Tokens for an image sent as a base64 data URL - only as much as the header needs is decoded"""
+    _, _, payload = (url or "").partition(",")
+    dimensions = None
+    try:
+        # The size is near the start of PNGs and usually within the first 64 KB of JPEGs
+        dimensions = image_dimensions(base64.b64decode(payload[:87384]))
+        if dimensions is None and len(payload) > 87384:
+            dimensions = image_dimensions(base64.b64decode(payload))
+    except Exception as e:
+        logger.warning(f"Could not read image size for token budgeting: {str(e)}")
+    return image_tokens(*dimensions, detail=detail) if dimensions else DEFAULT_IMAGE_TOKENS
+
+def normalise_model_name(name):
+    return re.sub(r"[^a-z0-9]", "", (name or "").lower())
+
+def register_context_limit(names, limit):
+    """Record a model's context limit under each of its names (used when model_metadata has none)"""
+    for name in names:
+        if name and limit:
+            _registered_limits[normalise_model_name(name)] = limit
+
+def _load_metadata_limits():
+    global _metadata_limits, _metadata_loaded_at
+    if time.time() - _metadata_loaded_at < TOKEN_BUDGET_METADATA_TTL_SECONDS:
+        return _metadata_limits
+
+    with _metadata_lock:
+        if time.time() - _metadata_loaded_at < TOKEN_BUDGET_METADATA_TTL_SECONDS:
+            return _metadata_limits
+        result = ModelMetadataService.get_all_models()
+        if result.get("success"):
+            limits = {}
+            for models in result["data"].values():
+                for model in models:
+                    if model.get("maxContextTokens"):
+                        limits[normalise_model_name(model["modelName"])] = int(model["maxContextTokens"])
+            _metadata_limits = limits
+        else:
+            # Keep the previous values and try again after the TTL
+            logger.warning(f"Using cached context limits - model metadata unavailable: {result.get('error')}")
+        _metadata_loaded_at = time.time()
+        return _metadata_limits
+
+def get_context_limit(*names, default=None):
+    """
+    Context window of a model
+
+    model_metadata.maxContextTokens wins, then the limit the LLM engine registered for the
+    model, then default. Any of the model's names may be passed (engine name, label, API alias).
+
+    Returns:
+        int: The context limit in tokens, or default
+    """
+    keys = [normalise_model_name(name) for name in names if name]
+    try:
+        metadata_limits = _load_metadata_limits()
+    except Exception as e:
+        logger.error(f"Error loading model context limits: {str(e)}")
+        metadata_limits = {}
+    for key in keys:
+        if key in metadata_limits:
+            return metadata_limits[key]
+    for key in keys:
+        if key in _registered_limits:
+            return _registered_limits[key]
+    return default
+
+
+class TokenBudget:
+    """
+    Tokens left in a model's context window, consumed one message part at a time
+
+    Parts are counted separately - large inputs are never concatenated just to be measured - and
+    fit() trims a part to exactly the tokens that are left.
+
+    Args:
+        model (str): Model name (selects the tokenizer and the context limit)
+        limit (int): Context window; looked up with get_context_limit when omitted
+        reserve (int): Tokens kept free, e.g. for the response (max_tokens) - at most half the window
+    """
+
+    def __init__(self, model=None, limit=None, reserve=0):
+        self.model = model
+        self.limit = limit or get_context_limit(model, default=TOKEN_BUDGET_DEFAULT_CONTEXT_TOKENS)
+        self.reserve = min(reserve or 0, self.limit // 2)
+        self.used = REPLY_OVERHEAD_TOKENS
+
+    @property
+    def remaining(self):
+        return max(0, self.limit - self.reserve - self.used)
+
+    @property
+    def exceeded(self):
+        return self.used + self.reserve > self.limit
+
+    def add(self, text=None, tokens=None, message=False):
+        """Count a part against the budget whether or not it fits; returns its tokens"""
+        tokens = count_tokens(text, self.model) if tokens is None else tokens
+        self.used += tokens + (MESSAGE_OVERHEAD_TOKENS if message else 0)
+        return tokens
+
+    def add_image(self, url, fixed_tokens=None, detail="auto"):
+        """Count an image_url part - fixed_tokens for models with a flat per-image cost"""
+        return self.add(tokens=fixed_tokens if fixed_tokens else data_url_image_tokens(url, detail))
+
+    def fit(self, text, keep="head", marker="", max_tokens=None, message=False):
+        """
+        Trim text to what is left of the budget (and to max_tokens) and count it
+
+        Args:
+            text (str): The part to add
+            keep (str): "head" keeps the beginning, "tail" the end
+            marker (str): Appended (head) or prepended (tail) when the text was trimmed
+            max_tokens (int): Additional cap for this part
+            message (bool): Also count the per-message overhead
+
+        Returns:
+            str: The text, trimmed if it did not fit
+        """
+        if message:
+            self.used += MESSAGE_OVERHEAD_TOKENS
+        available = self.remaining if max_tokens is None else min(self.remaining, max_tokens)
+        fitted, tokens, truncated = truncate_tokens(text, available, self.model, keep)
+        if truncated and marker:
+            marker_tokens = count_tokens(marker, self.model)
+            fitted, tokens, _ = truncate_tokens(text, max(0, available - marker_tokens), self.model, keep)
+            fitted = fitted + marker if keep == "head" else marker + fitted
+            tokens += marker_tokens
+        self.used += tokens
+        return fitted
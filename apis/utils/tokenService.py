@@ -1,5 +1,6 @@
 from apis.utils.config import Config
 from apis.utils.databaseService import DatabaseService
+from apis.utils.tokenValidationCache import token_validation_cache, TOKEN_CACHE_ENABLED
 from msal import ConfidentialClientApplication
 from datetime import datetime, timedelta
 import logging
@@ -88,9 +89,50 @@ class TokenService:
             }, 500
  
     # CREATE THE TOKEN VALIDATION FUNCTION
-    def validate_token(token):
-        """ Validate token by making a simple call to MS Graph API"""
+    def validate_token(token, expires_on=None):
+        """ Validate token by making a simple call to MS Graph API
         
+        Results are cached per worker (keyed by token hash) so a hot token only
+        costs a Graph round-trip on first use and on periodic background re-validation.
+        
+        Args:
+            token (str): The token to validate
+            expires_on (datetime): token_transactions.expires_on for the token (optional,
+                looked up from the database on a cache miss if not provided)
+                
+        Returns:
+            bool: True if the token is valid, False otherwise
+        """
+        if not token:
+            return False
+        
+        if not TOKEN_CACHE_ENABLED:
+            return TokenService.validate_token_with_provider(token) is True
+        
+        found, is_valid, needs_refresh = token_validation_cache.get(token)
+        if found:
+            if needs_refresh:
+                token_validation_cache.refresh_in_background(
+                    token,
+                    TokenService.validate_token_with_provider,
+                    TokenService._get_expiry_timestamp(token, expires_on)
+                )
+            return is_valid
+        
+        result = TokenService.validate_token_with_provider(token)
+        
+        # ONLY CACHE DEFINITIVE ANSWERS FROM THE PROVIDER
+        if result is not None:
+            token_validation_cache.set(token, result, TokenService._get_expiry_timestamp(token, expires_on))
+        
+        return result is True
+    
+    def validate_token_with_provider(token):
+        """ Validate token against MS Graph API without using the cache
+        
+        Returns:
+            bool: True if accepted, False if rejected, None if the provider gave no definitive answer
+        """
         try: 
             graph_endpoint = "https://graph.microsoft.com/v1.0/$metadata"
             headers = {
@@ -101,8 +143,31 @@ class TokenService:
             
             # IF THE STATUS CODE IS 200, TOKEN IS VALID
             logger.info(f"Token validation status code: {response.status_code}")
-            return response.status_code == 200
+            if response.status_code == 200:
+                return True
+            if response.status_code in (401, 403):
+                return False
+            return None
         
         except Exception as e:
             logger.error(f"Token validation failed: {str(e)}")
-            return False
\ No newline at end of file
+            return None
+    
+    def _get_expiry_timestamp(token, expires_on=None):
+        """ Convert token_transactions.expires_on to a UNIX timestamp for the cache """
+        try:
+            if expires_on is None:
+                token_details = DatabaseService.get_token_details_by_value(token)
+                if not token_details:
+                    return None
+                expires_on = token_details["token_expiration_time"]
+            
+            # Stored expiry times are in SAST without timezone information
+            if expires_on.tzinfo is None:
+                expires_on = pytz.timezone('Africa/Johannesburg').localize(expires_on)
+            
+            return expires_on.timestamp()
+        
+        except Exception as e:
+            logger.warning(f"Could not determine token expiry for validation cache: {str(e)}")
+            return None
@@ -0,0 +1,162 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# CACHE CONFIGURATION (SECONDS)
+TOKEN_CACHE_ENABLED = os.environ.get("TOKEN_VALIDATION_CACHE_ENABLED", "true").lower() == "true"
+TOKEN_CACHE_TTL = int(os.environ.get("TOKEN_VALIDATION_CACHE_TTL", 900))
+TOKEN_CACHE_NEGATIVE_TTL = int(os.environ.get("TOKEN_VALIDATION_NEGATIVE_TTL", 60))
+TOKEN_CACHE_REFRESH_AFTER = int(os.environ.get("TOKEN_VALIDATION_REFRESH_AFTER", 300))
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get("TOKEN_VALIDATION_CACHE_MAX_ENTRIES", 10000))
+
+
+def hash_token(token):
+    """Return the cache key for a token - raw token values are never kept in memory"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenValidationCache:
+    """
+    Process-local cache of provider token validation results
+
+    Entries are keyed by the SHA-256 of the token and hold either a positive result
+    (valid until the earlier of the cache TTL and the token's expires_on) or a
+    negative result (held for a short TTL so rejected tokens do not hammer the provider).
+    Positive entries older than refresh_after are re-validated in a background thread
+    while the cached result continues to be served.
+    """
+
+    def __init__(self, ttl=TOKEN_CACHE_TTL, negative_ttl=TOKEN_CACHE_NEGATIVE_TTL,
+                 refresh_after=TOKEN_CACHE_REFRESH_AFTER, max_entries=TOKEN_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_after = refresh_after
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "refreshes": 0}
+
+    def get(self, token):
+        """
+        Get the cached validation result for a token
+
+        Returns:
+            tuple: (found, is_valid, needs_refresh)
+        """
+        key = hash_token(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                self.stats["misses"] += 1
+                return False, None, False
+
+            if now >= entry["expires_at"]:
+                del self._entries[key]
+                self.stats["misses"] += 1
+                return False, None, False
+
+            self._entries.move_to_end(key)
+
+            if not entry["valid"]:
+                self.stats["negative_hits"] += 1
+                return True, False, False
+
+            self.stats["hits"] += 1
+            needs_refresh = (now - entry["validated_at"]) >= self.refresh_after and key not in self._refreshing
+            return True, True, needs_refresh
+
+    def set(self, token, is_valid, expires_on=None):
+        """
+        Store a validation result
+
+        Args:
+            token (str): The token value
+            is_valid (bool): Result of provider validation
+            expires_on (float): Token expiry as a UNIX timestamp (optional)
+        """
+        key = hash_token(token)
+        now = time.time()
+
+        if is_valid:
+            expires_at = now + self.ttl
+            if expires_on is not None:
+                expires_at = min(expires_at, expires_on)
+        else:
+            expires_at = now + self.negative_ttl
+
+        if expires_at <= now:
+            self.invalidate(token)
+            return
+
+        with self._lock:
+            self._entries[key] = {
+                "valid": is_valid,
+                "validated_at": now,
+                "expires_at": expires_at
+            }
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token):
+        """Remove a token from the cache"""
+        with self._lock:
+            self._entries.pop(hash_token(token), None)
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def refresh_in_background(self, token, validator, expires_on=None):
+        """
+        Re-validate a token with the provider without blocking the caller
+
+        Args:
+            token (str): The token value
+            validator (callable): Function returning True/False/None for a token;
+                None means the provider could not give a definitive answer
+            expires_on (float): Token expiry as a UNIX timestamp (optional)
+        """
+        key = hash_token(token)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.stats["refreshes"] += 1
+
+        def _refresh():
+            try:
+                result = validator(token)
+                if result is not None:
+                    self.set(token, result, expires_on)
+            except Exception as e:
+                logger.warning(f"Background token re-validation failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        thread = threading.Thread(target=_refresh)
+        thread.daemon = True
+        thread.start()
+
+    def get_stats(self):
+        """Return cache statistics"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+
+# SHARED CACHE INSTANCE FOR THIS WORKER
+token_validation_cache = TokenValidationCache()
@@ -1,6 +1,9 @@
 from functools import wraps
 from flask import request, g, jsonify, make_response
 from apis.utils.databaseService import DatabaseService
+from apis.utils.requestRecord import get_request_record, defer_request_record
+from apis.utils.requestContext import get_response_data
+from apis.utils.llmStreaming import is_streaming_response, add_stream_finalizer
 import logging
 import json
 import uuid
@@ -13,7 +16,7 @@ def extract_usage_metrics(response):
     """Extract usage metrics from API response"""
     metrics = {
         "user_id": getattr(g, 'user_id', None),
-        "endpoint_id": DatabaseService.get_endpoint_id_by_path(request.path),
+        "endpoint_id": getattr(g, 'endpoint_id', None) or DatabaseService.get_endpoint_id_by_path(request.path),
         "images_generated": 0,
         "audio_seconds_processed": 0,
         "pages_processed": 0,
@@ -28,8 +31,8 @@ def extract_usage_metrics(response):
     }
     
     try:
-        # Try to extract JSON data from response
-        response_data = response.get_json() if hasattr(response, 'get_json') else None
+        # Use the dict the route built (falls back to decoding the body)
+        response_data = get_response_data(response)
         
         if not response_data:
             return metrics
@@ -115,157 +118,60 @@ def extract_usage_metrics(response):
         logger.error(f"Error extracting usage metrics: {str(e)}")
         return metrics
 
-def log_usage_metrics_and_update_api_log(metrics, api_log_id, usage_id):
-    """Log usage metrics to database and update the api_logs table with the usage ID"""
+def record_usage(record, response, start_time):
+    """Add the response's usage metrics to the request record and persist it"""
+    response_time = int((time.time() - start_time) * 1000)
+    
     try:
-        conn = DatabaseService.get_connection()
-        cursor = conn.cursor()
-        
-        # 1. Insert into user_usage table with api_log_id field
-        query = """
-        INSERT INTO user_usage (
-            id, user_id, endpoint_id, timestamp,
-            images_generated, audio_seconds_processed, pages_processed,
-            documents_processed, model_used, prompt_tokens,
-            completion_tokens, total_tokens, cached_tokens, files_uploaded,
-            api_log_id, embedded_tokens
-        )
-        VALUES (
-            ?, ?, ?, DATEADD(HOUR, 2, GETUTCDATE()),
-            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-            ?, ?
-        )
-        """
-        
-        cursor.execute(query, [
-            usage_id,
-            metrics["user_id"],
-            metrics["endpoint_id"],
-            metrics["images_generated"],
-            metrics["audio_seconds_processed"],
-            metrics["pages_processed"],
-            metrics["documents_processed"],
-            metrics["model_used"],
-            metrics["prompt_tokens"],
-            metrics["completion_tokens"],
-            metrics["total_tokens"],
-            metrics["cached_tokens"],
-            metrics["files_uploaded"],
-            api_log_id,  # Add api_log_id parameter
-            metrics["embedded_tokens"]  # Add embedded_tokens parameter
-        ])
-        
-        # 2. Update the api_logs table with the user_usage_id
-        if api_log_id:
-            update_query = """
-            UPDATE api_logs
-            SET user_usage_id = ?
-            WHERE id = ?
-            """
+        # Extract usage metrics from the response
+        metrics = extract_usage_metrics(response)
+        
+        # Don't record usage if we don't have the basic info needed
+        if not metrics["user_id"] or not metrics["endpoint_id"]:
+            if not metrics["user_id"]:
+                logger.warning(f"Cannot log usage metrics: missing user_id for {request.path}")
+            if not metrics["endpoint_id"]:
+                logger.warning(f"Cannot log usage metrics: missing endpoint_id for {request.path}")
+        else:
+            record.set_usage(metrics)
             
-            cursor.execute(update_query, [usage_id, api_log_id])
-            
-            rows_affected = cursor.rowcount
-            if rows_affected > 0:
-                logger.info(f"Updated API log {api_log_id} with usage ID {usage_id}")
-            else:
-                logger.warning(f"No API log found with ID {api_log_id} to update")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        logger.info(f"Usage metrics logged with ID: {usage_id}" + (f", linked to API log: {api_log_id}" if api_log_id else ""))
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error logging usage metrics: {str(e)}")
-        return False
-
-def create_api_log_and_get_id(user_id, endpoint_id, request_method, response_status, response_time_ms):
-    """Create a new API log entry specifically for usage tracking"""
-    try:
-        conn = DatabaseService.get_connection()
-        cursor = conn.cursor()
-        
-        log_id = str(uuid.uuid4())
-        
-        # Get correlation ID from Flask g object if available
-        correlation_id = getattr(g, 'correlation_id', None)
-        
-        query = """
-        INSERT INTO api_logs (
-            id, endpoint_id, user_id, timestamp, request_method, 
-            response_status, response_time_ms, correlation_id
-        )
-        VALUES (
-            ?, ?, ?, DATEADD(HOUR, 2, GETUTCDATE()), ?, 
-            ?, ?, ?
-        )
-        """
-        
-        cursor.execute(query, [
-            log_id, endpoint_id, user_id, request_method,
-            response_status, response_time_ms, correlation_id
-        ])
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        logger.info(f"Created API log with ID {log_id} for usage tracking, Correlation ID: {correlation_id}")
-        return log_id
+            # Routes without api_logger still get a minimal API log alongside their usage
+            if record.log_fields is None:
+                record.set_log(
+                    endpoint_id=metrics["endpoint_id"],
+                    user_id=metrics["user_id"],
+                    request_method=request.method,
+                    response_status=response.status_code if hasattr(response, 'status_code') else 200,
+                    response_time_ms=response_time,
+                    correlation_id=getattr(g, 'correlation_id', None)
+                )
         
     except Exception as e:
-        logger.error(f"Error creating API log for usage tracking: {str(e)}")
-        return None
+        # Log the error but don't affect the response
+        logger.error(f"Error in usage tracking: {str(e)}")
+    
+    # Write the API log and usage rows in one transaction
+    record.persist()
 
 def track_usage(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        # The api_logs row built by api_logger is persisted here together with the usage row
+        defer_request_record()
+        record = get_request_record()
+        
         start_time = time.time()
         # Execute the API function and get the response
-        response = f(*args, **kwargs)
-        response_time = int((time.time() - start_time) * 1000)
-        
         try:
-            # Extract usage metrics from the response
-            metrics = extract_usage_metrics(response)
-            
-            # Don't continue if we don't have the basic info needed
-            if not metrics["user_id"] or not metrics["endpoint_id"]:
-                if not metrics["user_id"]:
-                    logger.warning(f"Cannot log usage metrics: missing user_id for {request.path}")
-                if not metrics["endpoint_id"]:
-                    logger.warning(f"Cannot log usage metrics: missing endpoint_id for {request.path}")
-                return response
-            
-            # Generate a new UUID for the usage metrics
-            usage_id = str(uuid.uuid4())
-            
-            # First, check if an API log ID was created by the api_logger middleware
-            api_log_id = getattr(g, 'current_api_log_id', None)
-            
-            # If not in g, try to get it from the request object
-            if not api_log_id:
-                api_log_id = getattr(request, '_api_log_id', None)
-                
-            # If still no API log ID, create one ourselves
-            if not api_log_id:
-                api_log_id = create_api_log_and_get_id(
-                    metrics["user_id"],
-                    metrics["endpoint_id"],
-                    request.method,
-                    response.status_code if hasattr(response, 'status_code') else 200,
-                    response_time
-                )
-                
-            # Log usage metrics and update the api_logs table
-            log_usage_metrics_and_update_api_log(metrics, api_log_id, usage_id)
-            
-        except Exception as e:
-            # Log the error but don't affect the response
-            logger.error(f"Error in usage tracking: {str(e)}")
+            response = f(*args, **kwargs)
+        except Exception:
+            record.persist()
+            raise
+        if is_streaming_response(response):
+            # Usage is only known once the stream's usage chunk arrives - finalise then
+            add_stream_finalizer(lambda final_data: record_usage(record, response, start_time))
+        else:
+            record_usage(record, response, start_time)
         
         # Return the original response
         return response
@@ -0,0 +1,195 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from langchain_openai import AzureOpenAIEmbeddings
+from langchain_community.vectorstores import FAISS
+from apis.utils.config import get_azure_blob_client
+from apis.utils.vectorstoreStore import vectorstore_store
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# Define container for vectorstores
+VECTORSTORE_CONTAINER = "vectorstores"
+
+# VECTORSTORE CACHE CONFIGURATION
+# Memory budget for loaded FAISS indexes per worker - 0 disables the cache. Indexes loaded into memory are
+# measured by their blob sizes, memory-mapped ones from the vectorstore store by their docstore offsets
+VECTORSTORE_CACHE_MAX_BYTES = int(os.environ.get("VECTORSTORE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+# Loaded indexes are used without listing their blobs for this long, then checked against the blob ETags
+VECTORSTORE_CACHE_REVALIDATE_SECONDS = int(os.environ.get("VECTORSTORE_CACHE_REVALIDATE_SECONDS", 60))
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings():
+    """Embedding client used to query loaded vectorstores, created once per process"""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = AzureOpenAIEmbeddings(
+                    azure_deployment=os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-large"),
+                    api_key=os.environ.get("OPENAI_API_KEY"),
+                    azure_endpoint=os.environ.get("OPENAI_API_ENDPOINT")
+                )
+    return _embeddings
+
+def download_vectorstore(container_client, vectorstore_path, blobs, folder):
+    """Download a vectorstore's blobs into folder, keeping their paths relative to vectorstore_path"""
+    for blob in blobs:
+        # Get relative path from vectorstore_path
+        rel_path = blob.name[len(vectorstore_path) + 1:] if blob.name.startswith(vectorstore_path + "/") else blob.name
+        local_blob_path = os.path.join(folder, rel_path)
+        os.makedirs(os.path.dirname(local_blob_path), exist_ok=True)
+        with open(local_blob_path, "wb") as download_file:
+            container_client.get_blob_client(blob.name).download_blob().readinto(download_file)
+
+def blob_version(blobs):
+    """Identify the stored version of a vectorstore by the names and ETags of its blobs"""
+    return tuple(sorted((blob.name, blob.etag or str(blob.last_modified)) for blob in blobs))
+
+
+class VectorstoreCache:
+    """
+    Per-worker cache of loaded FAISS vectorstores
+
+    Entries are keyed by vectorstore id and remember the blob path and version (names plus ETags)
+    they were loaded from; an entry for another path is stale. An entry younger than the revalidation window is served without touching
+    blob storage; an older one costs a blob listing and is only reloaded when the version
+    changed. Concurrent queries for a vectorstore that is not loaded share a single download
+    and deserialisation. Memory is an LRU capped by the indexes' footprint. With the node-local
+    vectorstore store enabled, indexes are memory-mapped from it rather than deserialised here.
+    """
+
+    def __init__(self, max_bytes=VECTORSTORE_CACHE_MAX_BYTES, revalidate_seconds=VECTORSTORE_CACHE_REVALIDATE_SECONDS):
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        # vectorstore_id -> {"path", "version", "vectorstore", "size", "checked_at"}
+        self.entries = OrderedDict()
+        self.size = 0
+        # (vectorstore_id, vectorstore_path) -> Future of the refresh in progress
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "loads": 0, "shared_loads": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, vectorstore_id, vectorstore_path):
+        """
+        Get a loaded vectorstore
+
+        Args:
+            vectorstore_id (str): ID of the vectorstore
+            vectorstore_path (str): Blob prefix of the vectorstore's files
+
+        Returns:
+            FAISS: The vectorstore, or None if it has no files in storage
+        """
+        key = str(vectorstore_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["path"] != vectorstore_path:
+                # Loaded from another path (e.g. before an update moved the vectorstore)
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+            if entry is not None and time.time() - entry["checked_at"] < self.revalidate_seconds:
+                self.stats["hits"] += 1
+                return entry["vectorstore"]
+
+            future = self.loading.get((key, vectorstore_path))
+            leader = future is None
+            if leader:
+                future = Future()
+                self.loading[(key, vectorstore_path)] = future
+            else:
+                self.stats["shared_loads"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            vectorstore = self._refresh(key, vectorstore_path, entry)
+            future.set_result(vectorstore)
+            return vectorstore
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.loading.pop((key, vectorstore_path), None)
+
+    def _refresh(self, key, vectorstore_path, entry):
+        container_client = get_azure_blob_client().get_container_client(VECTORSTORE_CONTAINER)
+        # Updated vectorstores live under versioned paths that start with the original one
+        blobs = list(container_client.list_blobs(name_starts_with=f"{vectorstore_path}/"))
+        if not blobs:
+            self.invalidate(key)
+            return None
+
+        version = blob_version(blobs)
+        if entry is not None and entry["version"] == version:
+            with self.lock:
+                entry["checked_at"] = time.time()
+                self.stats["revalidated"] += 1
+            return entry["vectorstore"]
+
+        if vectorstore_store.enabled:
+            # Memory-mapped from the node's on-disk store - only the docstore offsets count against this worker
+            vectorstore, size = vectorstore_store.open(container_client, vectorstore_path, blobs, version, get_embeddings())
+        else:
+            vectorstore = self._load(container_client, vectorstore_path, blobs)
+            size = sum(blob.size or 0 for blob in blobs)
+        self.stats["loads"] += 1
+        if self.enabled and size <= self.max_bytes:
+            self._put(key, {"path": vectorstore_path, "version": version, "vectorstore": vectorstore, "size": size, "checked_at": time.time()})
+        return vectorstore
+
+    def _load(self, container_client, vectorstore_path, blobs):
+        """Download a vectorstore's blobs to a temporary directory and deserialise it"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            download_vectorstore(container_client, vectorstore_path, blobs, temp_dir)
+            return FAISS.load_local(temp_dir, get_embeddings(), allow_dangerous_deserialization=True)
+        finally:
+            try:
+                shutil.rmtree(temp_dir)
+            except Exception as e:
+                logger.error(f"Error cleaning up temporary directory: {str(e)}")
+
+    def _put(self, key, entry):
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous["size"]
+            self.entries[key] = entry
+            self.size += entry["size"]
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                old_key, old_entry = self.entries.popitem(last=False)
+                self.size -= old_entry["size"]
+                self.stats["evictions"] += 1
+                logger.info(f"Evicted vectorstore {old_key} from the cache")
+
+    def invalidate(self, vectorstore_id):
+        """Drop a vectorstore from this worker's cache (e.g. after it was deleted)"""
+        with self.lock:
+            entry = self.entries.pop(str(vectorstore_id), None)
+            if entry is not None:
+                self.size -= entry["size"]
+                self.stats["invalidations"] += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, "entries": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+# SHARED VECTORSTORE CACHE FOR THIS WORKER
+vectorstore_cache = VectorstoreCache()
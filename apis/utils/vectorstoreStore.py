@@ -0,0 +1,211 @@
+import os
+import json
+import mmap
+import fcntl
+import pickle
+import shutil
+import hashlib
+import logging
+import tempfile
+import faiss
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+
+# CONFIGURE LOGGING
+logger = logging.getLogger(__name__)
+
+# VECTORSTORE STORE CONFIGURATION
+# Node-local directory vectorstore blobs are synced to once and memory-mapped by every worker - "" disables it
+VECTORSTORE_STORE_DIR = os.environ.get("VECTORSTORE_STORE_DIR", os.path.join(tempfile.gettempdir(), "vectorstore-store"))
+# Disk budget of the store - the least recently opened versions are deleted beyond it
+VECTORSTORE_STORE_MAX_BYTES = int(os.environ.get("VECTORSTORE_STORE_MAX_BYTES", 10 * 1024 * 1024 * 1024))
+
+INDEX_FILE = "index.faiss"
+PICKLE_FILE = "index.pkl"
+DOCSTORE_FILE = "docstore.jsonl"
+DOCSTORE_INDEX_FILE = "docstore.index.json"
+
+# Flat indexes are mapped from the file instead of copied into each worker's heap
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+
+
+class DiskDocstore(Docstore):
+    """
+    Read-only docstore over a JSON-lines side file
+
+    Only the byte offset of each document is held in memory; the file is memory-mapped, so
+    the text lives in the page cache shared by all workers and is parsed on lookup.
+    """
+
+    def __init__(self, path, offsets):
+        self.offsets = offsets
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def search(self, search):
+        location = self.offsets.get(search)
+        if location is None:
+            return f"ID {search} not found."
+        record = json.loads(self.data[location[0]:location[0] + location[1]])
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+
+def write_docstore(folder, docstore, index_to_docstore_id):
+    """Write a LangChain docstore as docstore.jsonl plus an offsets file"""
+    ids = [index_to_docstore_id[position] for position in range(len(index_to_docstore_id))]
+    offsets = {}
+    with open(os.path.join(folder, DOCSTORE_FILE), "wb") as f:
+        for doc_id in ids:
+            doc = docstore.search(doc_id)
+            line = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False).encode("utf-8")
+            offsets[doc_id] = [f.tell(), len(line)]
+            f.write(line + b"\n")
+    with open(os.path.join(folder, DOCSTORE_INDEX_FILE), "w", encoding="utf-8") as f:
+        json.dump({"index_to_docstore_id": ids, "offsets": offsets}, f, separators=(",", ":"))
+
+
+class VectorstoreStore:
+    """
+    Node-local, content-addressed copies of vectorstores opened with memory mapping
+
+    Each stored version of a vectorstore (its blob names and ETags) is synced from blob storage
+    once per node into <root>/<sha256 of the version>. While syncing, the pickled docstore is
+    converted to a JSON-lines side file, so opening a vectorstore unpickles nothing. Workers
+    open the FAISS index with IO_FLAG_MMAP and the docstore through mmap, so every worker on
+    the node shares one copy in the page cache instead of holding its own.
+    """
+
+    def __init__(self, root=VECTORSTORE_STORE_DIR, max_bytes=VECTORSTORE_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        if self.root:
+            try:
+                os.makedirs(self.root, exist_ok=True)
+            except Exception as e:
+                logger.error(f"Could not create vectorstore store directory {self.root}: {str(e)} - vectorstores load into memory")
+                self.root = ""
+
+    @property
+    def enabled(self):
+        return bool(self.root)
+
+    def version_dir(self, version):
+        digest = hashlib.sha256(json.dumps(version).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest)
+
+    def open(self, container_client, vectorstore_path, blobs, version, embeddings):
+        """
+        Open a vectorstore version, syncing it from blob storage first if this node lacks it
+
+        Args:
+            container_client: Container holding the vectorstore blobs
+            vectorstore_path (str): Blob prefix of the vectorstore's files
+            blobs (list): The blobs under vectorstore_path
+            version (tuple): Identity of the blobs (see vectorstoreCache.blob_version)
+            embeddings: Embedding client used for queries
+
+        Returns:
+            tuple: (FAISS vectorstore, bytes held in this worker's memory)
+        """
+        folder = self.version_dir(version)
+        if not os.path.isdir(folder):
+            self._sync(container_client, vectorstore_path, blobs, folder)
+        else:
+            # Mark as recently used for pruning
+            os.utime(folder)
+
+        index_path = os.path.join(folder, INDEX_FILE)
+        try:
+            index = faiss.read_index(index_path, MMAP_FLAGS)
+        except Exception as e:
+            logger.warning(f"Could not memory-map {index_path}, reading it into memory: {str(e)}")
+            index = faiss.read_index(index_path)
+
+        docstore_index_path = os.path.join(folder, DOCSTORE_INDEX_FILE)
+        with open(docstore_index_path, "r", encoding="utf-8") as f:
+            docstore_index = json.load(f)
+        docstore = DiskDocstore(os.path.join(folder, DOCSTORE_FILE), docstore_index["offsets"])
+        index_to_docstore_id = dict(enumerate(docstore_index["index_to_docstore_id"]))
+
+        vectorstore = FAISS(embeddings, index, docstore, index_to_docstore_id)
+        return vectorstore, os.path.getsize(docstore_index_path)
+
+    def _sync(self, container_client, vectorstore_path, blobs, folder):
+        """Download a version into folder - one worker per node does it while the others wait"""
+        with open(f"{folder}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.isdir(folder):
+                    return
+
+                staging = tempfile.mkdtemp(dir=self.root, prefix=".sync-")
+                try:
+                    for blob in blobs:
+                        # Get relative path from vectorstore_path
+                        rel_path = blob.name[len(vectorstore_path) + 1:] if blob.name.startswith(vectorstore_path + "/") else blob.name
+                        local_blob_path = os.path.join(staging, rel_path)
+                        os.makedirs(os.path.dirname(local_blob_path), exist_ok=True)
+                        with open(local_blob_path, "wb") as download_file:
+                            container_client.get_blob_client(blob.name).download_blob().readinto(download_file)
+
+                    # Vectorstores are written by this API, so their pickles are trusted
+                    pickle_path = os.path.join(staging, PICKLE_FILE)
+                    with open(pickle_path, "rb") as f:
+                        docstore, index_to_docstore_id = pickle.load(f)
+                    write_docstore(staging, docstore, index_to_docstore_id)
+                    os.remove(pickle_path)
+
+                    try:
+                        os.rename(staging, folder)
+                    except OSError:
+                        if not os.path.isdir(folder):
+                            raise
+                        # Another worker synced the same version first - its copy is identical
+                        shutil.rmtree(staging, ignore_errors=True)
+                    logger.info(f"Synced vectorstore {vectorstore_path} to {folder}")
+                except Exception:
+                    shutil.rmtree(staging, ignore_errors=True)
+                    raise
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        self._prune(keep=folder)
+
+    def _prune(self, keep=None):
+        """Delete the least recently opened versions beyond the disk budget"""
+        try:
+            folders = []
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name.startswith(".") or not os.path.isdir(path) or path == keep:
+                    continue
+                size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+                folders.append((os.stat(path).st_mtime, size, path))
+
+            total = sum(size for _, size, _ in folders)
+            if keep and os.path.isdir(keep):
+                total += sum(entry.stat().st_size for entry in os.scandir(keep) if entry.is_file())
+            for _, size, path in sorted(folders):
+                if total <= self.max_bytes:
+                    break
+                # Delete under the version's sync lock, skipping versions being synced right now. The lock
+                # file itself stays: unlinking it would let a syncer waiting on the old inode and a new
+                # one holding a fresh file both write the version.
+                with open(f"{path}.lock", "w") as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue
+                    try:
+                        # Workers that still have this version mapped keep reading the unlinked files
+                        shutil.rmtree(path, ignore_errors=True)
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                total -= size
+        except Exception as e:
+            logger.error(f"Error pruning vectorstore store {self.root}: {str(e)}")
+
+
+# SHARED VECTORSTORE STORE FOR THIS WORKER
+vectorstore_store = VectorstoreStore()
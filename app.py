@@ -272,6 +272,10 @@ register_llm_o3_mini(app)
 from apis.llm.gpt_o4_mini import register_llm_gpt_o4_mini
 register_llm_gpt_o4_mini(app)
 
+## BATCH
+from apis.llm.llm_batch import register_llm_batch_routes
+register_llm_batch_routes(app)
+
 
 
 # IMAGE GENERATION ENDPOINTS
@@ -326,6 +330,9 @@ register_consume_vectorstore_routes(app)
 from apis.rag.vectorstore_advanced import register_advanced_vectorstore_routes
 register_advanced_vectorstore_routes(app)
 
+from apis.rag.vectorstore_update import register_vectorstore_update_routes
+register_vectorstore_update_routes(app)
+
 # CONVERSATIONAL AI ENDPOINTS
 from apis.llm_conversation.conversation import register_llm_conversation_routes
 register_llm_conversation_routes(app)
@@ -83,6 +83,13 @@ BEGIN
         VALUES (NEWID(), '/jobs', 'List Jobs', 0, 'List all jobs for the authenticated user', 1);
         PRINT 'Added endpoint: /jobs';
     END
+
+    IF NOT EXISTS (SELECT * FROM endpoints WHERE endpoint_path = '/llm/batch')
+    BEGIN
+        INSERT INTO endpoints (id, endpoint_path, endpoint_name, cost, description, active)
+        VALUES (NEWID(), '/llm/batch', 'LLM Batch', 1, 'Submit a batch of prompts for one model as an asynchronous job (cost per prompt)', 1);
+        PRINT 'Added endpoint: /llm/batch';
+    END
 END
 ELSE
 BEGIN
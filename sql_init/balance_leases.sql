@@ -0,0 +1,34 @@
+-- Create balance_leases table for worker-side balance reservations
+-- A lease moves a block of credit out of user_balances into a worker's memory. The worker
+-- periodically records consumed_amount and extends expires_at; when it closes the lease the
+-- unused credit (leased_amount - consumed_amount) is returned to user_balances. Leases whose
+-- worker stopped heart-beating are expired by any other worker and their unused credit returned.
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[balance_leases]') AND type in (N'U'))
+BEGIN
+    CREATE TABLE [dbo].[balance_leases] (
+        [id] UNIQUEIDENTIFIER PRIMARY KEY DEFAULT NEWID(),
+        [user_id] UNIQUEIDENTIFIER NOT NULL,
+        [balance_month] DATE NOT NULL,
+        [worker_id] NVARCHAR(200) NOT NULL,
+        [leased_amount] DECIMAL(10, 2) NOT NULL,
+        [consumed_amount] DECIMAL(10, 2) NOT NULL DEFAULT 0,
+        [status] VARCHAR(20) NOT NULL DEFAULT 'open', -- 'open', 'closed', 'expired'
+        [created_at] DATETIME2 NOT NULL DEFAULT DATEADD(HOUR, 2, GETUTCDATE()),
+        [expires_at] DATETIME2 NOT NULL,
+        [settled_at] DATETIME2 NULL,
+        CONSTRAINT FK_balance_leases_users FOREIGN KEY (user_id) REFERENCES users(id)
+    );
+
+    PRINT 'Created table: balance_leases';
+END
+ELSE
+BEGIN
+    PRINT 'Table balance_leases already exists';
+END
+
+-- Create index used by the expired-lease recovery sweep
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_balance_leases_status_expires_at' AND object_id = OBJECT_ID('balance_leases'))
+BEGIN
+    CREATE INDEX IX_balance_leases_status_expires_at ON balance_leases (status, expires_at);
+    PRINT 'Created index: IX_balance_leases_status_expires_at';
+END
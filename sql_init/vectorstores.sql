@@ -21,3 +21,21 @@ CREATE INDEX idx_vectorstores_user_id ON vectorstores(user_id);
 
 -- Index for faster lookup by path
 CREATE INDEX idx_vectorstores_path ON vectorstores(path);
+
+-- Endpoints for incremental vectorstore updates
+IF EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[endpoints]') AND type in (N'U'))
+BEGIN
+    IF NOT EXISTS (SELECT * FROM endpoints WHERE endpoint_path = '/rag/vectorstore/documents/add')
+    BEGIN
+        INSERT INTO endpoints (id, endpoint_path, endpoint_name, cost, description, active)
+        VALUES (NEWID(), '/rag/vectorstore/documents/add', 'Add Vectorstore Documents', 1, 'Embed new files into an existing vectorstore without rebuilding it', 1);
+        PRINT 'Added endpoint: /rag/vectorstore/documents/add';
+    END
+
+    IF NOT EXISTS (SELECT * FROM endpoints WHERE endpoint_path = '/rag/vectorstore/documents/remove')
+    BEGIN
+        INSERT INTO endpoints (id, endpoint_path, endpoint_name, cost, description, active)
+        VALUES (NEWID(), '/rag/vectorstore/documents/remove', 'Remove Vectorstore Documents', 1, 'Remove the documents of given source files from a vectorstore', 1);
+        PRINT 'Added endpoint: /rag/vectorstore/documents/remove';
+    END
+END
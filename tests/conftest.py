@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Import the apis package from the repository root whichever directory pytest runs from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# databaseService reads its connection settings at import - the tests never connect
+for name in ("DB_DRIVER", "DB_SERVER", "DB_NAME", "DB_USER", "DB_PASSWORD"):
+    os.environ.setdefault(name, "test")
@@ -0,0 +1,68 @@
+import threading
+from apis.utils.accessCache import UserAccessCache
+
+
+class FakeAccessCache(UserAccessCache):
+    """Access cache whose loads return the current grants, optionally pausing mid-load"""
+
+    def __init__(self, grants, **options):
+        super().__init__(**options)
+        self.grants = grants
+        self.loads = 0
+        self.load_started = threading.Event()
+        self.finish_load = threading.Event()
+        self.finish_load.set()
+
+    def _load(self, user_id):
+        self.loads += 1
+        access = (False, frozenset(self.grants))
+        self.load_started.set()
+        self.finish_load.wait(5)
+        return access
+
+
+def test_caches_access_set_until_invalidated():
+    cache = FakeAccessCache({"e1"})
+
+    assert cache.has_access("U1", "E1") is True
+    assert cache.has_access("u1", "e1") is True
+    assert cache.loads == 1
+
+    cache.grants = set()
+    cache.invalidate("u1")
+
+    assert cache.has_access("u1", "e1") is False
+    assert cache.loads == 2
+
+def test_load_racing_a_revocation_is_not_cached():
+    cache = FakeAccessCache({"e1"})
+    cache.finish_load.clear()
+    results = []
+
+    loader = threading.Thread(target=lambda: results.append(cache.has_access("u1", "e1")))
+    loader.start()
+    assert cache.load_started.wait(5)
+
+    # The grant is revoked after the in-flight load read it
+    cache.grants = set()
+    cache.invalidate("u1")
+    cache.finish_load.set()
+    loader.join(5)
+
+    assert results == [True]
+    assert cache.get_stats()["users"] == 0
+    assert cache.has_access("u1", "e1") is False
+    assert cache.loads == 2
+
+def test_load_racing_a_clear_is_not_cached():
+    cache = FakeAccessCache({"e1"})
+    cache.finish_load.clear()
+
+    loader = threading.Thread(target=lambda: cache.get_access_set("u1"))
+    loader.start()
+    assert cache.load_started.wait(5)
+    cache.clear()
+    cache.finish_load.set()
+    loader.join(5)
+
+    assert cache.get_stats()["users"] == 0
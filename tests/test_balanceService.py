@@ -0,0 +1,101 @@
+import threading
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from apis.utils.balanceService import BalanceService, ATOMIC_DEDUCT_BALANCE_SQL
+
+
+class FakeBalanceDatabase:
+    """
+    One user's balance row, applying ATOMIC_DEDUCT_BALANCE_SQL the way SQL Server does
+
+    The statement's guarded UPDATE runs under the row lock, so the check and the deduction
+    happen as one step; the lock here stands in for it.
+    """
+
+    def __init__(self, balance):
+        self.balance = balance
+        self.transactions = []
+        self.lock = threading.Lock()
+
+    def deduct(self, amount):
+        with self.lock:
+            if self.balance >= amount:
+                self.balance -= amount
+                self.transactions.append(amount)
+                return (1, self.balance, 1)
+            return (0, self.balance, 1)
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.result = None
+
+    def execute(self, query, params=None):
+        assert query is ATOMIC_DEDUCT_BALANCE_SQL
+        user_id, endpoint_id, amount, balance_month = params
+        self.result = self.database.deduct(amount)
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_deduction_sql_guards_against_overspending():
+    assert "AND current_balance >= @amount" in ATOMIC_DEDUCT_BALANCE_SQL
+    assert "WITH (UPDLOCK, HOLDLOCK)" in ATOMIC_DEDUCT_BALANCE_SQL
+
+def test_concurrent_deductions_never_overspend(monkeypatch):
+    from apis.utils import balanceService
+
+    starting_balance, cost = 50.0, 1.5
+    database = FakeBalanceDatabase(starting_balance)
+    monkeypatch.setattr(balanceService.DatabaseService, "get_connection", staticmethod(lambda: FakeConnection(database)))
+
+    results = []
+    results_lock = threading.Lock()
+    start = threading.Barrier(16)
+
+    def worker():
+        start.wait()
+        for _ in range(20):
+            outcome = BalanceService.deduct_balance_atomic("user", "endpoint", cost)
+            with results_lock:
+                results.append(outcome)
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    succeeded = [balance for ok, balance in results if ok]
+    refused = [error for ok, error in results if not ok]
+
+    assert len(results) == 16 * 20
+    assert len(succeeded) == int(starting_balance // cost)
+    assert set(refused) == {"Insufficient balance"}
+    assert database.balance >= 0
+    assert starting_balance - database.balance == pytest.approx(len(succeeded) * cost)
+    assert min(succeeded) >= 0
@@ -0,0 +1,192 @@
+import time
+import threading
+import pytest
+from apis.utils.connectionPool import ConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        if self.connection.broken:
+            raise RuntimeError("Communication link failure")
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.broken = False
+        self.closed = False
+        self.rollbacks = 0
+        self.fail_rollback = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise RuntimeError("Connection is busy")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnectionFactory:
+    def __init__(self):
+        self.connections = []
+
+    def __call__(self):
+        connection = FakeConnection(len(self.connections))
+        self.connections.append(connection)
+        return connection
+
+
+@pytest.fixture
+def factory():
+    return FakeConnectionFactory()
+
+def make_pool(factory, **options):
+    options.setdefault("max_size", 2)
+    options.setdefault("timeout", 0.2)
+    options.setdefault("max_lifetime", 60)
+    options.setdefault("health_check_after", 60)
+    return ConnectionPool(factory, **options)
+
+
+def test_reuses_released_connections(factory):
+    pool = make_pool(factory)
+
+    first = pool.get_connection()
+    raw = first._raw
+    first.close()
+    second = pool.get_connection()
+
+    assert second._raw is raw
+    assert len(factory.connections) == 1
+
+def test_never_opens_more_than_max_size(factory):
+    pool = make_pool(factory)
+    held = [pool.get_connection(), pool.get_connection()]
+
+    start = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.get_connection()
+
+    assert time.monotonic() - start >= 0.2
+    assert len(factory.connections) == 2
+    assert pool.get_stats()["timeouts"] == 1
+    for connection in held:
+        connection.close()
+
+def test_blocked_checkout_gets_the_released_connection(factory):
+    pool = make_pool(factory, timeout=5)
+    held = [pool.get_connection(), pool.get_connection()]
+    checked_out = []
+
+    waiter = threading.Thread(target=lambda: checked_out.append(pool.get_connection()))
+    waiter.start()
+    time.sleep(0.05)
+    assert not checked_out
+
+    raw = held[0]._raw
+    held[0].close()
+    waiter.join(5)
+
+    assert checked_out and checked_out[0]._raw is raw
+    assert len(factory.connections) == 2
+    assert pool.get_stats()["waits"] == 1
+
+def test_rolls_back_on_release(factory):
+    pool = make_pool(factory)
+
+    connection = pool.get_connection()
+    raw = connection._raw
+    connection.close()
+    connection.close()
+
+    assert raw.rollbacks == 1
+    assert pool.get_stats()["idle"] == 1
+
+def test_discards_connection_whose_rollback_fails(factory):
+    pool = make_pool(factory)
+
+    connection = pool.get_connection()
+    raw = connection._raw
+    raw.fail_rollback = True
+    connection.close()
+
+    assert raw.closed
+    stats = pool.get_stats()
+    assert stats["open"] == 0
+    assert stats["connections_discarded"] == 1
+    assert pool.get_connection()._raw is not raw
+
+def test_discards_connection_failing_health_check(factory):
+    pool = make_pool(factory, health_check_after=0)
+
+    connection = pool.get_connection()
+    raw = connection._raw
+    connection.close()
+    raw.broken = True
+
+    replacement = pool.get_connection()
+
+    assert replacement._raw is not raw
+    assert raw.closed
+    assert pool.get_stats()["health_check_failures"] == 1
+    assert pool.get_stats()["open"] == 1
+
+def test_recycles_idle_connection_past_max_lifetime(factory):
+    pool = make_pool(factory, max_lifetime=0.2)
+
+    connection = pool.get_connection()
+    raw = connection._raw
+    connection.close()
+    time.sleep(0.25)
+
+    replacement = pool.get_connection()
+
+    assert replacement._raw is not raw
+    assert raw.closed
+    assert pool.get_stats()["connections_recycled"] == 1
+    assert pool.get_stats()["open"] == 1
+
+def test_discards_connection_released_past_max_lifetime(factory):
+    pool = make_pool(factory, max_lifetime=0.2)
+
+    connection = pool.get_connection()
+    raw = connection._raw
+    time.sleep(0.25)
+    connection.close()
+
+    assert raw.closed
+    assert pool.get_stats()["open"] == 0
+    assert pool.get_stats()["idle"] == 0
+
+def test_configure_pool_uses_connection_factory(factory):
+    pytest.importorskip("pyodbc", exc_type=ImportError)
+    from apis.utils.databaseService import DatabaseService
+
+    pool = DatabaseService.configure_pool(factory, max_size=1, timeout=0.1)
+    try:
+        connection = DatabaseService.get_connection()
+        assert connection._raw is factory.connections[0]
+        with pytest.raises(PoolTimeoutError):
+            pool.get_connection()
+        connection.close()
+        assert factory.connections[0].rollbacks == 1
+    finally:
+        with DatabaseService._pool_lock:
+            DatabaseService._pool = None
+            DatabaseService._pool_pid = None
@@ -0,0 +1,195 @@
+import threading
+import pytest
+from apis.utils.deploymentRouter import (
+    DeploymentRouter, CLOSED, OPEN, HALF_OPEN,
+    ROUTER_FAILURE_THRESHOLD, ROUTER_OPEN_SECONDS, ROUTER_HEDGE_MIN_SAMPLES
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    """Stands in for an OpenAI SDK error carrying the HTTP response"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(status_code, headers)
+
+
+class FakeClient:
+    """Region client that answers with its name or raises the queued errors in turn"""
+
+    def __init__(self, name, errors=None):
+        self.name = name
+        self.errors = list(errors or [])
+        self.calls = 0
+
+    def complete(self):
+        self.calls += 1
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+        return self.name
+
+
+def request(client):
+    return client.complete()
+
+def make_router(clock, **clients):
+    return DeploymentRouter("test-model", list(clients.items()), clock=clock)
+
+def health(router, name):
+    return next(region.health for region in router.regions if region.name == name)
+
+
+def test_fails_over_to_next_region_on_server_error():
+    clock = FakeClock()
+    east = FakeClient("east", [FakeAPIError(500)])
+    west = FakeClient("west")
+    router = make_router(clock, east=east, west=west)
+
+    result, region = router.call(request)
+
+    assert (result, region) == ("west", "west")
+    assert east.calls == 1
+    assert health(router, "east").consecutive_failures == 1
+    assert health(router, "east").state == CLOSED
+
+def test_request_errors_are_raised_without_failover():
+    clock = FakeClock()
+    east = FakeClient("east", [FakeAPIError(400)])
+    west = FakeClient("west")
+    router = make_router(clock, east=east, west=west)
+
+    with pytest.raises(FakeAPIError):
+        router.call(request)
+
+    assert west.calls == 0
+    assert health(router, "east").consecutive_failures == 0
+
+def test_breaker_opens_after_consecutive_failures_and_skips_region():
+    clock = FakeClock()
+    east = FakeClient("east", [FakeAPIError(503)] * ROUTER_FAILURE_THRESHOLD)
+    west = FakeClient("west")
+    router = make_router(clock, east=east, west=west)
+
+    for _ in range(ROUTER_FAILURE_THRESHOLD):
+        assert router.call(request) == ("west", "west")
+
+    assert health(router, "east").state == OPEN
+    assert router.call(request) == ("west", "west")
+    assert east.calls == ROUTER_FAILURE_THRESHOLD
+
+def test_half_open_probe_closes_breaker_on_success():
+    clock = FakeClock()
+    east = FakeClient("east", [FakeAPIError(503)] * ROUTER_FAILURE_THRESHOLD)
+    west = FakeClient("west")
+    router = make_router(clock, east=east, west=west)
+    for _ in range(ROUTER_FAILURE_THRESHOLD):
+        router.call(request)
+
+    clock.advance(ROUTER_OPEN_SECONDS)
+
+    assert router.call(request) == ("east", "east")
+    assert health(router, "east").state == CLOSED
+    assert health(router, "east").consecutive_failures == 0
+
+def test_half_open_allows_a_single_probe():
+    clock = FakeClock()
+    router = make_router(clock, east=FakeClient("east"), west=FakeClient("west"))
+    east_health = health(router, "east")
+    for _ in range(ROUTER_FAILURE_THRESHOLD):
+        east_health.record_failure(503)
+
+    clock.advance(ROUTER_OPEN_SECONDS)
+
+    assert east_health.try_acquire() is True
+    assert east_health.state == HALF_OPEN
+    assert east_health.try_acquire() is False
+    assert east_health.is_available() is False
+
+def test_failed_probe_reopens_breaker_for_longer():
+    clock = FakeClock()
+    east = FakeClient("east", [FakeAPIError(503)] * (ROUTER_FAILURE_THRESHOLD + 1))
+    west = FakeClient("west")
+    router = make_router(clock, east=east, west=west)
+    for _ in range(ROUTER_FAILURE_THRESHOLD):
+        router.call(request)
+
+    clock.advance(ROUTER_OPEN_SECONDS)
+
+    assert router.call(request) == ("west", "west")
+    assert east.calls == ROUTER_FAILURE_THRESHOLD + 1
+    assert health(router, "east").state == OPEN
+    assert health(router, "east").open_seconds == 2 * ROUTER_OPEN_SECONDS
+
+    clock.advance(ROUTER_OPEN_SECONDS)
+    assert router.call(request) == ("west", "west")
+    assert east.calls == ROUTER_FAILURE_THRESHOLD + 1
+
+def test_throttled_region_is_skipped_until_retry_after_passes():
+    clock = FakeClock()
+    east = FakeClient("east", [FakeAPIError(429, {"retry-after": "5"})])
+    west = FakeClient("west")
+    router = make_router(clock, east=east, west=west)
+
+    assert router.call(request) == ("west", "west")
+    # Throttling is not a health failure
+    assert health(router, "east").state == CLOSED
+    assert health(router, "east").consecutive_failures == 0
+
+    clock.advance(4)
+    assert router.call(request) == ("west", "west")
+    assert east.calls == 1
+
+    clock.advance(1)
+    assert router.call(request) == ("east", "east")
+
+def test_hedges_to_next_region_when_first_is_slower_than_percentile():
+    release = threading.Event()
+
+    class SlowClient(FakeClient):
+        def complete(self):
+            self.calls += 1
+            release.wait(5)
+            return self.name
+
+    east = SlowClient("east")
+    west = FakeClient("west")
+    router = DeploymentRouter("test-model", [("east", east), ("west", west)], hedge_percentile=50)
+    for _ in range(ROUTER_HEDGE_MIN_SAMPLES):
+        health(router, "east").record_success(0.01)
+
+    try:
+        result, region = router.call(request)
+    finally:
+        release.set()
+
+    assert (result, region) == ("west", "west")
+    assert east.calls == 1
+    assert west.calls == 1
+
+def test_does_not_hedge_without_enough_latency_samples():
+    east = FakeClient("east")
+    west = FakeClient("west")
+    router = DeploymentRouter("test-model", [("east", east), ("west", west)], hedge_percentile=50)
+
+    assert router.call(request) == ("east", "east")
+    assert west.calls == 0
@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from apis.utils.llmEngine import LLMEngine, ModelSpec, ModelDeployment
+
+
+def test_rejects_stream_for_models_that_cannot_stream(monkeypatch):
+    engine = LLMEngine()
+    engine.register(ModelSpec(
+        "test-model", "Test Model", [ModelDeployment("primary", "https://example.test", "key")], streaming=False
+    ))
+    monkeypatch.setattr(engine, "get_router", lambda spec: pytest.fail("a rejected stream reached the router"))
+
+    response = engine.complete("test-model", "system", "user", stream=True)
+
+    assert response == {"success": False, "error": "400: Test Model does not support streaming"}
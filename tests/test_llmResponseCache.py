@@ -0,0 +1,18 @@
+from apis.utils.llmResponseCache import LLMResponseCache
+
+
+def test_caches_only_low_explicit_temperatures():
+    cache = LLMResponseCache("memory", max_temperature=0.1)
+
+    assert cache.is_cacheable({"temperature": 0}, {}) is True
+    assert cache.is_cacheable({"temperature": 0.7}, {}) is False
+    assert cache.is_cacheable({"max_completion_tokens": 4000}, {}) is False
+    assert cache.is_cacheable(None, {}) is False
+
+def test_max_age_opts_in_and_no_store_opts_out():
+    cache = LLMResponseCache("memory", max_temperature=0.1)
+
+    assert cache.is_cacheable({"temperature": 0.7}, {"max-age": 60}) is True
+    assert cache.is_cacheable(None, {"max-age": 60}) is True
+    assert cache.is_cacheable({"temperature": 0}, {"no-store": True}) is False
+    assert LLMResponseCache("none").is_cacheable({"temperature": 0}, {}) is False
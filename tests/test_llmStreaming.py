@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from apis.utils import llmStreaming
+from apis.utils.llmStreaming import _usage_dict
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+        self.prompt_tokens_details = {"cached_tokens": 3}
+
+
+def test_reports_usage_from_the_stream():
+    usage = _usage_dict(FakeUsage(12, 5), ["Hello"], "system", "user", "gpt-4o")
+
+    assert usage == {"prompt_tokens": 12, "completion_tokens": 5, "total_tokens": 17, "cached_tokens": 3}
+
+def test_counts_each_part_with_the_model_tokenizer_when_usage_is_missing(monkeypatch):
+    counted = []
+
+    def count_tokens(text, model=None):
+        counted.append((text, model))
+        return len(text.split())
+
+    monkeypatch.setattr(llmStreaming, "count_tokens", count_tokens)
+
+    usage = _usage_dict(None, ["Hello", " there", " world"], "Be brief", "Say hello", "gpt-4o")
+
+    assert counted == [("Be brief", "gpt-4o"), ("Say hello", "gpt-4o"), ("Hello there world", "gpt-4o")]
+    assert usage == {
+        "prompt_tokens": 4,
+        "completion_tokens": 3,
+        "total_tokens": 7,
+        "cached_tokens": 0,
+        "usage_estimated": True
+    }
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+import pytest
+from apis.utils import vectorstoreCache
+from apis.utils.vectorstoreCache import VectorstoreCache
+
+
+class FakeContainer:
+    def __init__(self, blob_names):
+        self.blobs = [SimpleNamespace(name=name, etag="v1", size=100, last_modified=None) for name in blob_names]
+
+    def list_blobs(self, name_starts_with):
+        return [blob for blob in self.blobs if blob.name.startswith(name_starts_with)]
+
+
+class FakeVectorstoreCache(VectorstoreCache):
+    """Cache whose loads return the path they were loaded from"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.loaded_paths = []
+
+    def _load(self, container_client, vectorstore_path, blobs):
+        self.loaded_paths.append(vectorstore_path)
+        return f"index at {vectorstore_path}"
+
+
+@pytest.fixture
+def container(monkeypatch):
+    container = FakeContainer(["user/vs1/index.faiss", "user/vs1-v2/index.faiss"])
+    blob_client = SimpleNamespace(get_container_client=lambda name: container)
+    monkeypatch.setattr(vectorstoreCache, "get_azure_blob_client", lambda: blob_client)
+    monkeypatch.setattr(vectorstoreCache, "vectorstore_store", SimpleNamespace(enabled=False))
+    return container
+
+
+def test_serves_fresh_entry_for_the_same_path(container):
+    cache = FakeVectorstoreCache(max_bytes=10000, revalidate_seconds=60)
+
+    assert cache.get("vs1", "user/vs1") == "index at user/vs1"
+    assert cache.get("vs1", "user/vs1") == "index at user/vs1"
+    assert cache.loaded_paths == ["user/vs1"]
+
+def test_entry_loaded_from_another_path_is_stale(container):
+    cache = FakeVectorstoreCache(max_bytes=10000, revalidate_seconds=60)
+    cache.get("vs1", "user/vs1")
+
+    assert cache.get("vs1", "user/vs1-v2") == "index at user/vs1-v2"
+    assert cache.loaded_paths == ["user/vs1", "user/vs1-v2"]
+    assert cache.get_stats()["entries"] == 1